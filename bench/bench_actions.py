@@ -0,0 +1,292 @@
+"""Runs lrm's menu actions end to end against stub system binaries.
+
+Each scenario builds a sandbox with SCALE iSCSI disks/targets (a fake
+sysfs tree plus canned lsblk/iscsiadm/nmcli... output), puts only stub
+binaries on PATH, answers the prompts from a script and reports:
+
+    wall      time from launch to exit
+    procs     external processes lrm spawned (from its --trace output)
+    rss       peak resident set size of the lrm process
+
+No root or real hardware is needed and nothing outside the sandbox is
+touched. Run it after changes and compare the numbers over time.
+
+Usage:
+    python3 bench/bench_actions.py                        # all scenarios, scales 1 50 500
+    python3 bench/bench_actions.py --scales 1 50 --only iscsi-format --json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+SANDBOX_DRIVER = os.path.join(BENCH, "lrm_sandbox.py")
+PORTAL = "10.0.0.1"
+
+# Menu paths, as typed by an operator. {root} is the sandbox directory.
+# /dev is not faked, so iscsi-mount stops at the device node check after listing.
+SCENARIOS = {
+    "network-dhcp": "1\n1\n1\ndhcp\n0\n0\n",
+    "iscsi-connect": f"2\n1\n{PORTAL}\n1\nno\n\n0\n0\n",
+    "iscsi-connect-cached": f"2\n1\n{PORTAL}\n1\nno\n\n1\n{PORTAL}\n1\nno\n\n0\n0\n",
+    "iscsi-logout-all": f"2\n1\n{PORTAL}\nall\nyes\n\n0\n0\n",
+    "iscsi-multipath": f"2\n6\n{PORTAL},10.0.1.1\nall\n1\n\nyes\n2\n\n0\n0\n",
+    "iscsi-session-params": "2\n7\n\n0\n0\n",
+    "iscsi-iface": f"2\n8\n1,2\n{PORTAL}\nall\n2\n\n\n0\n0\n",
+    "iscsi-monitor": "2\n9\n\n0\n0\n",
+    "iscsi-batch-format": "2\n10\nall\nxfs\n\n\n\nyes\n\n0\n0\n",
+    "iscsi-list": "2\n3\n\n0\n0\n",
+    "iscsi-format": "2\n4\n1\nxfs\n\n\nyes\n\n0\n0\n",
+    "iscsi-mount": "2\n5\nyes\n{root}/mnt/veeam\n2\n\n0\n0\n",
+    "storage-list": "3\n1\n\n0\n0\n",
+    "storage-partition": "3\n4\n1\n10G\nyes\n\n0\n0\n",
+    "storage-format": "3\n3\n1\nxfs\n\n\nyes\n0\n0\n",
+    "storage-mount-unit": "3\n2\n3\n{root}/mnt/repo\n2\n2\nyes\n\n0\n0\n",
+    "storage-raid": "3\n5\nall\n\n\n\n\n\nyes\n\n\n\n\n\n0\n0\n",
+    "storage-lvm": "3\n6\n1\nall\n\nyes\n\n2\n1\n\n\n\n\nno\n\n0\n0\n0\n",
+    "storage-benchmark": "3\n8\n{root}/scratch.dat\n16\n\n\n\n\n1\nbaseline\n\n0\n0\n",
+    "storage-queue": "3\n9\nr\n\nyes\n\n\n0\n0\n",
+    "storage-batch-format": "3\n7\nall\nxfs\n\n\n\nyes\n\n0\n0\n",
+    "users-standard": "4\n1\nbench\n1\nno\nyes\nno\n\n0\n0\n",
+    "ssh-enable": "5\n1\nyes\n\n0\n0\n",
+}
+
+# Scenarios that need more disks than scale 1 provides (mounting needs a formatted partition).
+MIN_SCALE = {"storage-mount-unit": 2, "storage-raid": 4}
+
+# Stub binaries: (argument pattern for `case "$*"`, output file or None, exit code[, shell snippet]).
+# Anything not listed exits 0 without output. {sys} in a snippet is the fake sysfs.
+# `parted ... DISK ... mkpart ...` adds partition 1 to the fake sysfs, like the kernel would.
+# `parted -m -s DISK unit s print` reports an empty GPT disk.
+MKPART = ('for a; do case $a in /dev/*) d=${a##*/} ;; [0-9]*s) [ -n "$st" ] || st=${a%s} ;; esac; done; '
+          'p="{sys}/block/$d/${d}1"; /bin/mkdir -p "$p"; echo 1 > "$p/partition"; echo "${st:-2048}" > "$p/start"; '
+          'read dev < "{sys}/block/$d/dev"; echo "${dev%:*}:$(( ${dev#*:} + 1 ))" > "$p/dev"; '
+          '/bin/ln -sfn "$p" "{sys}/class/block/${d}1"')
+# `mdadm --create /dev/md/NAME` adds an idle array to the fake sysfs.
+MDCREATE = ('n=${2##*/}; /bin/mkdir -p "{sys}/block/$n/md"; echo none > "{sys}/block/$n/md/sync_completed"; '
+            '/bin/ln -sfn "{sys}/block/$n" "{sys}/class/block/$n"')
+PRINT = 'echo "BYT;"; echo "$3:209715200s:scsi:512:4096:gpt:Bench LUN:;"'
+STUBS = {
+    "lsblk": [("-J *", "lsblk.json", 0)],
+    "iscsiadm": [("-m discovery*", "discovery.txt", 0), ("-m session*", "session.txt", 0)],
+    "nmcli": [("-t -f DEVICE,TYPE device", "nmcli_devices.txt", 0), ("con delete*", None, 10)],
+    "systemctl": [("is-active *.service", "systemctl_inactive.txt", 3), ("is-active*", "systemctl_active.txt", 0)],
+    "parted": [("-m -s * unit s print", None, 0, PRINT), ("*mkpart*", None, 0, MKPART)],
+    "blkid": [("*", None, 2)],
+    "partprobe": [],
+    "multipath": [],
+    "udevadm": [],
+    "vgs": [("*", "vgs.txt", 0)],
+    "lvs": [],
+    "wipefs": [],
+    "pvcreate": [],
+    "vgcreate": [],
+    "vgextend": [],
+    "lvcreate": [],
+    "lvconvert": [],
+    "mdadm": [("--create*", None, 0, MDCREATE), ("--detail --brief*", "mdadm_detail.txt", 0)],
+    "mkfs.xfs": [],
+    "mkfs.ext4": [],
+    "xfs_info": [("*", "xfs_info.txt", 0)],
+    "mount": [],
+    "umount": [],
+    "useradd": [],
+    "usermod": [],
+    "chpasswd": [],
+    "passwd": [],
+    "userdel": [],
+    "ssh-keygen": [],
+}
+
+
+def _disk_name(index):
+    """sdb, sdc, ... sdz, sdaa, sdab ... (sda is left to the system disk)."""
+    index += 1
+    letters = ""
+    while True:
+        letters = chr(ord("a") + index % 26) + letters
+        index = index // 26 - 1
+        if index < 0:
+            return "sd" + letters
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _build_sysfs(root, scale):
+    """Creates SCALE iSCSI disks; every odd one already holds partition 1."""
+    sys_root = os.path.join(root, "sys")
+    lsblk_rows = []
+    for i in range(scale):
+        name = _disk_name(i)
+        devno = f"8:{i * 16}"
+        disk_dir = os.path.join(sys_root, "devices", "platform", "host2", f"session{i + 1}",
+                                f"target2:0:{i}", f"2:0:{i}:0", "block", name)
+        _write(os.path.join(disk_dir, "dev"), devno + "\n")
+        _write(os.path.join(disk_dir, "size"), "209715200\n")
+        # A LUN on a RAID with a 64k chunk and 4 data disks.
+        _write(os.path.join(disk_dir, "queue", "logical_block_size"), "512\n")
+        _write(os.path.join(disk_dir, "queue", "physical_block_size"), "4096\n")
+        _write(os.path.join(disk_dir, "alignment_offset"), "0\n")
+        for attribute, value in (("scheduler", "[mq-deadline] kyber bfq none"), ("read_ahead_kb", "128"),
+                                 ("nr_requests", "64"), ("max_sectors_kb", "512"), ("max_hw_sectors_kb", "32767")):
+            _write(os.path.join(disk_dir, "queue", attribute), value + "\n")
+        _write(os.path.join(disk_dir, "queue", "minimum_io_size"), "65536\n")
+        _write(os.path.join(disk_dir, "queue", "optimal_io_size"), "262144\n")
+        session_dir = os.path.join(sys_root, "class", "iscsi_session", f"session{i + 1}")
+        _write(os.path.join(session_dir, "targetname"), f"iqn.2024-01.org.example:bench.target{i}\n")
+        for attribute, value in (("first_burst_len", "262144"), ("max_burst_len", "16776192"),
+                                 ("immediate_data", "1"), ("initial_r2t", "0"), ("recovery_tmo", "120"),
+                                 ("state", "LOGGED_IN")):
+            _write(os.path.join(session_dir, attribute), value + "\n")
+        connection_dir = os.path.join(sys_root, "class", "iscsi_connection", f"connection{i + 1}:0")
+        for attribute, value in (("persistent_address", PORTAL), ("persistent_port", "3260"),
+                                 ("max_recv_dlength", "262144"), ("max_xmit_dlength", "262144"),
+                                 ("state", "up")):
+            _write(os.path.join(connection_dir, attribute), value + "\n")
+        _write(os.path.join(os.path.dirname(os.path.dirname(disk_dir)), "queue_depth"), "32\n")
+        _write(os.path.join(os.path.dirname(os.path.dirname(disk_dir)), "wwid"), f"naa.6001405{i:025x}\n")
+        os.makedirs(os.path.join(sys_root, "class", "block"), exist_ok=True)
+        os.makedirs(os.path.join(sys_root, "block"), exist_ok=True)
+        os.symlink(disk_dir, os.path.join(sys_root, "class", "block", name))
+        os.symlink(disk_dir, os.path.join(sys_root, "block", name))
+        os.symlink(os.path.dirname(os.path.dirname(disk_dir)), os.path.join(disk_dir, "device"))
+        disk = {"name": name, "kname": name, "pkname": None, "maj:min": devno, "size": 107374182400,
+                "type": "disk", "tran": "iscsi", "fstype": None, "uuid": None, "label": None,
+                "wwn": f"0x6001405{i:09x}", "serial": f"bench{i:06d}"}
+        lsblk_rows.append(disk)
+
+        if i % 2:
+            part = name + "1"
+            part_dir = os.path.join(disk_dir, part)
+            _write(os.path.join(part_dir, "partition"), "1\n")
+            _write(os.path.join(part_dir, "dev"), f"8:{i * 16 + 1}\n")
+            _write(os.path.join(part_dir, "size"), "209711104\n")
+            os.symlink(part_dir, os.path.join(sys_root, "class", "block", part))
+            disk["children"] = [{"name": part, "kname": part, "pkname": name, "maj:min": f"8:{i * 16 + 1}",
+                                 "size": 107372085248, "type": "part", "tran": None, "fstype": "xfs",
+                                 "uuid": f"00000000-0000-4000-8000-{i:012d}", "label": None,
+                                 "wwn": disk["wwn"], "serial": None}]
+
+    _write(os.path.join(root, "proc", "diskstats"),
+           "".join(f"   8 {i * 16} {_disk_name(i)} 1200 0 96000 2400 800 0 64000 4000 0 3000 6400 0 0 0 0\n" for i in range(scale)))
+    _write(os.path.join(sys_root, "kernel", "uevent_seqnum"), "1000\n")
+    _write(os.path.join(root, "proc", "mountinfo"), "")
+    return lsblk_rows
+
+
+def _case_pattern(pattern):
+    """Quotes the literal parts of a glob so spaces and dashes survive `case`."""
+    return "*".join(f'"{part}"' if part else "" for part in pattern.split("*"))
+
+
+def build_sandbox(root, scale):
+    """Writes the fake sysfs, the canned command output and the stub binaries."""
+    data = os.path.join(root, "data")
+    lsblk_rows = _build_sysfs(root, scale)
+    iqns = [f"iqn.2024-01.org.example:bench.target{i}" for i in range(scale)]
+    _write(os.path.join(data, "lsblk.json"), json.dumps({"blockdevices": lsblk_rows}, indent=2) + "\n")
+    _write(os.path.join(data, "discovery.txt"), "".join(f"{PORTAL}:3260,1 {iqn}\n" for iqn in iqns))
+    _write(os.path.join(data, "session.txt"),
+           "".join(f"tcp: [{i + 1}] {PORTAL}:3260,1 {iqn} (non-flash)\n" for i, iqn in enumerate(iqns)))
+    _write(os.path.join(data, "nmcli_devices.txt"),
+           "".join(f"eth{i}:ethernet\n" for i in range(max(scale, 2))) + "lo:loopback\n")
+    _write(os.path.join(data, "systemctl_active.txt"), "active\ninactive\ninactive\n")
+    _write(os.path.join(data, "systemctl_inactive.txt"), "inactive\n")
+    _write(os.path.join(data, "vgs.txt"), f"  repo_vg:{scale}:{scale * 107369988096}:{scale * 107369988096}\n")
+    _write(os.path.join(data, "mdadm_detail.txt"), "ARRAY /dev/md/repo metadata=1.2 name=bench:repo UUID=3b6a2c1e:5f1d2a7b:9c0e4d3f:1a2b3c4d\n")
+    _write(os.path.join(data, "xfs_info.txt"),
+           "meta-data=/dev/sdb1              isize=512    agcount=16, agsize=1638400 blks\n"
+           "         =                       crc=1        finobt=1, sparse=1, rmapbt=0\n"
+           "         =                       reflink=1    bigtime=1 inobtcount=1\n"
+           "data     =                       bsize=4096   blocks=26214144, imaxpct=25\n"
+           "         =                       sunit=16     swidth=64 blks\n")
+    os.makedirs(os.path.join(root, "etc", "systemd", "system"))
+    for path in ("etc/iscsi/iscsid.conf", "etc/ssh/sshd_config", "etc/fstab"):
+        _write(os.path.join(root, path), "")
+
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    for name, cases in STUBS.items():
+        lines = ["#!/bin/sh", 'case "$*" in']
+        for pattern, output, code, *script in cases:
+            cat = f'/bin/cat "{os.path.join(data, output)}"; ' if output else ""
+            run = "".join(f"{snippet.replace('{sys}', os.path.join(root, 'sys'))}; " for snippet in script)
+            lines.append(f"  {_case_pattern(pattern)}) {run}{cat}exit {code} ;;")
+        lines += ["esac", "exit 0", ""]
+        stub = os.path.join(bin_dir, name)
+        _write(stub, "\n".join(lines))
+        os.chmod(stub, 0o755)
+    return bin_dir
+
+
+def run_scenario(name, scale, keep=False):
+    root = tempfile.mkdtemp(prefix=f"lrm-bench-{name}-{scale}-")
+    try:
+        bin_dir = build_sandbox(root, scale)
+        env = dict(os.environ, PATH=bin_dir, TERM=os.environ.get("TERM", "xterm"))
+        answers = SCENARIOS[name].replace("{root}", root)
+
+        with open(os.path.join(root, "output.txt"), "w") as output:
+            start = time.perf_counter()
+            process = subprocess.Popen([sys.executable, SANDBOX_DRIVER, root], stdin=subprocess.PIPE,
+                                       stdout=output, stderr=subprocess.STDOUT, env=env)
+            process.stdin.write(answers.encode())
+            process.stdin.close()
+            _, status, usage = os.wait4(process.pid, 0)
+            wall = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        commands = 0
+        command_time = 0.0
+        with open(os.path.join(root, "trace.jsonl")) as f:
+            for line in f:
+                record = json.loads(line)
+                if record["type"] == "command":
+                    commands += 1
+                    command_time += record["duration"]
+
+        return {
+            "scenario": name,
+            "scale": scale,
+            "exit_code": process.returncode,
+            "wall_s": round(wall, 3),
+            "procs": commands,
+            "command_s": round(command_time, 3),
+            "peak_rss_kb": usage.ru_maxrss,
+        }
+    finally:
+        if keep:
+            print(f"Kept sandbox {root}", file=sys.stderr)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of lrm menu actions using stub binaries")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 50, 500], help="Disk/target counts (default: 1 50 500)")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="Run only these scenarios")
+    parser.add_argument("--keep", action="store_true", help="Keep the sandboxes (trace.jsonl, output.txt) for inspection")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per run instead of a table")
+    args = parser.parse_args()
+
+    if not args.json:
+        print(f"{'SCENARIO':<20} {'SCALE':>5} {'WALL':>8} {'PROCS':>6} {'CMD TIME':>9} {'PEAK RSS':>10}  EXIT")
+    for scenario in args.only or SCENARIOS:
+        for scale in args.scales:
+            if scale < MIN_SCALE.get(scenario, 1):
+                continue
+            result = run_scenario(scenario, scale, args.keep)
+            if args.json:
+                print(json.dumps(result), flush=True)
+            else:
+                print(f"{result['scenario']:<20} {result['scale']:>5} {result['wall_s']:>7.2f}s {result['procs']:>6} "
+                      f"{result['command_s']:>8.2f}s {result['peak_rss_kb'] / 1024:>8.1f}MB  {result['exit_code']}", flush=True)
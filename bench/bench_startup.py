@@ -0,0 +1,83 @@
+"""Measures how long lrm takes to reach its main menu and exit.
+
+Each launch answers "0" (Exit) to the main menu, so the timing covers
+interpreter start, imports, terminal setup and the first render. The first
+launch is reported as "cold": the bytecode cache points at an empty directory and,
+when running as root with --drop-caches, the page cache is dropped first.
+The following launches are "warm".
+
+Usage:
+    python3 bench/bench_startup.py                         # from source
+    python3 bench/bench_startup.py -- ./dist/lrm           # released binary
+    python3 bench/bench_startup.py --max-warm-ms 150 -- python3 dist/lrm.pyz
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_COMMAND = [sys.executable, os.path.join(ROOT, "src", "main.py")]
+
+
+def _drop_caches():
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def launch(command, env):
+    start = time.perf_counter()
+    subprocess.run(command, input=b"0\n", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def run(command, warm_runs, drop_caches):
+    env = dict(os.environ, TERM=os.environ.get("TERM", "xterm"))
+    with tempfile.TemporaryDirectory() as pycache:
+        # An empty cache prefix forces every module to be compiled again.
+        dropped = drop_caches and _drop_caches()
+        cold = launch(command, dict(env, PYTHONPYCACHEPREFIX=pycache))
+
+    launch(command, env)  # make sure the regular __pycache__ is populated
+    warm = [launch(command, env) for _ in range(warm_runs)]
+    return {
+        "command": command,
+        "page_cache_dropped": dropped,
+        "cold_ms": round(cold, 1),
+        "warm_min_ms": round(min(warm), 1),
+        "warm_median_ms": round(statistics.median(warm), 1),
+        "warm_max_ms": round(max(warm), 1),
+        "warm_runs": warm_runs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup-time benchmark for lrm")
+    parser.add_argument("--runs", type=int, default=10, help="Number of warm launches (default: 10)")
+    parser.add_argument("--drop-caches", action="store_true", help="Drop the page cache before the cold launch (root only)")
+    parser.add_argument("--max-warm-ms", type=float, help="Exit with status 1 if the warm median exceeds this")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    parser.add_argument("command", nargs="*", help="Command that launches lrm (default: the sources)")
+    args = parser.parse_args()
+
+    result = run(args.command or DEFAULT_COMMAND, max(args.runs, 1), args.drop_caches)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"Command:     {' '.join(result['command'])}")
+        print(f"Cold launch: {result['cold_ms']} ms" + (" (page cache dropped)" if result["page_cache_dropped"] else ""))
+        print(f"Warm launch: median {result['warm_median_ms']} ms, min {result['warm_min_ms']} ms, "
+              f"max {result['warm_max_ms']} ms over {result['warm_runs']} runs")
+
+    if args.max_warm_ms is not None and result["warm_median_ms"] > args.max_warm_ms:
+        print(f"Warm median {result['warm_median_ms']} ms exceeds the {args.max_warm_ms} ms budget.")
+        sys.exit(1)
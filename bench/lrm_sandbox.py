@@ -0,0 +1,49 @@
+"""Runs lrm against the fake system built by bench_actions.py.
+
+The block device probes and every file the tool writes are pointed into the
+sandbox directory, and PATH only contains the stub binaries. A scenario can
+then run as an unprivileged user without touching the host. Prompts are read
+from stdin, and the trace lists every command that was spawned.
+
+Usage: python3 bench/lrm_sandbox.py SANDBOX_DIR < answers
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from iscsi import iscsi_auth, iscsi_discovery, iscsi_monitor, iscsi_multipath, iscsi_profiles
+from ssh import ssh_setup
+from storage import storage_benchmark, storage_inventory, storage_mount, storage_probe, storage_queue, storage_raid, storage_setup
+import main
+
+
+def redirect(sandbox):
+    sys_root = os.path.join(sandbox, "sys")
+    storage_probe.SYS_BLOCK = os.path.join(sys_root, "block")
+    storage_probe.SYS_CLASS_BLOCK = os.path.join(sys_root, "class", "block")
+    storage_probe.ISCSI_SESSION_CLASS = os.path.join(sys_root, "class", "iscsi_session")
+    storage_probe.UDEV_DATA = os.path.join(sandbox, "run", "udev", "data")
+    storage_probe.DISK_BY_UUID = os.path.join(sandbox, "dev", "disk", "by-uuid")
+    storage_inventory.UEVENT_SEQNUM_PATH = os.path.join(sys_root, "kernel", "uevent_seqnum")
+    storage_inventory.MOUNTINFO_PATH = os.path.join(sandbox, "proc", "mountinfo")
+    storage_benchmark.RESULTS_PATH = os.path.join(sandbox, "var", "lib", "lrm", "disk_benchmarks.jsonl")
+    storage_mount.SYSTEMD_UNIT_DIR = os.path.join(sandbox, "etc", "systemd", "system")
+    storage_queue.UDEV_RULES_PATH = os.path.join(sandbox, "etc", "udev", "rules.d", "99-lrm-block-queue.rules")
+    storage_raid.MDADM_CONF_PATHS = (os.path.join(sandbox, "etc", "mdadm", "mdadm.conf"), os.path.join(sandbox, "etc", "mdadm.conf"))
+    storage_setup.FSTAB_PATH = os.path.join(sandbox, "etc", "fstab")
+    iscsi_profiles.ISCSI_CONNECTION_CLASS = os.path.join(sys_root, "class", "iscsi_connection")
+    iscsi_discovery.DISCOVERY_CACHE_PATH = os.path.join(sandbox, "var", "cache", "lrm", "iscsi_discovery.json")
+    iscsi_discovery.NODE_DB_DIRS = (os.path.join(sandbox, "etc", "iscsi", "nodes"),)
+    iscsi_monitor.DISKSTATS_PATH = os.path.join(sandbox, "proc", "diskstats")
+    iscsi_multipath.MULTIPATH_CONF_PATH = os.path.join(sandbox, "etc", "multipath.conf")
+    iscsi_auth.ISCSID_CONF_PATH = os.path.join(sandbox, "etc", "iscsi", "iscsid.conf")
+    ssh_setup.SSHD_CONFIG_PATH = os.path.join(sandbox, "etc", "ssh", "sshd_config")
+
+
+if __name__ == "__main__":
+    sandbox = os.path.abspath(sys.argv[1])
+    redirect(sandbox)
+    sys.argv = ["lrm", "--trace", os.path.join(sandbox, "trace.jsonl")]
+    main.main()
@@ -0,0 +1,47 @@
+"""Builds lrm.pyz: the sources plus blessed in one zipapp, with precompiled bytecode.
+
+Unlike the PyInstaller --onefile binary, a zipapp is never unpacked to /tmp,
+so it starts quickly on noexec /tmp and slow disks. It needs a python3 on the
+target; build it with the same Python minor version the hosts run so the
+bundled .pyc files are used (otherwise Python falls back to the sources).
+
+Usage: python3 packaging/build_zipapp.py [--output dist/lrm.pyz]
+"""
+import argparse
+import compileall
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipapp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+
+def build(output, interpreter):
+    with tempfile.TemporaryDirectory() as staging:
+        subprocess.run(
+            [sys.executable, "-m", "pip", "install", "--quiet", "--target", staging,
+             "-r", os.path.join(ROOT, "requirements.txt")],
+            check=True
+        )
+        shutil.copytree(SRC, staging, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns("__pycache__", "*.pyc"))
+
+        # zipimport only loads legacy-layout .pyc files (module.pyc next to module.py)
+        if not compileall.compile_dir(staging, quiet=1, legacy=True, optimize=0):
+            raise SystemExit("Byte-compiling the sources failed.")
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        zipapp.create_archive(staging, output, interpreter=interpreter, main="main:main", compressed=True)
+    print(f"Built {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=os.path.join(ROOT, "dist", "lrm.pyz"))
+    parser.add_argument("--interpreter", default="/usr/bin/env python3")
+    args = parser.parse_args()
+    build(args.output, args.interpreter)
@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import tracing
+
+_print_lock = threading.Lock()
+
+
+class Task:
+    """One step of an apply run: a callable plus the names of the tasks it waits for."""
+
+    def __init__(self, name, action, deps=()):
+        self.name = name
+        self.action = action
+        self.deps = list(deps)
+
+
+def _log(message):
+    with _print_lock:
+        print(message, flush=True)
+
+
+def check_graph(tasks):
+    """Raises ValueError for unknown dependencies or cycles; returns the tasks in a valid order."""
+    by_name = {task.name: task for task in tasks}
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in by_name:
+                raise ValueError(f"Task '{task.name}' depends on unknown task '{dep}'.")
+
+    ordered = []
+    remaining = {task.name: set(task.deps) for task in tasks}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between: {', '.join(sorted(remaining))}")
+        for name in ready:
+            ordered.append(by_name[name])
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return ordered
+
+
+def run_graph(tasks, max_workers=4):
+    """Runs every task as soon as all of its dependencies succeeded.
+
+    Independent branches run concurrently on up to max_workers threads. A task
+    whose dependency failed is skipped. Returns {name: (status, elapsed, error)}
+    where status is "ok", "failed" or "skipped".
+    """
+    check_graph(tasks)
+    pending = {task.name: task for task in tasks}
+    results = {}
+
+    def run(task):
+        """Returns (elapsed, error); a failed task's time counts too."""
+        _log(f"[{task.name}] started")
+        start = time.monotonic()
+        try:
+            with tracing.task(task.name):
+                task.action()
+        except Exception as e:
+            return time.monotonic() - start, e
+        return time.monotonic() - start, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            for name, task in list(pending.items()):
+                dep_status = [results[dep][0] for dep in task.deps if dep in results]
+                if any(status != "ok" for status in dep_status):
+                    results[name] = ("skipped", 0.0, None)
+                    _log(f"[{name}] skipped (a dependency did not succeed)")
+                    del pending[name]
+                elif len(dep_status) == len(task.deps):
+                    running[pool.submit(run, task)] = task
+                    del pending[name]
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                elapsed, error = future.result()
+                if error is None:
+                    results[task.name] = ("ok", elapsed, None)
+                    _log(f"[{task.name}] done in {elapsed:.1f}s")
+                else:
+                    results[task.name] = ("failed", elapsed, error)
+                    _log(f"[{task.name}] FAILED after {elapsed:.1f}s: {error}")
+
+    return results
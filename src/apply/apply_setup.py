@@ -0,0 +1,243 @@
+import json
+import os
+
+from apply.apply_graph import Task, check_graph, run_graph
+from iscsi import iscsi_auth, iscsi_profiles, iscsi_setup
+from network import network_setup
+from ssh import ssh_setup
+from storage import storage_mkfs, storage_mount, storage_probe, storage_setup, storage_wait
+from users import users_setup
+
+
+def load_spec(path):
+    """Loads an apply spec from JSON, or YAML when PyYAML is installed."""
+    with open(path, "r") as f:
+        content = f.read()
+
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML specs need the PyYAML package. Install it or convert the spec to JSON.")
+        spec = yaml.safe_load(content)
+    else:
+        spec = json.loads(content)
+
+    if not isinstance(spec, dict):
+        raise ValueError("The spec must be a mapping with network/iscsi/storage/users/ssh sections.")
+    return spec
+
+
+def _network_tasks(spec):
+    settings = spec.get("network")
+    if not settings:
+        return []
+    if settings.get("type", "normal") == "bonded":
+        if len(settings.get("interfaces", [])) < 2:
+            raise ValueError("network.interfaces needs at least two interfaces for a bond.")
+    elif not settings.get("interface"):
+        raise ValueError("network.interface is required.")
+    if settings.get("method", "dhcp") == "static" and "/" not in settings.get("address", ""):
+        raise ValueError("network.address must use CIDR notation (e.g., 192.168.1.1/24).")
+
+    return [Task("network", lambda: network_setup.apply_network(settings))]
+
+
+def _iscsi_tasks(spec, network_deps):
+    settings = spec.get("iscsi")
+    if not settings:
+        return []
+
+    tasks = []
+    login_deps = list(network_deps)
+    chap = settings.get("chap")
+    if chap:
+        tasks.append(Task("iscsi:chap", lambda: iscsi_auth.write_chap_settings(chap["username"], chap["password"])))
+        login_deps.append("iscsi:chap")
+
+    wanted = settings.get("targets", "all")
+    portals = settings.get("portals", [])
+    if not portals:
+        raise ValueError("iscsi.portals must list at least one portal IP.")
+    profile = settings.get("profile")
+    if profile and profile not in iscsi_profiles.PROFILES:
+        raise ValueError(f"Unknown iscsi.profile '{profile}'. Choose one of: {', '.join(iscsi_profiles.PROFILES)}.")
+
+    for portal in portals:
+        def login(portal=portal):
+            # A spec run must see the SAN as it is now, not a cached answer.
+            discovered_targets, active_iqns, _ = iscsi_setup.discover_targets([portal], refresh=True)
+            iqns = [iqn for iqn in discovered_targets if (wanted == "all" or iqn in wanted) and iqn not in active_iqns]
+            if profile and iqns:
+                failed_updates = iscsi_profiles.apply_profile(iqns, profile)
+                if failed_updates:
+                    raise RuntimeError(f"Could not apply the '{profile}' profile: {failed_updates[0][2]}")
+            _, failed = iscsi_setup.login_targets(iqns)
+            if failed:
+                raise RuntimeError(f"Login failed for {', '.join(iqn for iqn, _ in failed)}")
+        tasks.append(Task(f"iscsi:login:{portal}", login, login_deps))
+    return tasks
+
+
+def _storage_tasks(spec, iscsi_deps):
+    tasks = []
+    for entry in spec.get("storage", []):
+        device = entry.get("device")
+        if not device:
+            raise ValueError("Every storage entry needs a device.")
+        fs_type = entry.get("filesystem", "xfs")
+        if fs_type not in ["xfs", "ext4", "ext3", "ext2"]:
+            raise ValueError(f"Unsupported filesystem '{fs_type}' for {device}.")
+        if entry.get("mount_profile", "default") not in storage_mount.MOUNT_PROFILES[fs_type]:
+            raise ValueError(f"Unknown mount_profile '{entry['mount_profile']}' for {fs_type}. Choose one of: {', '.join(storage_mount.MOUNT_PROFILES[fs_type])}.")
+        if entry.get("mkfs_profile", "default") not in storage_mkfs.MKFS_PROFILES.get(fs_type, {"default": None}):
+            raise ValueError(f"Unknown mkfs_profile '{entry['mkfs_profile']}' for {fs_type}.")
+        stripe = storage_mkfs.parse_stripe(str(entry["stripe"])) if entry.get("stripe") else None
+        if entry.get("persist", "fstab") not in ("fstab", "systemd", "none"):
+            raise ValueError(f"persist must be fstab, systemd or none for {device}.")
+
+        # The partition path is only known once the partition exists.
+        state = {"target": device}
+
+        def partition(entry=entry, state=state):
+            # by-path/by-id links appear some time after the LUN is logged in; partition the real node
+            disk_path = storage_wait.wait_for_device(entry["device"], entry.get("device_timeout", storage_wait.DEVICE_WAIT_TIMEOUT))
+            state["target"] = storage_setup.partition_whole_disk(disk_path, entry.get("partition_timeout", storage_wait.PARTITION_WAIT_TIMEOUT))
+
+        def mkfs(entry=entry, state=state, fs_type=fs_type, stripe=stripe):
+            device_path = storage_wait.wait_for_device(state["target"], entry.get("device_timeout", storage_wait.DEVICE_WAIT_TIMEOUT))
+            profile = entry.get("mkfs_profile", "default")
+            # Without an explicit stripe, use what the LUN or array advertises.
+            if not stripe and storage_mkfs.MKFS_PROFILES.get(fs_type, {}).get(profile, {}).get("align"):
+                stripe = storage_mkfs.detect_stripe(device_path)
+            storage_setup.create_filesystem(device_path, fs_type, force=entry.get("force", False), extra_args=storage_mkfs.mkfs_args(fs_type, profile, stripe, device_path))
+            problems = storage_mkfs.verify_filesystem(device_path, fs_type, profile, stripe)
+            if problems:
+                raise RuntimeError(f"{device_path} does not match mkfs_profile '{profile}': {'; '.join(problems)}")
+
+        def mount(entry=entry, state=state, fs_type=fs_type):
+            device_path = os.path.realpath(state["target"])
+            options = entry.get("options") or storage_mount.get_mount_options(fs_type, entry.get("mount_profile", "default"))
+            storage_setup.mount_device(device_path, entry["mount"], options)
+            network = storage_probe.is_iscsi(device_path)
+            persist = entry.get("persist", "fstab" if entry.get("fstab", True) else "none")
+            if persist == "systemd":
+                storage_mount.write_mount_unit(device_path, entry["mount"], options, network)
+            elif persist == "fstab":
+                storage_setup.add_fstab_entry(storage_setup.build_fstab_entry(device_path, entry["mount"], storage_mount.persistent_options(options, network)))
+
+        deps = list(iscsi_deps)
+        if entry.get("partition", True):
+            tasks.append(Task(f"partition:{device}", partition, deps))
+            deps = [f"partition:{device}"]
+        tasks.append(Task(f"mkfs:{device}", mkfs, deps))
+        if entry.get("mount"):
+            tasks.append(Task(f"mount:{device}", mount, [f"mkfs:{device}"]))
+    return tasks
+
+
+def _user_tasks(spec, passwords):
+    tasks = []
+    for entry in spec.get("users", []):
+        username = entry.get("name")
+        user_type = entry.get("type", "standard")
+        public_key = entry.get("ssh_key")
+
+        if user_type == "veeam":
+            username = "veeamsvc"
+            def create(public_key=public_key, sudo=entry.get("sudo", True)):
+                passwords["veeamsvc"] = users_setup.create_veeam_user(public_key, sudo)
+        elif user_type == "ansible":
+            username = "ansible"
+            if not public_key:
+                raise ValueError("A public key is mandatory for the 'ansible' user.")
+            def create(public_key=public_key):
+                users_setup.create_ansible_user(public_key)
+        elif username:
+            def create(username=username, entry=entry, public_key=public_key):
+                password = users_setup.create_user(
+                    username, entry.get("shell", "/bin/bash"), public_key,
+                    with_password=entry.get("password", True), sudo=entry.get("sudo", False)
+                )
+                if password:
+                    passwords[username] = password
+        else:
+            raise ValueError("Every user entry needs a name (or type: veeam/ansible).")
+
+        tasks.append(Task(f"user:{username}", create))
+    return tasks
+
+
+def _ssh_tasks(spec, user_deps):
+    settings = spec.get("ssh")
+    if not settings:
+        return []
+
+    tasks = []
+    harden_deps = list(user_deps)
+    if "enabled" in settings:
+        tasks.append(Task("ssh:service", lambda: ssh_setup.set_ssh_service(settings["enabled"])))
+        harden_deps.append("ssh:service")
+    if settings.get("harden"):
+        def harden():
+            ssh_setup.write_hardened_config()
+            ssh_setup.restart_ssh_service()
+        # Keys must be in place before password logins are switched off.
+        tasks.append(Task("ssh:harden", harden, harden_deps))
+    return tasks
+
+
+def build_tasks(spec, passwords):
+    """Turns a spec into the task graph: network -> iSCSI login -> partition -> mkfs -> mount.
+
+    Users and the SSH service do not depend on storage and run alongside it;
+    SSH hardening waits for the users so their keys exist first.
+    """
+    tasks = _network_tasks(spec)
+    network_deps = [task.name for task in tasks]
+
+    iscsi_tasks = _iscsi_tasks(spec, network_deps)
+    tasks += iscsi_tasks
+    iscsi_deps = [task.name for task in iscsi_tasks if task.name.startswith("iscsi:login:")]
+
+    tasks += _storage_tasks(spec, iscsi_deps)
+
+    user_tasks = _user_tasks(spec, passwords)
+    tasks += user_tasks
+    tasks += _ssh_tasks(spec, [task.name for task in user_tasks])
+    return tasks
+
+
+def apply_spec(path, dry_run=False, jobs=4):
+    """Entry point for `lrm apply`. Returns the process exit code."""
+    passwords = {}
+    try:
+        spec = load_spec(path)
+        tasks = check_graph(build_tasks(spec, passwords))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Invalid spec {path}: {e}")
+        return 2
+
+    print("Execution plan:")
+    for task in tasks:
+        deps = f" (after {', '.join(task.deps)})" if task.deps else ""
+        print(f"  {task.name}{deps}")
+    if dry_run:
+        return 0
+
+    print()
+    results = run_graph(tasks, max_workers=jobs)
+
+    print("\n--- Summary ---")
+    for task in tasks:
+        status, elapsed, error = results[task.name]
+        line = f"  {status.upper():<8} {task.name} ({elapsed:.1f}s)"
+        if error:
+            line += f": {error}"
+        print(line)
+
+    for username, password in passwords.items():
+        print(f"\nPassword for '{username}': {password}")
+        print("WARNING: SAVE THIS PASSWORD IN A SECURE PLACE! IT WILL NOT BE DISPLAYED AGAIN!")
+
+    return 0 if all(result[0] == "ok" for result in results.values()) else 1
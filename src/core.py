@@ -1,16 +1,163 @@
 import os
-from blessed import Terminal
+import subprocess
+import sys
+import time
 
-term = Terminal()
+import tracing
 
-def clear_screen():
-    print(term.clear)
+_term = None
+
+def get_terminal():
+    """Returns the shared blessed Terminal, creating it on first use.
+
+    Importing blessed and probing the terminal is the slowest part of startup,
+    and `lrm apply` never needs it.
+    """
+    global _term
+    if _term is None:
+        from blessed import Terminal
+        _term = Terminal()
+    return _term
+
+def __getattr__(name):
+    # Keeps `core.term` working for callers while the Terminal stays lazy.
+    if name == "term":
+        return get_terminal()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Seconds an external command may run before it is killed. Probes (lsblk,
+# iscsiadm -m session, systemctl is-active...) should answer almost instantly;
+# anything that writes to disks gets LONG_TIMEOUT instead.
+DEFAULT_TIMEOUT = 60
+LONG_TIMEOUT = 3600
+
+
+class CommandResult(subprocess.CompletedProcess):
+    """Result of an external command, with its wall time and timeout status."""
+
+    def __init__(self, args, returncode, stdout=None, stderr=None, elapsed=0.0, timed_out=False):
+        super().__init__(args, returncode, stdout, stderr)
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+
+    def check_returncode(self):
+        if self.timed_out:
+            raise subprocess.TimeoutExpired(self.args, self.elapsed, self.stdout, self.stderr)
+        super().check_returncode()
+
+
+async def run_command_async(args, input=None, timeout=DEFAULT_TIMEOUT, capture=True, text=True, check=False):
+    """Runs one external command on the event loop and returns a CommandResult.
+
+    With capture=False the command writes straight to the terminal. A command
+    that exceeds its timeout is killed; with check=True this raises
+    subprocess.TimeoutExpired, a non-zero exit raises CalledProcessError.
+    """
+    import asyncio
+
+    args = [str(arg) for arg in args]
+    pipe = asyncio.subprocess.PIPE if capture else None
+    if text and isinstance(input, str):
+        input = input.encode("utf-8")
+
+    start = time.monotonic()
+    wall_start = time.time()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if input is not None else None,
+            stdout=pipe,
+            stderr=pipe
+        )
+    except OSError as e:
+        tracing.record_command(args, wall_start, time.time(), 127, error=str(e))
+        raise
+    timed_out = False
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(input), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        process.kill()
+        stdout, stderr = await process.communicate()
+    elapsed = time.monotonic() - start
+
+    if tracing.active():
+        output_bytes = len(stdout or b"") + len(stderr or b"") if capture else None
+        tracing.record_command(args, wall_start, wall_start + elapsed, process.returncode, output_bytes, timed_out)
+
+    if text:
+        stdout = stdout.decode("utf-8", errors="replace") if stdout is not None else None
+        stderr = stderr.decode("utf-8", errors="replace") if stderr is not None else None
+
+    result = CommandResult(args, process.returncode, stdout, stderr, elapsed, timed_out)
+    if check:
+        result.check_returncode()
+    return result
+
+
+async def _gather_commands(commands, max_parallel=None, on_result=None, **kwargs):
+    import asyncio
+
+    semaphore = asyncio.Semaphore(max_parallel) if max_parallel else None
+
+    async def run_one(index, args):
+        try:
+            if semaphore:
+                async with semaphore:
+                    result = await run_command_async(args, **kwargs)
+            else:
+                result = await run_command_async(args, **kwargs)
+        except OSError as e:
+            # A missing binary must not sink the other probes in the batch.
+            result = CommandResult([str(arg) for arg in args], 127, "", str(e))
+        if on_result:
+            on_result(index, result)
+        return result
+
+    return await asyncio.gather(*(run_one(index, args) for index, args in enumerate(commands)))
+
+
+def run_command(args, input=None, timeout=DEFAULT_TIMEOUT, capture=True, text=True, check=False):
+    """Runs one external command with a timeout. See run_command_async."""
+    # asyncio costs more to import than the whole main menu; load it on first command.
+    import asyncio
+    return asyncio.run(run_command_async(args, input=input, timeout=timeout, capture=capture, text=text, check=check))
 
-def display_menu(options, is_main_menu=False, subtitle=None):
-    clear_screen()
 
-    # --- Title ---
-    title = """
+def run_commands(commands, timeout=DEFAULT_TIMEOUT, text=True, max_parallel=None, on_result=None):
+    """Runs independent commands concurrently and returns their results in order.
+
+    Output is always captured and errors never raise: a command whose binary
+    is missing comes back with returncode 127, callers inspect each result.
+    At most max_parallel commands run at once (default: all). on_result(index,
+    result) is called as each command finishes, e.g. to print progress.
+    """
+    if not commands:
+        return []
+    import asyncio
+    return asyncio.run(_gather_commands(commands, max_parallel, on_result, timeout=timeout, text=text))
+
+
+def parse_selection(selection, count):
+    """Turns '1,3-5' or 'all' into 0-based indices. Raises ValueError."""
+    selection = selection.strip().lower()
+    if selection == "all":
+        return list(range(count))
+    indices = []
+    for part in selection.split(","):
+        first, _, last = part.strip().partition("-")
+        first = int(first)
+        last = int(last) if last else first
+        if not 1 <= first <= last <= count:
+            raise ValueError(f"{part.strip()} is out of range")
+        indices += [i - 1 for i in range(first, last + 1) if i - 1 not in indices]
+    return indices
+
+
+def clear_screen():
+    print(get_terminal().clear)
+
+TITLE = """
   _      _                          ____                            _  _                      
  | |    (_) _ __   _   _ __  __    |  _ \   ___  _ __    ___   ___ (_)| |_   ___   _ __  _   _ 
  | |    | || '_ \ | | | |\ \/ /    | |_) | / _ \| '_ \  / _ \ / __|| || __| / _ \ | '__|| | | |
@@ -23,48 +170,46 @@ def display_menu(options, is_main_menu=False, subtitle=None):
                        |_|  |_| \__,_||_| |_| \__,_| \__, | \___||_|             
                                                      |___/                     
 """
-    title_lines = title.splitlines()
-    # Calculate the width of the title block for centering
-    block_width = max(len(line) for line in title_lines)
-    start_col = (term.width - block_width) // 2
 
-    for line in title_lines:
-        # Use term.move_x to set the starting column for each line
-        print(term.move_x(start_col) + line)
-
-    # --- Subtitle ---
-    if subtitle:
-        print(term.center(subtitle))
-        print() # Add a blank line
-
-    # --- Separator ---
-    print(term.center("--- --- ---"))
-    print()
+def _menu_frame(options, is_main_menu=False, subtitle=None, width=80, height=None):
+    """Lays out a menu as a list of (column, text) rows, plus the row of each choice.
 
-    # --- Options ---
-    option_lines = []
-    option_lines.append("Select an option:")
-    option_lines.append("") # Add a blank line
+    The returned choice rows are ordered 1..n, then 0 (Exit/Back). The banner
+    is dropped when the terminal is too short to show it with the options.
+    """
+    option_lines = ["Select an option:", ""]
+    option_lines += [f"{i+1}. {option}" for i, option in enumerate(options)]
+    option_lines += ["", "0. Exit" if is_main_menu else "0. Back"]
 
-    for i, option in enumerate(options):
-        option_lines.append(f"{i+1}. {option}")
+    header = []
+    subtitle_lines = subtitle.splitlines() if subtitle else []
+    title_lines = TITLE.splitlines()
+    title_width = max(len(line.rstrip()) for line in title_lines)
+    header_height = len(title_lines) + len(subtitle_lines) + (1 if subtitle else 0) + 2
+    if height is None or (header_height + len(option_lines) < height and title_width <= width):
+        header += [((width - title_width) // 2, line.rstrip()) for line in title_lines]
+    if subtitle:
+        header += [((width - len(line)) // 2, line) for line in subtitle_lines]
+        header.append((0, ""))
+    header += [((width - 11) // 2, "--- --- ---"), (0, "")]
 
-    if is_main_menu:
-        option_lines.append("")
-        option_lines.append("0. Exit")
-    else:
-        option_lines.append("")
-        option_lines.append("0. Back")
+    option_col = (width - max(len(line) for line in option_lines)) // 2
+    rows = header + [(option_col, line) for line in option_lines]
+    first = len(header) + 2
+    choice_rows = list(range(first, first + len(options))) + [len(rows) - 1]
+    return rows, choice_rows
 
-    # Calculate the width of the options block for centering
-    block_width = max(len(line) for line in option_lines)
-    start_col = (term.width - block_width) // 2
+def display_menu(options, is_main_menu=False, subtitle=None):
+    term = get_terminal()
+    clear_screen()
 
-    for line in option_lines:
+    rows, _ = _menu_frame(options, is_main_menu, subtitle, term.width)
+    for col, line in rows:
         # Use term.move_x to set the starting column for each line
-        print(term.move_x(start_col) + line)
+        print(term.move_x(max(col, 0)) + line)
 
 def get_choice(options):
+    term = get_terminal()
     print("\n" * 3)
     while True:
         try:
@@ -86,3 +231,98 @@ def get_choice(options):
             error_msg = "Invalid input. Enter a number."
             with term.location(x=(term.width - len(error_msg)) // 2):
                 print(error_msg)
+
+
+# Highlighted entry per menu, so returning to a menu keeps the cursor where it was.
+_last_selected = {}
+# In menus with 10 or more entries, how long a typed digit waits for a second one.
+DIGIT_TIMEOUT = 1.0
+
+def _interactive(options):
+    term = get_terminal()
+    # A window too small to hold the options (or a pty without a size) gets the prompt.
+    return sys.stdin.isatty() and term.is_a_tty and term.width >= 20 and term.height > len(options) + 6
+
+def select_option(options, is_main_menu=False, subtitle=None):
+    """Shows a menu and returns the chosen number (0 for Exit/Back).
+
+    On a terminal the menu is drawn once with a single write. Up/Down (or k/j)
+    then only rewrite the two rows whose highlight changed. Enter picks the
+    highlighted entry, a digit picks that entry directly, Esc/q/Backspace go
+    back. In menus with 10 or more entries a digit that could start a longer
+    number is only highlighted until the next digit, Enter or DIGIT_TIMEOUT.
+    A resize redraws the frame. Without a tty (piped input, scripts)
+    this falls back to the numbered prompt.
+    """
+    if not _interactive(options):
+        display_menu(options, is_main_menu, subtitle)
+        return get_choice(options)
+
+    term = get_terminal()
+    key = tuple(options)
+    choices = list(range(1, len(options) + 1)) + [0]
+    selected = _last_selected.get(key, 0)
+
+    def draw_row(rows, choice_rows, index):
+        col, line = rows[choice_rows[index]]
+        line = line[:term.width - max(col, 0)]
+        text = term.reverse(line) if index == selected else line
+        return term.move_yx(choice_rows[index], max(col, 0)) + text + term.clear_eol
+
+    def draw_frame():
+        rows, choice_rows = _menu_frame(options, is_main_menu, subtitle, term.width, term.height)
+        frame = [term.home + term.clear]
+        for y, (col, line) in enumerate(rows[:term.height]):
+            # The screen was just cleared: blank rows and choice rows (drawn below) need no bytes.
+            if line and y not in choice_rows:
+                # Rows must not wrap, or the positions of the highlighted entries shift.
+                frame.append(term.move_yx(y, max(col, 0)) + line[:term.width - max(col, 0)])
+        frame += [draw_row(rows, choice_rows, i) for i in range(len(choices)) if choice_rows[i] < term.height]
+        _write("".join(frame))
+        return rows, choice_rows
+
+    with term.cbreak(), term.hidden_cursor(), tracing.waiting(subtitle or f"menu: {options[0] if options else ''}"):
+        rows, choice_rows = draw_frame()
+        size = (term.width, term.height)
+        digits, digits_deadline = "", 0.0
+        while True:
+            keystroke = term.inkey(timeout=0.25)
+            if (term.width, term.height) != size:
+                size = (term.width, term.height)
+                rows, choice_rows = draw_frame()
+            if digits and not keystroke and time.monotonic() >= digits_deadline:
+                break
+            if not keystroke:
+                continue
+
+            previous = selected
+            typed, digits = digits, ""
+            if keystroke.code in (term.KEY_UP,) or keystroke == "k":
+                selected = (selected - 1) % len(choices)
+            elif keystroke.code in (term.KEY_DOWN, term.KEY_TAB) or keystroke == "j":
+                selected = (selected + 1) % len(choices)
+            elif keystroke.code == term.KEY_ENTER:
+                break
+            elif keystroke.code in (term.KEY_ESCAPE, term.KEY_BACKSPACE) or keystroke == "q":
+                selected = len(choices) - 1
+                break
+            elif keystroke.isdigit():
+                number = int(typed + keystroke) if int(typed + keystroke) in choices else int(keystroke)
+                if number in choices:
+                    selected = choices.index(number)
+                    # Nothing longer starts with these digits (always true below 10 entries).
+                    if number == 0 or number * 10 > len(options):
+                        break
+                    digits, digits_deadline = str(number), time.monotonic() + DIGIT_TIMEOUT
+
+            if selected != previous:
+                _write(draw_row(rows, choice_rows, previous) + draw_row(rows, choice_rows, selected))
+
+        _last_selected[key] = selected
+        # Leave the cursor below the menu so the action's output follows it.
+        _write(term.move_yx(min(len(rows), term.height - 1), 0) + "\n")
+    return choices[selected]
+
+def _write(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
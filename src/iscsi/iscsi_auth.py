@@ -1,18 +1,14 @@
+from iscsi import iscsi_profiles
+
+ISCSID_CONF_PATH = "/etc/iscsi/iscsid.conf"
+
 def setup_chap_authentication():
     print("Setting up CHAP Authentication...\n")
 
     chap_username = input("Enter CHAP username: ").strip()
     chap_password = input("Enter CHAP password: ").strip()
 
-    iscsid_conf_path = "/etc/iscsi/iscsid.conf"
-
-    new_chap_lines = [
-        "# Added by Hardened Repository Manager script:\n",
-        "node.session.auth.authmethod = CHAP\n",
-        f"node.session.auth.username = {chap_username}\n",
-        f"node.session.auth.password = {chap_password}\n",
-        "# End of iSCSI configuration made by the script.\n"
-    ]
+    new_chap_lines = _build_chap_lines(chap_username, chap_password)
 
     print("The following changes will be made to iscsid.conf:")
     for line in new_chap_lines:
@@ -22,23 +18,52 @@ def setup_chap_authentication():
 
     if confirmation == "yes":
         try:
-            with open(iscsid_conf_path, "r") as f:
-                lines = f.readlines()
-
-            lines = new_chap_lines + lines
-
-            with open(iscsid_conf_path, "w") as f:
-                f.writelines(lines)
+            write_chap_settings(chap_username, chap_password)
 
             print("CHAP authentication configured successfully!\n")
 
+            print("Targets discovered from now on can also start with a performance profile.")
+            profile = iscsi_profiles.choose_profile()
+            if profile:
+                write_profile_defaults(profile)
+                print(f"Profile '{profile}' set as the default for new targets.\n")
+
             print("Modified iscsid.conf contents:\n")
-            with open(iscsid_conf_path, "r") as f:
+            with open(ISCSID_CONF_PATH, "r") as f:
                 print(f.read())
 
         except FileNotFoundError:
-            print(f"Error: {iscsid_conf_path} not found.")
+            print(f"Error: {ISCSID_CONF_PATH} not found.")
         except Exception as e:
             print(f"An error occurred: {e}")
     else:
         print("CHAP authentication setup cancelled.")
+
+def _build_chap_lines(chap_username, chap_password):
+    return [
+        "# Added by Hardened Repository Manager script:\n",
+        "node.session.auth.authmethod = CHAP\n",
+        f"node.session.auth.username = {chap_username}\n",
+        f"node.session.auth.password = {chap_password}\n",
+        "# End of iSCSI configuration made by the script.\n"
+    ]
+
+def write_chap_settings(chap_username, chap_password):
+    """Prepends the CHAP settings to iscsid.conf. Raises FileNotFoundError if it is missing."""
+    with open(ISCSID_CONF_PATH, "r") as f:
+        lines = f.readlines()
+
+    lines = _build_chap_lines(chap_username, chap_password) + lines
+
+    with open(ISCSID_CONF_PATH, "w") as f:
+        f.writelines(lines)
+
+def write_profile_defaults(profile):
+    """Makes a performance profile the default for targets discovered from now on."""
+    with open(ISCSID_CONF_PATH, "r") as f:
+        lines = f.readlines()
+
+    lines = iscsi_profiles.apply_profile_to_config(lines, profile)
+
+    with open(ISCSID_CONF_PATH, "w") as f:
+        f.writelines(lines)
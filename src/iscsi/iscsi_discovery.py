@@ -0,0 +1,171 @@
+import json
+import os
+import time
+
+from core import run_commands
+from iscsi import iscsi_profiles
+from storage import storage_probe
+
+DISCOVERY_CACHE_PATH = "/var/cache/lrm/iscsi_discovery.json"
+# open-iscsi keeps one record per discovered node here (the path depends on the distribution).
+NODE_DB_DIRS = ("/etc/iscsi/nodes", "/var/lib/iscsi/nodes")
+# Targets rarely change; after this long discovery runs again on its own.
+DISCOVERY_TTL = 15 * 60
+
+
+def _parse_portals(discover_output):
+    """Maps each IQN to the portals ("ip:port") it was advertised on, in order."""
+    portals = {}
+    for line in discover_output.splitlines():
+        parts = line.split()
+        if len(parts) > 1:
+            portal = parts[0].rsplit(",", 1)[0]
+            portals.setdefault(parts[1], [])
+            if portal not in portals[parts[1]]:
+                portals[parts[1]].append(portal)
+    return portals
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _cache_key(ip, ifaces):
+    return f"{ip} via {','.join(ifaces)}" if ifaces else ip
+
+
+def _load_cache():
+    try:
+        with open(DISCOVERY_CACHE_PATH, "r") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    """Writes the index atomically so a crash never leaves half a file behind."""
+    try:
+        os.makedirs(os.path.dirname(DISCOVERY_CACHE_PATH), exist_ok=True)
+        tmp_path = f"{DISCOVERY_CACHE_PATH}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f, indent=1)
+        os.replace(tmp_path, DISCOVERY_CACHE_PATH)
+    except OSError:
+        pass
+
+
+def read_node_db(ip):
+    """Returns ({iqn: [portals]} of the targets recorded for the portal IP, newest record time) from the node database.
+
+    sendtargets on one IP may advertise a target on several portals, so every
+    portal recorded for such a target is returned, not only those on the IP.
+    """
+    targets, newest = {}, 0.0
+    for nodes_dir in NODE_DB_DIRS:
+        try:
+            iqns = sorted(os.listdir(nodes_dir))
+        except OSError:
+            continue
+        for iqn in iqns:
+            try:
+                records = sorted(os.listdir(os.path.join(nodes_dir, iqn)))
+            except OSError:
+                continue
+            # Records are named "ip,port,tpgt".
+            records = [(record, record.rsplit(",", 2)) for record in records if record.count(",") >= 2]
+            if not any(fields[0] == ip for _, fields in records):
+                continue
+            targets.setdefault(iqn, [])
+            for record, fields in records:
+                portal = f"{fields[0]}:{fields[1]}"
+                if portal not in targets[iqn]:
+                    targets[iqn].append(portal)
+                if fields[0] != ip:
+                    continue
+                try:
+                    newest = max(newest, os.path.getmtime(os.path.join(nodes_dir, iqn, record)))
+                except OSError:
+                    pass
+    return targets, newest
+
+
+def get_active_nodes():
+    """Returns the (IQN, portal) pairs that have a session, read from sysfs without running iscsiadm."""
+    nodes = set()
+    try:
+        sessions = os.listdir(storage_probe.ISCSI_SESSION_CLASS)
+    except OSError:
+        return nodes
+    for session in sessions:
+        iqn = _read(os.path.join(storage_probe.ISCSI_SESSION_CLASS, session, "targetname"))
+        connection_dir = os.path.join(iscsi_profiles.ISCSI_CONNECTION_CLASS, f"connection{session[7:]}:0")
+        address = _read(os.path.join(connection_dir, "persistent_address"))
+        port = _read(os.path.join(connection_dir, "persistent_port"))
+        if iqn:
+            nodes.add((iqn, f"{address}:{port}"))
+    return nodes
+
+
+def discover(portal_ips, refresh=False, ifaces=(), ttl=DISCOVERY_TTL):
+    """Returns the targets behind the portal IPs as ({iqn: [portals]}, {ip: age in seconds of cached answers}).
+
+    Answers younger than ttl come from the tool's index or, for IPs it has
+    never seen, from the open-iscsi node database. The remaining IPs are
+    discovered concurrently in one step and the index is updated. With
+    ifaces, iscsiadm records one node per iface so that logins can be bound
+    to them. Raises CalledProcessError if nothing could be discovered.
+    """
+    now = time.time()
+    cache = _load_cache()
+    answers, cached, stale = {}, {}, []
+    for ip in portal_ips:
+        entry = cache.get(_cache_key(ip, ifaces))
+        if not refresh and entry and now - entry.get("time", 0) < ttl:
+            answers[ip], cached[ip] = entry["targets"], now - entry["time"]
+            continue
+        if not refresh and not entry and not ifaces:
+            targets, recorded = read_node_db(ip)
+            if targets and now - recorded < ttl:
+                answers[ip], cached[ip] = targets, now - recorded
+                continue
+        stale.append(ip)
+
+    iface_args = [arg for iface in ifaces for arg in ("-I", iface)]
+    commands = [["iscsiadm", "-m", "discovery", "-t", "sendtargets", "-p", ip] + iface_args for ip in stale]
+    failed = []
+    for ip, result in zip(stale, run_commands(commands)):
+        if result.returncode == 0:
+            answers[ip] = _parse_portals(result.stdout)
+            cache[_cache_key(ip, ifaces)] = {"time": now, "targets": answers[ip]}
+            continue
+        failed.append(result)
+        entry = cache.get(_cache_key(ip, ifaces))
+        if entry:
+            print(f"Discovery on {ip} failed, using the answer from {int(now - entry.get('time', now))}s ago: {(result.stderr or '').strip()}")
+            answers[ip], cached[ip] = entry["targets"], now - entry.get("time", now)
+        else:
+            print(f"Discovery on {ip} failed: {(result.stderr or '').strip()}")
+    if stale and len(failed) < len(stale):
+        _save_cache(cache)
+    if failed and not answers:
+        failed[0].check_returncode()
+
+    targets = {}
+    for ip in portal_ips:
+        for iqn, portals in answers.get(ip, {}).items():
+            targets.setdefault(iqn, [])
+            targets[iqn] += [portal for portal in portals if portal not in targets[iqn]]
+    return targets, cached
+
+
+def describe_cached(cached):
+    """Returns a line telling which answers came from the cache, or ''."""
+    if not cached:
+        return ""
+    ages = ", ".join(f"{ip} ({int(age // 60)}m old)" for ip, age in cached.items())
+    return f"Cached discovery for {ages}; enter 'r' to discover again."
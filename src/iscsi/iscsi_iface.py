@@ -0,0 +1,169 @@
+import os
+import subprocess
+
+from core import run_command, run_commands
+from iscsi import iscsi_multipath, iscsi_nodes, iscsi_profiles, iscsi_setup
+from network import network_setup_networkmanager
+
+SYS_CLASS_NET = "/sys/class/net"
+IFACE_PREFIX = "lrm-"
+MAX_SESSIONS_PER_IFACE = 8
+
+
+def get_storage_interfaces():
+    """Returns the Ethernet NICs (bond members included) iSCSI sessions can be bound to.
+
+    Uses NetworkManager's device list and falls back to the physical NICs in
+    sysfs on hosts that do not run it.
+    """
+    interfaces = network_setup_networkmanager.get_available_interfaces()
+    if interfaces:
+        return interfaces
+    try:
+        names = sorted(os.listdir(SYS_CLASS_NET))
+    except OSError:
+        return []
+    return [name for name in names if os.path.exists(os.path.join(SYS_CLASS_NET, name, "device"))]
+
+
+def iface_name(nic):
+    return f"{IFACE_PREFIX}{nic}"
+
+
+def _parse_ifaces(output):
+    """Maps each iface record name to the NIC it is bound to ("" for unbound) from `iscsiadm -m iface`."""
+    ifaces = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) > 1:
+            fields = parts[1].split(",")
+            nic = fields[3] if len(fields) > 3 and fields[3] != "<empty>" else ""
+            ifaces[parts[0]] = nic
+    return ifaces
+
+
+def list_ifaces():
+    return _parse_ifaces(run_command(["iscsiadm", "-m", "iface"]).stdout)
+
+
+def create_ifaces(nics):
+    """Creates (or reuses) one iface record per NIC, bound with iface.net_ifacename.
+
+    Returns ([iface names], [(nic, error message)]).
+    """
+    existing = list_ifaces()
+    created, failed = [], []
+    new = [nic for nic in nics if iface_name(nic) not in existing]
+    results = run_commands([["iscsiadm", "-m", "iface", "-I", iface_name(nic), "-o", "new"] for nic in new], max_parallel=4)
+    for nic, result in zip(new, results):
+        if result.returncode != 0:
+            failed.append((nic, (result.stderr or "").strip() or f"exit code {result.returncode}"))
+
+    failed_nics = {nic for nic, _ in failed}
+    nics = [nic for nic in nics if nic not in failed_nics]
+    results = run_commands(
+        [["iscsiadm", "-m", "iface", "-I", iface_name(nic), "-o", "update", "-n", "iface.net_ifacename", "-v", nic] for nic in nics],
+        max_parallel=4,
+    )
+    for nic, result in zip(nics, results):
+        if result.returncode == 0:
+            created.append(iface_name(nic))
+        else:
+            failed.append((nic, (result.stderr or "").strip() or f"exit code {result.returncode}"))
+    return created, failed
+
+
+def bound_nodes(targets, ifaces):
+    """Returns one (IQN, portal, iface) node for every portal of every target on every iface."""
+    return [(iqn, portal, iface) for iqn, portals in targets.items() for portal in portals for iface in ifaces]
+
+
+def _select_nics(nics):
+    print("\nStorage interfaces:")
+    for i, nic in enumerate(nics):
+        print(f"{i+1}. {nic}")
+    while True:
+        try:
+            choices = input("Select the interfaces to carry iSCSI traffic (comma-separated, e.g., 1,2; 'all'): ").strip()
+            if choices.lower() == "all":
+                return list(nics)
+            indices = [int(c.strip()) - 1 for c in choices.split(",")]
+            if indices and all(0 <= i < len(nics) for i in indices):
+                return [nics[i] for i in dict.fromkeys(indices)]
+            print("Invalid selection. Please try again.")
+        except ValueError:
+            print("Invalid input. Please enter numbers separated by commas.")
+
+
+def setup_iface_binding():
+    print("\n--- iSCSI Interface Binding ---")
+    nics = get_storage_interfaces()
+    if not nics:
+        print("No Ethernet interfaces found.")
+        input("Press Enter to continue...")
+        return
+
+    try:
+        selected_nics = _select_nics(nics)
+        print(f"Binding iface records to {', '.join(selected_nics)}...")
+        ifaces, failed = create_ifaces(selected_nics)
+        for nic, message in failed:
+            print(f"  Could not create the iface for {nic}: {message}")
+        if not ifaces:
+            input("Press Enter to continue...")
+            return
+        if len(ifaces) > 1:
+            print("NOTE: NICs on the same subnet need net.ipv4.conf.all.arp_ignore=1, arp_announce=2 and rp_filter=2,")
+            print("      or replies for every session may leave through a single port.")
+
+        portal_ips = [ip.strip() for ip in input("\nEnter the iSCSI portal IP address(es) (comma-separated): ").split(",") if ip.strip()]
+        if not portal_ips:
+            print("IP address cannot be empty.")
+            input("Press Enter to continue...")
+            return
+
+        print(f"Discovering targets on {', '.join(portal_ips)} through {len(ifaces)} iface(s)...")
+        targets, active_nodes, _ = iscsi_multipath.discover_portals(portal_ips, ifaces)
+        active_iqns = {iqn for iqn, _ in active_nodes}
+        if not targets:
+            print("No iSCSI targets found.")
+            input("Press Enter to continue...")
+            return
+
+        iqns = list(targets)
+        print("\nDiscovered iSCSI Targets:")
+        for i, iqn in enumerate(iqns):
+            status = "(logged in)" if iqn in active_iqns else ""
+            print(f"{i+1}. {iqn} [{len(targets[iqn])} portal(s): {', '.join(targets[iqn])}] {status}")
+
+        while True:
+            try:
+                selection = input("\nSelect targets to bind (e.g., 1 or 1,3-5; 'new' for all not logged in; 'all'): ")
+                selected = iscsi_setup.parse_selection(selection, iqns, active_iqns)
+                if selected:
+                    break
+                print("No targets selected.")
+            except ValueError:
+                print("Invalid input.")
+
+        sessions_input = input(f"Sessions per iface and portal (node.session.nr_sessions, 1-{MAX_SESSIONS_PER_IFACE}) [1]: ").strip()
+        nr_sessions = int(sessions_input) if sessions_input.isdigit() and 1 <= int(sessions_input) <= MAX_SESSIONS_PER_IFACE else 1
+
+        nodes = bound_nodes({iqn: targets[iqn] for iqn in selected}, ifaces)
+        profile = iscsi_profiles.choose_profile()
+        if profile:
+            iscsi_setup.apply_profile(nodes, profile)
+        for node, key, message in iscsi_nodes.update_nodes(nodes, {"node.session.nr_sessions": nr_sessions}):
+            print(f"  Could not set {key} for {iscsi_nodes.node_label(node)}: {message}")
+
+        print(f"Logging in to {len(nodes)} target/portal/iface combination(s), {nr_sessions} session(s) each...")
+        iscsi_setup.print_summary("Login", *iscsi_setup.login_targets(nodes))
+        if any(len(targets[iqn]) * len(ifaces) * nr_sessions > 1 for iqn in selected):
+            print("Every LUN now shows up once per session; use 'Setup Multipath' to combine the paths.")
+
+    except subprocess.SubprocessError as e:
+        print(f"An error occurred: {e.stderr or e}")
+    except OSError as e:
+        print(f"An error occurred: {e}")
+
+    input("Press Enter to continue...")
@@ -1,5 +1,6 @@
-from core import clear_screen, display_menu, get_choice
-from iscsi import iscsi_setup, iscsi_auth
+from core import select_option
+from iscsi import iscsi_setup, iscsi_auth, iscsi_iface, iscsi_monitor, iscsi_multipath, iscsi_profiles
+from storage import storage_batch, storage_benchmark
 
 def configure_iscsi():
     iscsi_options = [
@@ -7,12 +8,16 @@ def configure_iscsi():
         "Setup CHAP Authentication",
         "List iSCSI Disks",
         "Format iSCSI Disk",
-        "Mount iSCSI Disk"
+        "Mount iSCSI Disk",
+        "Setup Multipath (all portals)",
+        "Show Negotiated Session Parameters",
+        "Bind Sessions to Network Interfaces",
+        "Monitor Sessions (health, latency, throughput)",
+        "Batch Format iSCSI Disks (partition + mkfs, concurrently)",
+        "Benchmark iSCSI Disk"
     ]
     while True:
-        clear_screen()
-        display_menu(iscsi_options)
-        choice = get_choice(iscsi_options)
+        choice = select_option(iscsi_options)
 
         if choice == 0:
             break
@@ -26,5 +31,17 @@ def configure_iscsi():
             iscsi_setup.format_iscsi_disk()
         elif choice == 5:
             iscsi_setup.mount_iscsi_disk()
+        elif choice == 6:
+            iscsi_multipath.setup_multipath()
+        elif choice == 7:
+            iscsi_profiles.print_negotiated_params()
+        elif choice == 8:
+            iscsi_iface.setup_iface_binding()
+        elif choice == 9:
+            iscsi_monitor.monitor_view()
+        elif choice == 10:
+            storage_batch.batch_format(transport="iscsi")
+        elif choice == 11:
+            storage_benchmark.benchmark_disk(transport="iscsi")
         else:
             print("Invalid choice. Try again.\n")
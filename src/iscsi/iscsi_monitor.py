@@ -0,0 +1,289 @@
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+import core
+from iscsi import iscsi_profiles
+from storage import storage_inventory, storage_probe
+
+DISKSTATS_PATH = "/proc/diskstats"
+
+DEFAULT_INTERVAL = 2.0
+# Interval latencies kept per LUN for the percentiles (one minute at the default interval).
+WINDOW = 30
+# A LUN whose p95 latency crosses this is flagged, whatever its siblings do.
+LATENCY_WARN_MS = 50.0
+# A path slower than this factor times the median of the target's other paths is flagged.
+SLOW_PATH_FACTOR = 3.0
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def read_diskstats():
+    """Returns {name: (reads, read ms, sectors read, writes, write ms, sectors written, in flight)}."""
+    stats = {}
+    try:
+        with open(DISKSTATS_PATH, "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 11:
+                    stats[fields[2]] = (int(fields[3]), int(fields[6]), int(fields[5]),
+                                        int(fields[7]), int(fields[10]), int(fields[9]), int(fields[11]))
+    except (OSError, ValueError):
+        pass
+    return stats
+
+
+def read_sessions():
+    """Reads every iSCSI session, its connection and its disks from sysfs. No commands are run."""
+    try:
+        names = sorted(os.listdir(storage_probe.ISCSI_SESSION_CLASS), key=lambda name: int(name[7:] or 0))
+    except OSError:
+        return []
+
+    disks = collections.defaultdict(list)
+    for device in storage_inventory.get_devices(types=("disk",), transport="iscsi"):
+        session = storage_probe.get_iscsi_session(device.name)
+        if session:
+            disks[session].append(device.name)
+
+    sessions = []
+    for session in names:
+        session_dir = os.path.join(storage_probe.ISCSI_SESSION_CLASS, session)
+        connection_dir = os.path.join(iscsi_profiles.ISCSI_CONNECTION_CLASS, f"connection{session[7:]}:0")
+        sessions.append({
+            "session": session,
+            "target": _read(os.path.join(session_dir, "targetname")),
+            "portal": f"{_read(os.path.join(connection_dir, 'persistent_address'))}:{_read(os.path.join(connection_dir, 'persistent_port'))}",
+            "state": _read(os.path.join(session_dir, "state")),
+            "connection_state": _read(os.path.join(connection_dir, "state")),
+            "disks": sorted(disks.get(session, [])),
+        })
+    return sessions
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))]
+
+
+class SessionMonitor:
+    """Samples iSCSI session health and per-LUN I/O on a timer.
+
+    Every sample is a few sysfs and /proc reads. Latency is the mean service
+    time of the I/Os completed during one interval (from the diskstats time
+    counters); the percentiles are taken over the last WINDOW intervals.
+    Recoveries and reconnects are counted from state changes between samples,
+    so a blip shorter than the interval can be missed.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, window=WINDOW):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._window = window
+        self._last_time = None
+        self._last_stats = {}
+        self._states = {}
+        self._recoveries = collections.Counter()
+        self._reconnects = collections.Counter()
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen=self._window))
+        self._rates = {}
+        self._sessions = []
+        self.samples = 0
+
+    def sample(self):
+        now = time.monotonic()
+        sessions = read_sessions()
+        stats = read_diskstats()
+        with self._lock:
+            elapsed = now - self._last_time if self._last_time is not None else 0
+            for session in sessions:
+                name, state = session["session"], session["state"]
+                previous = self._states.get(name)
+                if previous == "LOGGED_IN" and state != "LOGGED_IN":
+                    self._recoveries[name] += 1
+                elif previous not in (None, "LOGGED_IN") and state == "LOGGED_IN":
+                    self._reconnects[name] += 1
+                self._states[name] = state
+
+                for disk in session["disks"]:
+                    current, last = stats.get(disk), self._last_stats.get(disk)
+                    if not current or not last or elapsed <= 0:
+                        continue
+                    ios = (current[0] - last[0]) + (current[3] - last[3])
+                    busy_ms = (current[1] - last[1]) + (current[4] - last[4])
+                    if ios > 0:
+                        self._latencies[disk].append(busy_ms / ios)
+                    self._rates[disk] = {
+                        "read_bps": (current[2] - last[2]) * storage_probe.SECTOR_SIZE / elapsed,
+                        "write_bps": (current[5] - last[5]) * storage_probe.SECTOR_SIZE / elapsed,
+                        "iops": ios / elapsed,
+                        "in_flight": current[6],
+                    }
+            self._last_time = now
+            self._last_stats = stats
+            self._sessions = sessions
+            self.samples += 1
+
+    def snapshot(self):
+        """Returns one dict per session with its LUNs, counters and the reasons it looks degraded."""
+        with self._lock:
+            result = []
+            for session in self._sessions:
+                luns = []
+                for disk in session["disks"]:
+                    latencies = list(self._latencies.get(disk, ()))
+                    rates = self._rates.get(disk, {})
+                    luns.append({
+                        "disk": disk,
+                        "p50_ms": _percentile(latencies, 50) if latencies else None,
+                        "p95_ms": _percentile(latencies, 95) if latencies else None,
+                        "p99_ms": _percentile(latencies, 99) if latencies else None,
+                        "read_bps": rates.get("read_bps", 0.0),
+                        "write_bps": rates.get("write_bps", 0.0),
+                        "iops": rates.get("iops", 0.0),
+                        "in_flight": rates.get("in_flight", 0),
+                    })
+                info = {key: value for key, value in session.items() if key != "disks"}
+                result.append(dict(info, luns=luns,
+                                   recoveries=self._recoveries[session["session"]],
+                                   reconnects=self._reconnects[session["session"]],
+                                   problems=[]))
+        _flag_problems(result)
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Samples in a background thread until stop()."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="iscsi-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+def _flag_problems(sessions):
+    """Fills in each session's "problems": bad state, recoveries, high or outlying latency."""
+    p95_by_target = collections.defaultdict(list)
+    for session in sessions:
+        for lun in session["luns"]:
+            if lun["p95_ms"] is not None:
+                p95_by_target[session["target"]].append(lun["p95_ms"])
+
+    for session in sessions:
+        problems = session["problems"]
+        if session["state"] and session["state"] != "LOGGED_IN":
+            problems.append(f"session {session['state']}")
+        if session["connection_state"] and session["connection_state"] != "up":
+            problems.append(f"connection {session['connection_state']}")
+        if session["recoveries"]:
+            problems.append(f"recoveries: {session['recoveries']}")
+        for lun in session["luns"]:
+            if lun["p95_ms"] is None:
+                continue
+            if lun["p95_ms"] > LATENCY_WARN_MS:
+                problems.append(f"{lun['disk']} p95 {lun['p95_ms']:.1f}ms")
+            siblings = p95_by_target[session["target"]]
+            if len(siblings) > 1:
+                median = _percentile(siblings, 50)
+                if median > 0 and lun["p95_ms"] > SLOW_PATH_FACTOR * median:
+                    problems.append(f"{lun['disk']} {lun['p95_ms'] / median:.1f}x slower than the other paths")
+
+
+def _format_ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def format_report(sessions, width=None):
+    """Returns the monitor table as text lines, cut to width if given."""
+    lines = [f"{'SESSION':<10} {'STATE':<10} {'PORTAL':<21} {'DISK':<6} {'P50ms':>6} {'P95ms':>6} {'P99ms':>6} "
+             f"{'READ/s':>8} {'WRITE/s':>8} {'IOPS':>7} {'REC':>4}  TARGET"]
+    degraded = 0
+    for session in sessions:
+        luns = session["luns"] or [None]
+        for i, lun in enumerate(luns):
+            if i == 0:
+                head = f"{session['session']:<10} {session['state'] or '?':<10} {session['portal']:<21} "
+            else:
+                head = " " * 44
+            if lun:
+                body = (f"{lun['disk']:<6} {_format_ms(lun['p50_ms']):>6} {_format_ms(lun['p95_ms']):>6} {_format_ms(lun['p99_ms']):>6} "
+                        f"{storage_probe.format_size(lun['read_bps']):>8} {storage_probe.format_size(lun['write_bps']):>8} {lun['iops']:>7.0f} ")
+            else:
+                body = f"{'-':<6} {'':>6} {'':>6} {'':>6} {'':>8} {'':>8} {'':>7} "
+            tail = f"{session['recoveries']:>4}  {session['target']}" if i == 0 else ""
+            lines.append((head + body + tail)[:width])
+        if session["problems"]:
+            degraded += 1
+            lines.append(f"  !! {'; '.join(session['problems'])}"[:width])
+    lines.append("")
+    lines.append(f"{len(sessions)} session(s), {degraded} degraded.")
+    return lines
+
+
+def monitor_view(interval=DEFAULT_INTERVAL):
+    """Live session table, refreshed every interval until q/Esc.
+
+    Without a terminal it prints a single report after one interval.
+    """
+    monitor = SessionMonitor(interval)
+    term = core.get_terminal()
+    if not (sys.stdin.isatty() and term.is_a_tty):
+        monitor.sample()
+        time.sleep(interval)
+        monitor.sample()
+        print("\n--- iSCSI Session Monitor ---")
+        print("\n".join(format_report(monitor.snapshot())))
+        input("\nPress Enter to continue...")
+        return
+
+    monitor.start()
+    try:
+        with term.fullscreen(), term.cbreak(), term.hidden_cursor():
+            while True:
+                lines = [f"iSCSI Session Monitor - every {interval:g}s, p50/p95/p99 over the last {WINDOW} samples - q to go back", ""]
+                lines += format_report(monitor.snapshot(), term.width)
+                frame = term.home + term.clear + "\n".join(lines[:term.height - 1])
+                sys.stdout.write(frame)
+                sys.stdout.flush()
+                keystroke = term.inkey(timeout=interval)
+                if keystroke == "q" or keystroke.code in (term.KEY_ESCAPE, term.KEY_BACKSPACE):
+                    break
+    finally:
+        monitor.stop()
+
+
+def run_json(interval=DEFAULT_INTERVAL, count=0):
+    """Prints one JSON line per interval (count 0 runs until interrupted). Returns an exit code."""
+    monitor = SessionMonitor(interval)
+    monitor.sample()
+    printed = 0
+    try:
+        while not count or printed < count:
+            time.sleep(interval)
+            monitor.sample()
+            print(json.dumps({"time": time.time(), "sessions": monitor.snapshot()}), flush=True)
+            printed += 1
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,172 @@
+import datetime
+import os
+import shutil
+import subprocess
+
+from core import run_command
+from iscsi import iscsi_discovery, iscsi_profiles, iscsi_setup
+from storage import storage_inventory
+
+MULTIPATH_CONF_PATH = "/etc/multipath.conf"
+
+PATH_SELECTORS = {
+    "round-robin": "round-robin 0",
+    "service-time": "service-time 0",
+}
+# I/O requests sent down one path before switching to the next. 1 spreads a
+# single sequential backup stream over every NIC.
+DEFAULT_RR_MIN_IO_RQ = 1
+
+
+def discover_portals(portal_ips, ifaces=(), refresh=False):
+    """Discovers (or takes from the discovery cache) the targets behind every given IP.
+
+    Returns ({iqn: [portals]}, {(iqn, portal) with a session}, {ip: age of
+    cached answers}). Raises CalledProcessError if every discovery failed.
+    """
+    targets, cached = iscsi_discovery.discover(portal_ips, refresh, ifaces)
+    return targets, iscsi_discovery.get_active_nodes(), cached
+
+
+def build_multipath_conf(path_selector="round-robin", rr_min_io_rq=DEFAULT_RR_MIN_IO_RQ):
+    """Returns a multipath.conf that spreads I/O over all paths of every LUN.
+
+    The settings go into "overrides" because the built-in per-array defaults
+    would otherwise win over "defaults". multibus puts every path in one
+    group, which suits active/active arrays (most iSCSI SANs for repositories).
+    """
+    return (
+        "# Generated by Linux Repository Manager\n"
+        "defaults {\n"
+        "    user_friendly_names yes\n"
+        "    find_multipaths yes\n"
+        "}\n"
+        "\n"
+        "overrides {\n"
+        "    path_grouping_policy multibus\n"
+        f"    path_selector \"{PATH_SELECTORS[path_selector]}\"\n"
+        f"    rr_min_io_rq {rr_min_io_rq}\n"
+        f"    rr_min_io {rr_min_io_rq}\n"
+        "    failback immediate\n"
+        "    no_path_retry 12\n"
+        "}\n"
+    )
+
+
+def write_multipath_conf(content):
+    """Writes multipath.conf, backing up an existing one first. Returns the backup path or None."""
+    backup_path = None
+    if os.path.exists(MULTIPATH_CONF_PATH):
+        backup_path = f"{MULTIPATH_CONF_PATH}.bak.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        shutil.copy2(MULTIPATH_CONF_PATH, backup_path)
+    with open(MULTIPATH_CONF_PATH, "w") as f:
+        f.write(content)
+    return backup_path
+
+
+def start_multipathd():
+    """Enables multipathd and makes it re-read the configuration."""
+    run_command(["systemctl", "enable", "--now", "multipathd"], check=True)
+    run_command(["multipath", "-r"], check=True)
+    storage_inventory.invalidate()
+
+
+def login_all_portals(targets, active_nodes=()):
+    """Logs in to every portal of every target, skipping paths that already have a session."""
+    nodes = [(iqn, portal) for iqn, portals in targets.items() for portal in portals if (iqn, portal) not in active_nodes]
+    return iscsi_setup.login_targets(nodes)
+
+
+def setup_multipath():
+    print("\n--- Multipath Setup ---")
+    if not shutil.which("multipath"):
+        print("Error: 'multipath' not found. Install 'device-mapper-multipath' (RHEL/SUSE) or 'multipath-tools' (Debian/Ubuntu).")
+        input("Press Enter to continue...")
+        return
+
+    try:
+        portal_ips = [ip.strip() for ip in input("Enter the iSCSI portal IP address(es) (comma-separated): ").split(",") if ip.strip()]
+        if not portal_ips:
+            print("IP address cannot be empty.")
+            input("Press Enter to continue...")
+            return
+
+        refresh = False
+        while True:
+            print(f"{'Rediscovering' if refresh else 'Discovering'} targets on {', '.join(portal_ips)}...")
+            targets, active_nodes, cached = discover_portals(portal_ips, refresh=refresh)
+            active_iqns = {iqn for iqn, _ in active_nodes}
+            if not targets:
+                print("No iSCSI targets found.")
+                input("Press Enter to continue...")
+                return
+
+            iqns = list(targets)
+            print("\nDiscovered iSCSI Targets:")
+            for i, iqn in enumerate(iqns):
+                status = "(logged in)" if iqn in active_iqns else ""
+                print(f"{i+1}. {iqn} [{len(targets[iqn])} portal(s): {', '.join(targets[iqn])}] {status}")
+            if all(len(portals) < 2 for portals in targets.values()):
+                print("\nWARNING: Every target is advertised on a single portal. Add the other portal IPs for redundancy.")
+            if cached:
+                print(iscsi_discovery.describe_cached(cached))
+
+            selected = None
+            while True:
+                try:
+                    selection = input("\nSelect targets to use with multipath (e.g., 1 or 1,3-5; 'new' for all not logged in; 'all'): ")
+                    if selection.strip().lower() == "r":
+                        break
+                    selected = iscsi_setup.parse_selection(selection, iqns, active_iqns)
+                    if selected:
+                        break
+                    print("No targets selected.")
+                except ValueError:
+                    print("Invalid input.")
+            if selected:
+                break
+            refresh = True
+
+        print("\nPath selectors:")
+        print("1. round-robin (default, equal paths: spreads I/O evenly)")
+        print("2. service-time (paths of different speed or load: sends I/O to the least busy path)")
+        path_selector = "service-time" if input("Enter your choice (1-2, default 1): ").strip() == "2" else "round-robin"
+
+        rr_input = input(f"Requests per path before switching (rr_min_io_rq) [{DEFAULT_RR_MIN_IO_RQ}]: ").strip()
+        rr_min_io_rq = int(rr_input) if rr_input.isdigit() and int(rr_input) > 0 else DEFAULT_RR_MIN_IO_RQ
+
+        content = build_multipath_conf(path_selector, rr_min_io_rq)
+        print(f"\nThe following configuration will be written to {MULTIPATH_CONF_PATH}:\n")
+        print(content)
+        if input("Do you want to continue? (yes/no): ").strip().lower() != "yes":
+            print("Multipath setup cancelled.")
+            input("Press Enter to continue...")
+            return
+
+        profile = iscsi_profiles.choose_profile()
+
+        backup_path = write_multipath_conf(content)
+        if backup_path:
+            print(f"Previous configuration saved to {backup_path}.")
+        print("Starting multipathd...")
+        start_multipathd()
+
+        # Targets already logged in on one portal get their missing paths too.
+        selected_targets = {iqn: targets[iqn] for iqn in selected}
+        if profile:
+            iscsi_setup.apply_profile([(iqn, portal) for iqn, portals in selected_targets.items() for portal in portals], profile)
+        print("Logging in to every portal of the selected targets...")
+        iscsi_setup.print_summary("Login", *login_all_portals(selected_targets, active_nodes))
+
+        run_command(["multipath", "-r"], check=True)
+        storage_inventory.invalidate()
+        print("\nMultipath devices:")
+        print(run_command(["multipath", "-ll"]).stdout)
+        print("Format and mount the /dev/mapper devices from the iSCSI menu; the individual paths are hidden there.")
+
+    except subprocess.SubprocessError as e:
+        print(f"An error occurred: {e.stderr or e}")
+    except OSError as e:
+        print(f"An error occurred: {e}")
+
+    input("Press Enter to continue...")
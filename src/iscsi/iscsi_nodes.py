@@ -0,0 +1,45 @@
+from core import run_commands
+
+# iscsiadm exit code when a session for the node already exists.
+ISCSI_ERR_SESS_EXISTS = 15
+
+
+def node_args(node):
+    """Returns the iscsiadm arguments that select a node record.
+
+    A node is an IQN (every portal and iface recorded for it), an
+    (IQN, portal) pair or an (IQN, portal, iface) triple.
+    """
+    if not isinstance(node, tuple):
+        return ["-T", node]
+    args = ["-T", node[0]]
+    if len(node) > 1 and node[1]:
+        args += ["-p", node[1]]
+    if len(node) > 2 and node[2]:
+        args += ["-I", node[2]]
+    return args
+
+
+def node_label(node):
+    if not isinstance(node, tuple):
+        return node
+    return " via ".join(part for part in node if part)
+
+
+def update_nodes(nodes, settings, max_parallel=8):
+    """Writes settings ({key: value}) into node records with `iscsiadm -o update`.
+
+    Takes effect on the next login. Returns the failed updates as
+    (node, key, error message).
+    """
+    commands, updates = [], []
+    for node in nodes:
+        for key, value in settings.items():
+            commands.append(["iscsiadm", "-m", "node"] + node_args(node) + ["-o", "update", "-n", key, "-v", str(value)])
+            updates.append((node, key))
+
+    failed = []
+    for (node, key), result in zip(updates, run_commands(commands, max_parallel=max_parallel)):
+        if result.returncode != 0:
+            failed.append((node, key, (result.stderr or "").strip() or f"exit code {result.returncode}"))
+    return failed
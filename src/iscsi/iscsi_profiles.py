@@ -0,0 +1,161 @@
+import os
+
+from iscsi import iscsi_nodes
+from storage import storage_probe
+
+ISCSI_CONNECTION_CLASS = "/sys/class/iscsi_connection"
+
+# Node settings written with `iscsiadm -o update` before login. The target
+# still has the last word on the negotiated values; see print_negotiated_params.
+PROFILES = {
+    "default": {
+        "description": "open-iscsi defaults",
+        "settings": {
+            "node.session.cmds_max": "128",
+            "node.session.queue_depth": "32",
+            "node.conn[0].iscsi.MaxRecvDataSegmentLength": "262144",
+            "node.session.iscsi.FirstBurstLength": "262144",
+            "node.session.iscsi.MaxBurstLength": "16776192",
+            "node.session.iscsi.ImmediateData": "Yes",
+            "node.session.iscsi.InitialR2T": "No",
+            "node.session.timeo.replacement_timeout": "120",
+        },
+    },
+    "backup-streaming": {
+        "description": "large sequential writes: deep queues, maximum burst sizes",
+        "settings": {
+            "node.session.cmds_max": "1024",
+            "node.session.queue_depth": "128",
+            "node.conn[0].iscsi.MaxRecvDataSegmentLength": "1048576",
+            "node.session.iscsi.FirstBurstLength": "1048576",
+            "node.session.iscsi.MaxBurstLength": "16776192",
+            "node.session.iscsi.ImmediateData": "Yes",
+            "node.session.iscsi.InitialR2T": "No",
+            "node.session.timeo.replacement_timeout": "120",
+        },
+    },
+    "low-latency": {
+        "description": "small random I/O and fast multipath failover",
+        "settings": {
+            "node.session.cmds_max": "256",
+            "node.session.queue_depth": "64",
+            "node.conn[0].iscsi.MaxRecvDataSegmentLength": "262144",
+            "node.session.iscsi.FirstBurstLength": "262144",
+            "node.session.iscsi.MaxBurstLength": "1048576",
+            "node.session.iscsi.ImmediateData": "Yes",
+            "node.session.iscsi.InitialR2T": "No",
+            "node.session.timeo.replacement_timeout": "15",
+        },
+    },
+}
+
+
+def choose_profile():
+    """Asks for a profile and returns its name, or None to keep the node settings as they are."""
+    names = list(PROFILES)
+    print("\nPerformance profiles:")
+    print("0. Keep current settings (default)")
+    for i, name in enumerate(names):
+        print(f"{i+1}. {name} ({PROFILES[name]['description']})")
+    choice = input(f"Enter your choice (0-{len(names)}, default 0): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(names):
+        return names[int(choice) - 1]
+    return None
+
+
+def apply_profile(nodes, profile):
+    """Writes a profile into the node records of IQNs or (IQN, portal[, iface]) tuples.
+
+    Takes effect on the next login. Returns the list of failed updates as
+    (node, key, error message).
+    """
+    return iscsi_nodes.update_nodes(nodes, PROFILES[profile]["settings"])
+
+
+def build_profile_lines(profile):
+    """Returns the iscsid.conf lines that make a profile the default for newly discovered nodes."""
+    lines = [f"# Performance profile '{profile}' added by Hardened Repository Manager script:\n"]
+    lines += [f"{key} = {value}\n" for key, value in PROFILES[profile]["settings"].items()]
+    lines.append("# End of iSCSI performance profile.\n")
+    return lines
+
+
+def apply_profile_to_config(lines, profile):
+    """Returns iscsid.conf lines with the profile appended and the settings it replaces commented out.
+
+    iscsid.conf is read top to bottom and the last value wins, so the
+    profile has to come after the stock settings.
+    """
+    keys = PROFILES[profile]["settings"]
+    result = []
+    for line in lines:
+        key = line.split("=", 1)[0].strip()
+        if not line.lstrip().startswith("#") and key in keys:
+            line = "# " + line
+        result.append(line)
+    if result and not result[-1].endswith("\n"):
+        result[-1] += "\n"
+    return result + build_profile_lines(profile)
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _yes_no(value):
+    return {"1": "Yes", "0": "No"}.get(value, value or "-")
+
+
+def get_negotiated_params():
+    """Reads the parameters each live session actually negotiated from sysfs.
+
+    Returns one dict per session. The queue depth comes from the session's
+    SCSI devices, since that is what the block layer really uses.
+    """
+    sessions = []
+    try:
+        names = sorted(os.listdir(storage_probe.ISCSI_SESSION_CLASS), key=lambda name: int(name[7:] or 0))
+    except OSError:
+        return sessions
+
+    for session in names:
+        session_dir = os.path.join(storage_probe.ISCSI_SESSION_CLASS, session)
+        connection_dir = os.path.join(ISCSI_CONNECTION_CLASS, f"connection{session[7:]}:0")
+        devices = []
+        for disk in storage_probe.list_block_devices():
+            if storage_probe.get_iscsi_session(disk) == session:
+                depth = _read(os.path.join(storage_probe.SYS_BLOCK, disk, "device", "queue_depth"))
+                devices.append(f"{disk} (queue_depth {depth or '?'})")
+        sessions.append({
+            "session": session,
+            "target": _read(os.path.join(session_dir, "targetname")),
+            "portal": f"{_read(os.path.join(connection_dir, 'persistent_address'))}:{_read(os.path.join(connection_dir, 'persistent_port'))}",
+            "MaxRecvDataSegmentLength": _read(os.path.join(connection_dir, "max_recv_dlength")),
+            "MaxXmitDataSegmentLength": _read(os.path.join(connection_dir, "max_xmit_dlength")),
+            "FirstBurstLength": _read(os.path.join(session_dir, "first_burst_len")),
+            "MaxBurstLength": _read(os.path.join(session_dir, "max_burst_len")),
+            "ImmediateData": _yes_no(_read(os.path.join(session_dir, "immediate_data"))),
+            "InitialR2T": _yes_no(_read(os.path.join(session_dir, "initial_r2t"))),
+            "replacement_timeout": _read(os.path.join(session_dir, "recovery_tmo")),
+            "devices": devices,
+        })
+    return sessions
+
+
+def print_negotiated_params():
+    print("\n--- Negotiated iSCSI Session Parameters ---")
+    sessions = get_negotiated_params()
+    if not sessions:
+        print("No active iSCSI sessions found.")
+    for params in sessions:
+        print(f"\n{params['session']}: {params['target']} via {params['portal']}")
+        for key, value in params.items():
+            if key in ("session", "target", "portal", "devices"):
+                continue
+            print(f"  {key:<26} {value or '-'}")
+        print(f"  {'devices':<26} {', '.join(params['devices']) or '-'}")
+    input("\nPress Enter to continue...")
@@ -1,91 +1,166 @@
 import subprocess
 import os
-import time
+
+import core
+from core import run_command, run_commands
+from iscsi import iscsi_discovery, iscsi_nodes, iscsi_profiles
+from storage import storage_inventory, storage_mkfs, storage_mount, storage_probe, storage_setup
+
+# Logins to one portal are cheap for the initiator but each one waits on the
+# target; a handful at a time keeps a 16-LUN setup fast without flooding the SAN.
+ISCSI_LOGIN_CONCURRENCY = 4
+
+def discover_targets(target_ips, refresh=False):
+    """Returns (discovered IQNs, logged-in IQNs, {ip: age of cached answers}) for one or more portal IPs.
+
+    See iscsi_discovery.discover for the cache; sessions are read from sysfs.
+    """
+    targets, cached = iscsi_discovery.discover(target_ips, refresh)
+    return list(targets), {iqn for iqn, _ in iscsi_discovery.get_active_nodes()}, cached
+
+def get_active_iqns():
+    return {iqn for iqn, _ in iscsi_discovery.get_active_nodes()}
+
+def _set_node_state(nodes, action, max_parallel=ISCSI_LOGIN_CONCURRENCY):
+    """Runs `iscsiadm --login/--logout` for several nodes at once.
+
+    A node is an IQN or an (IQN, portal[, iface]) tuple, see iscsi_nodes.node_args.
+    Prints one progress line per node as it finishes and returns
+    (succeeded nodes, [(failed node, error message)]). Logging in to a node
+    that already has a session counts as success.
+    """
+    verb = "Logged in to" if action == "login" else "Logged out from"
+    succeeded, failed = [], []
+
+    def report(index, result):
+        node = nodes[index]
+        done = len(succeeded) + len(failed) + 1
+        if result.returncode == 0 or (action == "login" and result.returncode == iscsi_nodes.ISCSI_ERR_SESS_EXISTS):
+            succeeded.append(node)
+            print(f"  [{done}/{len(nodes)}] {verb} {iscsi_nodes.node_label(node)} ({result.elapsed:.1f}s)")
+        else:
+            message = "timed out" if result.timed_out else (result.stderr or result.stdout).strip() or f"exit code {result.returncode}"
+            failed.append((node, message))
+            print(f"  [{done}/{len(nodes)}] FAILED {iscsi_nodes.node_label(node)}: {message}")
+
+    commands = [["iscsiadm", "-m", "node"] + iscsi_nodes.node_args(node) + [f"--{action}"] for node in nodes]
+    try:
+        run_commands(commands, max_parallel=max_parallel, on_result=report)
+    finally:
+        storage_inventory.invalidate()
+    return succeeded, failed
+
+def login_targets(nodes, max_parallel=ISCSI_LOGIN_CONCURRENCY):
+    """Logs in to several targets (or target/portal/iface tuples) concurrently. See _set_node_state."""
+    return _set_node_state(nodes, "login", max_parallel)
+
+def logout_targets(nodes, max_parallel=ISCSI_LOGIN_CONCURRENCY):
+    """Logs out from several targets (or target/portal/iface tuples) concurrently. See _set_node_state."""
+    return _set_node_state(nodes, "logout", max_parallel)
+
+def parse_selection(selection, discovered_targets, active_iqns):
+    """Turns '1,3-5', 'new' (all not logged in) or 'all' into a list of IQNs."""
+    selection = selection.strip().lower()
+    if selection == "all":
+        return list(discovered_targets)
+    if selection == "new":
+        return [iqn for iqn in discovered_targets if iqn not in active_iqns]
+    return [discovered_targets[i] for i in core.parse_selection(selection, len(discovered_targets))]
+
+def apply_profile(nodes, profile):
+    """Writes a performance profile into the node records and reports failed updates."""
+    print(f"Applying the '{profile}' profile to {len(nodes)} node(s)...")
+    failed = iscsi_profiles.apply_profile(nodes, profile)
+    for node, key, message in failed:
+        print(f"  Could not set {key} for {iscsi_nodes.node_label(node)}: {message}")
+    return failed
+
+def print_summary(title, succeeded, failed):
+    print(f"\n{title}: {len(succeeded)} succeeded, {len(failed)} failed.")
+    for node, message in failed:
+        print(f"  {iscsi_nodes.node_label(node)}: {message}")
 
 def iscsi_connect():
-    target_ip = input("Enter the iSCSI target IP address: ").strip()
-    if not target_ip:
+    target_ips = [ip.strip() for ip in input("Enter the iSCSI target IP address(es) (comma-separated): ").split(",") if ip.strip()]
+    if not target_ips:
         print("IP address cannot be empty.")
         return
 
     try:
-        print(f"Discovering targets on {target_ip}...")
-        discover_cmd = ["iscsiadm", "-m", "discovery", "-t", "sendtargets", "-p", target_ip]
-        discover_result = subprocess.run(discover_cmd, capture_output=True, text=True, check=True)
-        
-        discovered_targets = []
-        for line in discover_result.stdout.splitlines():
-            parts = line.split()
-            if len(parts) > 1:
-                discovered_targets.append(parts[1])
-
-        if not discovered_targets:
-            print("No iSCSI targets found on the specified IP.")
-            return
-
-        sessions_cmd = ["iscsiadm", "-m", "session"]
-        sessions_result = subprocess.run(sessions_cmd, capture_output=True, text=True)
-        active_iqns = []
-        for line in sessions_result.stdout.splitlines():
-            if "tcp:" in line:
-                parts = line.split()
-                for part in parts:
-                    if part.startswith("iqn."):
-                        active_iqns.append(part)
-                        break
+        refresh = False
+        while True:
+            print(f"{'Rediscovering' if refresh else 'Discovering'} targets on {', '.join(target_ips)}...")
+            discovered_targets, active_iqns, cached = discover_targets(target_ips, refresh)
 
-        print("\nDiscovered iSCSI Targets:")
-        for i, iqn in enumerate(discovered_targets):
-            status = "(logged in)" if iqn in active_iqns else ""
-            print(f"{i+1}. {iqn} {status}")
+            if not discovered_targets:
+                print("No iSCSI targets found on the specified IP(s).")
+                if cached:
+                    refresh = True
+                    continue
+                input("Press Enter to continue...")
+                return
 
-        while True:
-            try:
-                choice = int(input("\nSelect a target to manage: ")) - 1
-                if 0 <= choice < len(discovered_targets):
-                    selected_iqn = discovered_targets[choice]
-                    break
-                else:
-                    print("Invalid choice.")
-            except ValueError:
-                print("Invalid input.")
+            print("\nDiscovered iSCSI Targets:")
+            for i, iqn in enumerate(discovered_targets):
+                status = "(logged in)" if iqn in active_iqns else ""
+                print(f"{i+1}. {iqn} {status}")
+            if cached:
+                print(iscsi_discovery.describe_cached(cached))
 
-        if selected_iqn in active_iqns:
-            confirm = input(f"Target {selected_iqn} is already logged in. Do you want to log out? (yes/No): ").lower()
-            if confirm == 'yes':
-                logout_cmd = ["iscsiadm", "-m", "node", "-T", selected_iqn, "--logout"]
-                subprocess.run(logout_cmd, check=True)
-                print(f"Successfully logged out from {selected_iqn}")
-        else:
-            confirm = input(f"Do you want to log in to {selected_iqn}? (yes/no): ").lower()
-            if confirm == 'yes':
-                login_cmd = ["iscsiadm", "-m", "node", "-T", selected_iqn, "--login"]
-                subprocess.run(login_cmd, check=True)
-                print(f"Successfully logged in to {selected_iqn}")
-
-    except subprocess.CalledProcessError as e:
-        print(f"An error occurred: {e.stderr}")
+            selected_iqns = None
+            while True:
+                try:
+                    selection = input("\nSelect targets to manage (e.g., 1 or 1,3-5; 'new' for all not logged in; 'all'): ")
+                    if selection.strip().lower() == "r":
+                        break
+                    selected_iqns = parse_selection(selection, discovered_targets, active_iqns)
+                    if selected_iqns:
+                        break
+                    print("No targets selected.")
+                except ValueError:
+                    print("Invalid input.")
+            if selected_iqns:
+                break
+            refresh = True
+
+        to_logout = [iqn for iqn in selected_iqns if iqn in active_iqns]
+        to_login = [iqn for iqn in selected_iqns if iqn not in active_iqns]
+
+        if to_logout:
+            if len(to_logout) == 1:
+                prompt = f"Target {to_logout[0]} is already logged in. Do you want to log out? (yes/No): "
+            else:
+                prompt = f"{len(to_logout)} selected targets are already logged in. Do you want to log out from them? (yes/No): "
+            if input(prompt).lower() == 'yes':
+                print(f"Logging out from {len(to_logout)} target(s)...")
+                print_summary("Logout", *logout_targets(to_logout))
+
+        if to_login:
+            if len(to_login) == 1:
+                prompt = f"Do you want to log in to {to_login[0]}? (yes/no): "
+            else:
+                prompt = f"Do you want to log in to {len(to_login)} targets? (yes/no): "
+            if input(prompt).lower() == 'yes':
+                profile = iscsi_profiles.choose_profile()
+                if profile:
+                    apply_profile(to_login, profile)
+                print(f"Logging in to {len(to_login)} target(s), {ISCSI_LOGIN_CONCURRENCY} at a time...")
+                print_summary("Login", *login_targets(to_login))
+
+    except subprocess.SubprocessError as e:
+        print(f"An error occurred: {e.stderr or e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
     input("Press Enter to continue...")
 
 def is_iscsi_device(device):
-    try:
-        transport = subprocess.check_output(
-            ["udevadm", "info", "--query=property", "--name=" + device],
-            text=True
-        )
-        if "ID_SCSI_TRANSPORT=iscsi" in transport:
-            return True
-        return False
-    except subprocess.CalledProcessError:
-        return False
+    return storage_probe.is_iscsi(device)
 
 def list_iscsi_disks():
     try:
         sessions_command = ["iscsiadm", "-m", "session"]
-        sessions_result = subprocess.run(sessions_command, capture_output=True, text=True, check=True)
+        sessions_result = run_command(sessions_command, check=True)
         sessions_output = sessions_result.stdout
 
         if not sessions_output.strip():
@@ -100,34 +175,28 @@ def list_iscsi_disks():
                 iqn = parts[2]
                 target_ip = parts[3].split(':')[0]
                 print(f"  IQN: {iqn}, IP: {target_ip}")
-        lsblk_command = ["lsblk", "-d", "-n", "-o", "NAME,SIZE,MOUNTPOINT,TYPE,TRAN"]
-        lsblk_result = subprocess.run(lsblk_command, capture_output=True, text=True, check=True)
-        lsblk_output = lsblk_result.stdout
-
         print("\nDisks:")
-        for line in lsblk_output.splitlines():
-            if "iscsi" in line:
-                print(line)
+        for device_info in storage_inventory.get_devices(types=("disk", "mpath"), transport="iscsi"):
+            print(f"{device_info.path} {device_info.size_text} {device_info.mountpoint} {device_info.type} {device_info.tran}")
 
-    except subprocess.CalledProcessError as e:
+    except subprocess.SubprocessError as e:
         print(f"Error: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
     input("Press Enter to continue...")
 
+def get_iscsi_disks():
+    """Returns the kernel names of the iSCSI disks to work on.
+
+    A LUN logged in over several portals is returned once, as its multipath map.
+    """
+    devices = storage_inventory.get_devices(types=("disk",), transport="iscsi")
+    return [device_info.name for device_info in storage_inventory.collapse_multipath(devices)]
+
 def format_iscsi_disk():
     try:
-        lsblk_command = ["lsblk", "-n", "-o", "NAME,SIZE,TYPE,TRAN"]
-        lsblk_result = subprocess.run(lsblk_command, capture_output=True, text=True, check=True)
-        lsblk_output = lsblk_result.stdout
-
-        iscsi_disks = []
-        for line in lsblk_output.splitlines():
-            parts = line.split()
-            if len(parts) > 3 and parts[3].lower() == "iscsi":
-                device_name = parts[0]
-                iscsi_disks.append(device_name)
+        iscsi_disks = get_iscsi_disks()
 
         if not iscsi_disks:
             print("No iSCSI disks found.")
@@ -136,26 +205,18 @@ def format_iscsi_disk():
 
         all_partitions = []
         for disk in iscsi_disks:
-            lsblk_partition_command = ["lsblk", "-n", "-o", "NAME,SIZE,TYPE,TRAN", f"/dev/{disk}"]
-            lsblk_partition_result = subprocess.run(lsblk_partition_command, capture_output=True, text=True, check=True)
-            lsblk_partition_output = lsblk_partition_result.stdout
-            
-            partitions = []
-            for line in lsblk_partition_output.splitlines():
-                parts = line.split()
-                if len(parts) > 3 and parts[2].lower() == "part":
-                    partitions.append(parts[0])
+            partitions = [part.name for part in storage_inventory.get_partitions(disk)]
             
             if partitions:
-                print(f"Partitions found for /dev/{disk}: {partitions}")
-                all_partitions.extend([f"{disk}{part.split(disk)[1]}" for part in partitions])
+                print(f"Partitions found for {storage_probe.device_path(disk)}: {[storage_probe.device_path(part) for part in partitions]}")
+                all_partitions.extend(partitions)
             else:
-                print(f"No partitions found for /dev/{disk}. Formatting the whole disk.")
+                print(f"No partitions found for {storage_probe.device_path(disk)}. Formatting the whole disk.")
                 all_partitions.append(disk)
 
         print("\nAvailable iSCSI disks and partitions:")
         for i, disk in enumerate(all_partitions):
-            print(f"{i + 1}. /dev/{disk}")
+            print(f"{i + 1}. {storage_probe.device_path(disk)}")
 
         while True:
             try:
@@ -168,7 +229,7 @@ def format_iscsi_disk():
             except ValueError:
                 print("Invalid input.")
 
-        disk_path = f"/dev/{selected_disk}"
+        disk_path = storage_probe.device_path(selected_disk)
 
         print("\nAvailable filesystems: xfs, ext4, ext3, ext2")
         fs_choice = input("Enter the filesystem to use (default: xfs): ").lower()
@@ -179,8 +240,10 @@ def format_iscsi_disk():
             print("Invalid filesystem choice. Using xfs instead.")
             fs_choice = "xfs"
 
+        mkfs_profile, stripe = storage_mkfs.choose_mkfs_profile(disk_path, fs_choice)
+
         if selected_disk in iscsi_disks:
-            print(f"\nWARNING: A new partition ({disk_path}1) will be created and formatted as {fs_choice}.")
+            print(f"\nWARNING: A new partition ({storage_probe.partition_path(disk_path, 1)}) will be created and formatted as {fs_choice}.")
         print(f"Formatting {disk_path} will erase all data on it.")
         confirmation = input("Are you sure you want to continue? (yes/no): ").lower()
 
@@ -188,38 +251,28 @@ def format_iscsi_disk():
             path_to_format = disk_path
 
             if selected_disk in iscsi_disks:
-                print(f"Partitioning {path_to_format}...")
-                partition_command = ["parted", "-s", path_to_format, "mklabel", "gpt"]
-                subprocess.run(partition_command, check=True)
-                print(f"Creating partition on {path_to_format}...")
-                create_partition_command = ["parted", "-s", path_to_format, "mkpart", "primary", "0%", "100%"]
-                subprocess.run(create_partition_command, check=True)
-                path_to_format += "1"
-                print("Waiting for partition to be created...")
-                subprocess.run(["partprobe"], check=True, capture_output=True)
-                time.sleep(2)
-
-            print(f"Creating filesystem on {path_to_format}...")
-            mkfs_command = [f"mkfs.{fs_choice}", path_to_format]
+                path_to_format = storage_setup.partition_whole_disk(disk_path)
+            mkfs_args = storage_mkfs.mkfs_args(fs_choice, mkfs_profile, stripe, path_to_format)
 
             try:
-                subprocess.run(mkfs_command, check=True, capture_output=True, text=True)
+                storage_setup.create_filesystem(path_to_format, fs_choice, extra_args=mkfs_args)
                 print(f"Filesystem created successfully on {path_to_format}.")
             except subprocess.CalledProcessError as e:
                 print(f"Error creating filesystem: {e.stderr.strip()}")
                 force_choice = input("Formatting failed. Do you want to try forcing it? (yes/no): ").lower().strip()
                 if force_choice == 'yes':
-                    force_flag = "-f" if fs_choice == "xfs" else " "
-                    print(f"Retrying with force option ('{force_flag}')...")
-                    mkfs_command_forced = [f"mkfs.{fs_choice}", force_flag, path_to_format]
-                    subprocess.run(mkfs_command_forced, check=True)
+                    print("Retrying with force option...")
+                    storage_setup.create_filesystem(path_to_format, fs_choice, force=True, capture=False, extra_args=mkfs_args)
                     print(f"Filesystem created successfully on {path_to_format} with force option.")
                 else:
                     print("Formatting cancelled by user after initial failure.")
+                    path_to_format = None
+            if path_to_format:
+                storage_mkfs.report_verification(path_to_format, fs_choice, mkfs_profile, stripe)
         else:
             print("Formatting cancelled.")
 
-    except subprocess.CalledProcessError as e:
+    except subprocess.SubprocessError as e:
         print(f"Error: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
@@ -248,14 +301,7 @@ def mount_iscsi_disk():
                 else:
                     print(f"Error: Directory '{mount_path}' does not exist or is not a directory. Please provide a valid path.")
 
-        lsblk_command = ["lsblk", "-n", "-o", "NAME,TYPE,TRAN"]
-        lsblk_result = subprocess.run(lsblk_command, capture_output=True, text=True, check=True)
-        
-        iscsi_disks = []
-        for line in lsblk_result.stdout.splitlines():
-            parts = line.split()
-            if len(parts) >= 3 and parts[1].lower() == "disk" and parts[2].lower() == "iscsi":
-                iscsi_disks.append(parts[0])
+        iscsi_disks = get_iscsi_disks()
 
         if not iscsi_disks:
             print("No iSCSI disks found.")
@@ -264,14 +310,7 @@ def mount_iscsi_disk():
 
         selectable_devices = []
         for disk in iscsi_disks:
-            lsblk_partition_command = ["lsblk", "-n", "-o", "NAME,TYPE", f"/dev/{disk}"]
-            lsblk_partition_result = subprocess.run(lsblk_partition_command, capture_output=True, text=True, check=True)
-            
-            partitions_found = []
-            for line in lsblk_partition_result.stdout.splitlines():
-                parts = line.split()
-                if len(parts) >= 2 and parts[1].lower() == "part":
-                    partitions_found.append(parts[0].lstrip('└─├ '))
+            partitions_found = [part.name for part in storage_inventory.get_partitions(disk)]
             
             if partitions_found:
                 selectable_devices.extend(partitions_found)
@@ -281,50 +320,36 @@ def mount_iscsi_disk():
         selectable_devices.sort()
         print("\nAvailable iSCSI disks and partitions to mount:")
         for i, device in enumerate(selectable_devices):
-            print(f"{i + 1}. /dev/{device}")
+            print(f"{i + 1}. {storage_probe.device_path(device)}")
 
         choice = int(input("Select the disk or partition to mount: ")) - 1
         selected_device_name = selectable_devices[choice]
-        device_to_mount = f"/dev/{selected_device_name}"
+        device_to_mount = storage_probe.device_path(selected_device_name)
 
         if selected_device_name in iscsi_disks:
             print(f"Whole disk {device_to_mount} selected. Assuming partition 1 for mounting.")
-            device_to_mount += "1"
+            device_to_mount = storage_probe.partition_path(device_to_mount, 1)
         
         if not os.path.exists(device_to_mount):
             print(f"Error: The partition {device_to_mount} does not seem to exist. Cannot mount.")
             input("Press Enter to continue...")
             return
 
-        try:
-            subprocess.run(["findmnt", "-n", device_to_mount], check=True, capture_output=True)
+        mounted_device_info = storage_inventory.get_device(storage_probe.device_name(device_to_mount))
+        if mounted_device_info and mounted_device_info.mountpoint:
             print(f"Device {device_to_mount} is already mounted. Aborting.")
             input("Press Enter to continue...")
             return
-        except subprocess.CalledProcessError:
-            pass
 
+        uuid, fs_type = storage_probe.get_filesystem(device_to_mount)
+        options = storage_mount.get_mount_options(fs_type, storage_mount.choose_mount_profile(fs_type))
         print(f"Mounting {device_to_mount} on {mount_path}...")
-        subprocess.run(["mount", device_to_mount, mount_path], check=True)
+        storage_setup.mount_device(device_to_mount, mount_path, options)
         print("Mount successful.")
 
-        fstab_choice = input("Do you want to add this mount to /etc/fstab for persistence? (yes/no) [yes]: ").lower().strip()
-        if fstab_choice in ['', 'yes', 'y']:
-            print("Adding entry to /etc/fstab...")
-            blkid_uuid_result = subprocess.run(["blkid", "-s", "UUID", "-o", "value", device_to_mount], capture_output=True, text=True, check=True)
-            uuid = blkid_uuid_result.stdout.strip()
-            blkid_type_result = subprocess.run(["blkid", "-s", "TYPE", "-o", "value", device_to_mount], capture_output=True, text=True, check=True)
-            fs_type = blkid_type_result.stdout.strip()
-
-            fstab_entry = f"UUID={uuid} {mount_path} {fs_type} defaults,nofail,_netdev 0 0\n"
-            print(f"The following line will be added to /etc/fstab:\n{fstab_entry}")
-            confirm_fstab = input("Confirm? (yes/no) [yes]: ").lower().strip()
-            if confirm_fstab in ['', 'yes', 'y']:
-                with open("/etc/fstab", "a") as f:
-                    f.write(fstab_entry)
-                print("Entry added to /etc/fstab.")
-
-    except (subprocess.CalledProcessError, ValueError, IndexError) as e:
+        storage_setup.persist_mount(device_to_mount, mount_path, options, network=True, uuid=uuid, fs_type=fs_type)
+
+    except (subprocess.SubprocessError, ValueError, IndexError) as e:
         print(f"An error occurred: {e}")
     input("Press Enter to continue...")
 
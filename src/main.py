@@ -1,11 +1,40 @@
+import argparse
+import sys
+
 import core
-from network import network_menu
-from iscsi import iscsi_menu
-from users import users_menu
-from ssh import ssh_menu
-from storage import storage_menu
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="lrm", description="Linux Repository Manager")
+    parser.add_argument("--trace", metavar="FILE", help="Record every external command and prompt to FILE as JSON lines")
+    subparsers = parser.add_subparsers(dest="command")
+
+    apply_parser = subparsers.add_parser("apply", help="Apply a network/iSCSI/storage/users/SSH spec without prompts")
+    apply_parser.add_argument("spec", help="Path to a JSON or YAML spec file")
+    apply_parser.add_argument("--dry-run", action="store_true", help="Only print the execution plan")
+    apply_parser.add_argument("--jobs", type=int, default=4, help="Maximum number of steps to run at once (default: 4)")
+
+    monitor_parser = subparsers.add_parser("monitor", help="Watch iSCSI session health, LUN latency and throughput")
+    monitor_parser.add_argument("--interval", type=float, default=2.0, help="Seconds between samples (default: 2)")
+    monitor_parser.add_argument("--json", action="store_true", help="Print one JSON line per sample instead of the live view")
+    monitor_parser.add_argument("--count", type=int, default=0, help="Stop after this many JSON samples (default: run until Ctrl+C)")
+
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    if args.trace:
+        import tracing
+        tracing.start(args.trace)
+    if args.command == "apply":
+        from apply import apply_setup
+        sys.exit(apply_setup.apply_spec(args.spec, dry_run=args.dry_run, jobs=args.jobs))
+    if args.command == "monitor":
+        from iscsi import iscsi_monitor
+        if args.json:
+            sys.exit(iscsi_monitor.run_json(args.interval, args.count))
+        iscsi_monitor.monitor_view(args.interval)
+        return
+
     options = [
         "Configure Networking",
         "Configure iSCSI",
@@ -15,22 +44,27 @@ def main():
     ]
 
     while True:
-        core.clear_screen()
-        core.display_menu(options, is_main_menu=True)
-        choice = core.get_choice(options)
+        choice = core.select_option(options, is_main_menu=True)
 
         if choice == 0:
             print("Exiting...")
             break
+        # Submenus are imported on first use so startup only pays for the main menu.
+        # Plain import statements (not importlib) keep them visible to PyInstaller.
         elif choice == 1:
+            from network import network_menu
             network_menu.network_menu()
         elif choice == 2:
+            from iscsi import iscsi_menu
             iscsi_menu.configure_iscsi()
         elif choice == 3:
+            from storage import storage_menu
             storage_menu.storage_menu()
         elif choice == 4:
+            from users import users_menu
             users_menu.users_menu()
         elif choice == 5:
+            from ssh import ssh_menu
             ssh_menu.ssh_menu()
         else:
             print(f"You selected option {choice}: {options[choice-1]}\n")
@@ -1,45 +1,107 @@
 import os
-import subprocess
+import shutil
+import threading
 
-def get_network_manager():
-    """Identifies the networking handler in use on the system.
+from core import run_command
 
-    Returns 'NetworkManager', 'netplan', 'systemd-networkd', or 'unknown'.
-    """
+# Handlers backed by a daemon, checked with a single `systemctl is-active` call.
+SERVICE_HANDLERS = [
+    ("NetworkManager", "NetworkManager"),
+    ("systemd-networkd", "systemd-networkd"),
+    ("wicked", "wickedd"),
+]
+
+# Priority used when several handlers are present (netplan renders to NetworkManager
+# or networkd, so an active NetworkManager wins over it).
+HANDLER_PRIORITY = ["NetworkManager", "netplan", "systemd-networkd", "ifupdown", "wicked", "netifrc"]
+
+_lock = threading.Lock()
+_detection = None
+
+
+def _active_services():
+    """Returns the handlers whose daemon is active, from one systemctl query."""
+    units = [unit for _, unit in SERVICE_HANDLERS]
     try:
-        result = subprocess.run(["systemctl", "is-active", "NetworkManager"], capture_output=True, text=True)
-        if result.returncode == 0:
-            return "NetworkManager"
+        # is-active prints one state per unit, in the order given
+        result = run_command(["systemctl", "is-active"] + units)
+    except OSError:
+        return []
+    states = result.stdout.split()
+    return [handler for (handler, _), state in zip(SERVICE_HANDLERS, states) if state == "active"]
+
 
-        result = subprocess.run(["which", "netplan"], capture_output=True, text=True)
-        if result.returncode == 0:
-            return "netplan"
+def detect_network_handlers():
+    """Probes the system for networking handlers, bypassing the cache.
+
+    Returns a dict with "handler" (the one to configure, or 'unknown'),
+    "candidates" (every handler found, in priority order) and "confidence":
+    'high' when exactly one handler daemon runs, 'medium' when the choice is
+    based on config files only, 'low' when several daemons are active at once.
+    """
+    active = _active_services()
+    found = set(active)
+    if shutil.which("netplan"):
+        found.add("netplan")
+    if os.path.exists("/etc/network/interfaces"):
+        found.add("ifupdown")
+    if os.path.exists("/etc/conf.d/net"):
+        found.add("netifrc")
 
-        result = subprocess.run(["systemctl", "is-active", "systemd-networkd"], capture_output=True, text=True)
-        if result.returncode == 0:
-            return "systemd-networkd"
+    candidates = [handler for handler in HANDLER_PRIORITY if handler in found]
+    if not candidates:
+        return {"handler": "unknown", "candidates": [], "confidence": "low"}
 
-        if os.path.exists("/etc/network/interfaces"):
-            return "ifupdown"
+    if len(active) > 1:
+        confidence = "low"
+    elif len(active) == 1:
+        confidence = "high"
+    else:
+        confidence = "medium"
+    return {"handler": candidates[0], "candidates": candidates, "confidence": confidence}
 
-        result = subprocess.run(["systemctl", "is-active", "wickedd"], capture_output=True, text=True)
-        if result.returncode == 0:
-            return "wicked"
 
-        if os.path.exists("/etc/conf.d/net"):
-            return "netifrc"
+def get_detection():
+    """Returns the cached detection result, probing on first use."""
+    global _detection
+    with _lock:
+        if _detection is None:
+            try:
+                _detection = detect_network_handlers()
+            except Exception as e:
+                print(f"An error occurred while detecting network manager: {e}")
+                return {"handler": "unknown", "candidates": [], "confidence": "low"}
+        return _detection
+
+
+def invalidate():
+    """Forgets the cached detection, e.g. after a handler was installed or switched."""
+    global _detection
+    with _lock:
+        _detection = None
+
+
+def get_network_manager():
+    """Identifies the networking handler in use on the system.
+
+    Returns 'NetworkManager', 'netplan', 'systemd-networkd', 'ifupdown', 'wicked',
+    'netifrc' or 'unknown'. Detection runs once per process; see invalidate().
+    """
+    return get_detection()["handler"]
+
 
-    except FileNotFoundError:
-        pass
-    except Exception as e:
-        print(f"An error occurred while detecting network manager: {e}")
+def describe_network_manager():
+    """Returns the handler for display, noting the other candidates when unsure."""
+    detection = get_detection()
+    others = [handler for handler in detection["candidates"] if handler != detection["handler"]]
+    if detection["confidence"] == "high" or not others:
+        return detection["handler"]
+    return f"{detection['handler']} ({detection['confidence']} confidence, also found: {', '.join(others)})"
 
-    return "unknown"
 
 def print_network_manager_status():
     """Prints the detected networking manager."""
-    handler = get_network_manager()
-    print(f"Detected networking handler: {handler}")
+    print(f"Detected networking handler: {describe_network_manager()}")
 
 if __name__ == "__main__":
     print_network_manager_status()
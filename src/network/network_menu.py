@@ -1,4 +1,4 @@
-from core import clear_screen, display_menu, get_choice
+from core import select_option
 from network import network_setup, network_check
 
 def network_menu():
@@ -7,12 +7,10 @@ def network_menu():
         "Bonded Network (NIC Teaming)"
     ]
 
-    handler = network_check.get_network_manager()
+    handler = network_check.describe_network_manager()
 
     while True:
-        clear_screen()
-        display_menu(options, subtitle=f"\nDetected Network Handler: [ {handler} ]")
-        choice = get_choice(options)
+        choice = select_option(options, subtitle=f"\nDetected Network Handler: [ {handler} ]")
 
         if choice == 0:
             break
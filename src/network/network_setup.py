@@ -41,4 +41,28 @@ def setup_network(network_type):
         elif network_type == "bonded":
             network_setup_netifrc.configure_bonded_network()
     else:
-        print("Unknown or unsupported network manager.")
\ No newline at end of file
+        print("Unknown or unsupported network manager.")
+
+def apply_network(settings):
+    """
+    Applies a network configuration without prompts (used by `lrm apply`).
+
+    Args:
+        settings (dict): "type" ("normal"/"bonded"), "interface" or "interfaces",
+            "bond_mode", "method" ("dhcp"/"static"), "address", "gateway", "dns".
+    """
+    handler = network_check.get_network_manager()
+    if handler != "NetworkManager":
+        raise RuntimeError(f"Network handler '{handler}' is not supported by apply mode yet.")
+
+    method = settings.get("method", "dhcp")
+    address = settings.get("address")
+    gateway = settings.get("gateway")
+    dns_servers = settings.get("dns")
+    if settings.get("type", "normal") == "bonded":
+        network_setup_networkmanager.apply_bonded_network(
+            settings["interfaces"], settings.get("bond_mode", "802.3ad"), method,
+            address, gateway, dns_servers, settings.get("bond_name", "bond0")
+        )
+    else:
+        network_setup_networkmanager.apply_normal_network(settings["interface"], method, address, gateway, dns_servers)
@@ -1,16 +1,18 @@
 
 import subprocess
 
+from core import run_command
+
 def get_available_interfaces():
     try:
-        output = subprocess.check_output(["nmcli", "-t", "-f", "DEVICE,TYPE", "device"]).decode()
+        output = run_command(["nmcli", "-t", "-f", "DEVICE,TYPE", "device"], check=True).stdout
         interfaces = []
         for line in output.strip().split('\n'):
             device, dev_type = line.split(':')
             if dev_type == "ethernet":
                 interfaces.append(device)
         return interfaces
-    except subprocess.CalledProcessError:
+    except (subprocess.SubprocessError, FileNotFoundError):
         return []
 
 def configure_normal_network():
@@ -42,19 +44,8 @@ def configure_normal_network():
         else:
             print("Invalid choice. Please enter 'dhcp' or 'static'.")
 
-    con_name = f"conn-{network_interface}"
-    try:
-        subprocess.run(["nmcli", "con", "delete", con_name], check=False, capture_output=True)
-    except FileNotFoundError:
-        pass
-
-    if config_type == "dhcp":
-        try:
-            subprocess.run(["nmcli", "con", "add", "type", "ethernet", "con-name", con_name, "ifname", network_interface], check=True)
-            print(f"\nDHCP configuration for {network_interface} applied successfully!")
-        except subprocess.CalledProcessError as e:
-            print(f"Error configuring DHCP: {e}")
-    else:
+    ip_cidr = gateway = dns_servers = None
+    if config_type == "static":
         while True:
             ip_cidr = input("Enter IP/CIDR (e.g., 192.168.1.1/24): ")
             if "/" in ip_cidr:
@@ -64,15 +55,29 @@ def configure_normal_network():
         gateway = input("Enter Gateway (e.g., 192.168.1.254): ")
         dns_servers = input("Enter DNS servers (comma-separated, e.g., 8.8.8.8,8.8.4.4): ")
 
-        try:
-            subprocess.run(["nmcli", "con", "add", "type", "ethernet", "con-name", con_name, "ifname", network_interface, "ip4", ip_cidr, "gw4", gateway], check=True)
-            if dns_servers:
-                subprocess.run(["nmcli", "con", "mod", con_name, "ipv4.dns", dns_servers], check=True)
-            subprocess.run(["nmcli", "con", "mod", con_name, "ipv4.method", "manual"], check=True)
-            subprocess.run(["nmcli", "con", "up", con_name], check=True)
-            print(f"\nStatic IP configuration for {network_interface} applied successfully!")
-        except subprocess.CalledProcessError as e:
-            print(f"Error configuring Static IP: {e}")
+    try:
+        apply_normal_network(network_interface, config_type, ip_cidr, gateway, dns_servers)
+    except subprocess.SubprocessError as e:
+        print(f"Error configuring {'DHCP' if config_type == 'dhcp' else 'Static IP'}: {e}")
+
+def apply_normal_network(network_interface, config_type, ip_cidr=None, gateway=None, dns_servers=None):
+    """Creates the conn-<interface> connection. Raises CalledProcessError on failure."""
+    con_name = f"conn-{network_interface}"
+    try:
+        run_command(["nmcli", "con", "delete", con_name])
+    except FileNotFoundError:
+        pass
+
+    if config_type == "dhcp":
+        run_command(["nmcli", "con", "add", "type", "ethernet", "con-name", con_name, "ifname", network_interface], capture=False, check=True)
+        print(f"\nDHCP configuration for {network_interface} applied successfully!")
+    else:
+        run_command(["nmcli", "con", "add", "type", "ethernet", "con-name", con_name, "ifname", network_interface, "ip4", ip_cidr, "gw4", gateway], capture=False, check=True)
+        if dns_servers:
+            run_command(["nmcli", "con", "mod", con_name, "ipv4.dns", dns_servers], capture=False, check=True)
+        run_command(["nmcli", "con", "mod", con_name, "ipv4.method", "manual"], capture=False, check=True)
+        run_command(["nmcli", "con", "up", con_name], capture=False, check=True)
+        print(f"\nStatic IP configuration for {network_interface} applied successfully!")
 
 def configure_bonded_network():
     print("Configuring Bonded Network...\n")
@@ -124,41 +129,45 @@ def configure_bonded_network():
         else:
             print("Invalid choice. Please enter 'dhcp' or 'static'.")
 
-    bond_name = "bond0"
+    ip_cidr = gateway = dns_servers = None
+    if config_type == "static":
+        while True:
+            ip_cidr = input("Enter IP/CIDR for bond0 (e.g., 192.168.1.1/24): ")
+            if "/" in ip_cidr:
+                break
+            else:
+                print("Invalid format. Please use CIDR notation (e.g., 192.168.1.1/24).")
+        gateway = input("Enter Gateway for bond0 (e.g., 192.168.1.254): ")
+        dns_servers = input("Enter DNS servers for bond0 (comma-separated, e.g., 8.8.8.8,8.8.4.4): ")
+
+    try:
+        apply_bonded_network(selected_interfaces, bond_mode, config_type, ip_cidr, gateway, dns_servers)
+    except subprocess.SubprocessError as e:
+        print(f"Error configuring bonded network: {e}")
+
+def apply_bonded_network(interfaces, bond_mode, config_type, ip_cidr=None, gateway=None, dns_servers=None, bond_name="bond0"):
+    """Creates the bond and its member connections. Raises CalledProcessError on failure."""
     con_name = f"conn-{bond_name}"
 
     try:
-        subprocess.run(["nmcli", "con", "delete", con_name], check=False, capture_output=True)
-        for iface in selected_interfaces:
-            subprocess.run(["nmcli", "con", "delete", f"conn-{iface}"], check=False, capture_output=True)
+        run_command(["nmcli", "con", "delete", con_name])
+        for iface in interfaces:
+            run_command(["nmcli", "con", "delete", f"conn-{iface}"])
     except FileNotFoundError:
         pass
 
-    try:
-        subprocess.run(["nmcli", "con", "add", "type", "bond", "con-name", con_name, "ifname", bond_name, "mode", bond_mode], check=True)
-        for iface in selected_interfaces:
-            subprocess.run(["nmcli", "con", "add", "type", "ethernet", "con-name", f"conn-{iface}", "ifname", iface, "master", bond_name], check=True)
+    run_command(["nmcli", "con", "add", "type", "bond", "con-name", con_name, "ifname", bond_name, "mode", bond_mode], capture=False, check=True)
+    for iface in interfaces:
+        run_command(["nmcli", "con", "add", "type", "ethernet", "con-name", f"conn-{iface}", "ifname", iface, "master", bond_name], capture=False, check=True)
 
-        if config_type == "dhcp":
-            subprocess.run(["nmcli", "con", "mod", con_name, "ipv4.method", "auto"], check=True)
-        else:
-            while True:
-                ip_cidr = input("Enter IP/CIDR for bond0 (e.g., 192.168.1.1/24): ")
-                if "/" in ip_cidr:
-                    break
-                else:
-                    print("Invalid format. Please use CIDR notation (e.g., 192.168.1.1/24).")
-            gateway = input("Enter Gateway for bond0 (e.g., 192.168.1.254): ")
-            dns_servers = input("Enter DNS servers for bond0 (comma-separated, e.g., 8.8.8.8,8.8.4.4): ")
-
-            subprocess.run(["nmcli", "con", "mod", con_name, "ipv4.addresses", ip_cidr], check=True)
-            subprocess.run(["nmcli", "con", "mod", con_name, "ipv4.gateway", gateway], check=True)
-            if dns_servers:
-                subprocess.run(["nmcli", "con", "mod", con_name, "ipv4.dns", dns_servers], check=True)
-            subprocess.run(["nmcli", "con", "mod", con_name, "ipv4.method", "manual"], check=True)
-
-        subprocess.run(["nmcli", "con", "up", con_name], check=True)
-        print(f"\nBonded network '{bond_name}' configured successfully!")
-
-    except subprocess.CalledProcessError as e:
-        print(f"Error configuring bonded network: {e}")
+    if config_type == "dhcp":
+        run_command(["nmcli", "con", "mod", con_name, "ipv4.method", "auto"], capture=False, check=True)
+    else:
+        run_command(["nmcli", "con", "mod", con_name, "ipv4.addresses", ip_cidr], capture=False, check=True)
+        run_command(["nmcli", "con", "mod", con_name, "ipv4.gateway", gateway], capture=False, check=True)
+        if dns_servers:
+            run_command(["nmcli", "con", "mod", con_name, "ipv4.dns", dns_servers], capture=False, check=True)
+        run_command(["nmcli", "con", "mod", con_name, "ipv4.method", "manual"], capture=False, check=True)
+
+    run_command(["nmcli", "con", "up", con_name], capture=False, check=True)
+    print(f"\nBonded network '{bond_name}' configured successfully!")
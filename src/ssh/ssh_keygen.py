@@ -3,6 +3,8 @@ import os
 import pwd
 import tempfile
 
+from core import run_command
+
 from users.users_setup import _write_ssh_key
 
 def generate_ssh_keypair():
@@ -44,7 +46,7 @@ def generate_ssh_keypair():
             if comment:
                 print(f"Comment: '{comment}'")
 
-            subprocess.run(command_parts, check=True, capture_output=True)
+            run_command(command_parts, check=True)
 
             with open(private_key_path, 'r') as f:
                 private_key = f.read().strip()
@@ -1,4 +1,4 @@
-from core import clear_screen, display_menu, get_choice
+from core import select_option
 from ssh import ssh_keygen
 from ssh import ssh_setup
 
@@ -11,9 +11,7 @@ def ssh_menu():
     ]
 
     while True:
-        clear_screen()
-        display_menu(options)
-        choice = get_choice(options)
+        choice = select_option(options)
 
         if choice == 0:
             break
@@ -2,18 +2,33 @@ import subprocess
 import shutil
 import datetime
 
+from core import run_command, run_commands
+
+SSHD_CONFIG_PATH = "/etc/ssh/sshd_config"
+
+HARDENED_SETTINGS = [
+    "# --- Hardened settings by Linux Repository Manager ---",
+    "PermitRootLogin no",
+    "PubkeyAuthentication yes",
+    "PasswordAuthentication no",
+    "ChallengeResponseAuthentication no",
+    "PermitEmptyPasswords no",
+    "X11Forwarding no",
+    "MaxAuthTries 3",
+    "LoginGraceTime 20",
+    "# --- End of hardened settings ---"
+]
+
 def _get_ssh_service_name():
     """Determines the correct SSH service name (ssh.service or sshd.service)."""
     service_names = ["sshd", "ssh"]
-    for name in service_names:
-        try:
-            # Check if the service exists and is manageable by systemctl
-            subprocess.run(["systemctl", "status", f"{name}.service"], check=True, capture_output=True)
+    # Check both candidates at once; the first one manageable by systemctl wins
+    results = run_commands([["systemctl", "status", f"{name}.service"] for name in service_names])
+    for name, result in zip(service_names, results):
+        # 0 = running, 3 = installed but stopped
+        if result.returncode in (0, 3):
             return name
-        except subprocess.CalledProcessError:
-            # Service not found or not active, try next
-            continue
-        except FileNotFoundError:
+        if result.returncode == 127:
             # systemctl command not found, return None
             return None
     return None # No SSH service found
@@ -28,7 +43,7 @@ def _get_ssh_status():
         return "unknown" # Could not determine service name
 
     try:
-        result = subprocess.run(["systemctl", "is-active", f"{ssh_service_name}.service"], capture_output=True, text=True)
+        result = run_command(["systemctl", "is-active", f"{ssh_service_name}.service"])
         if result.returncode == 0:
             return "active"
         else:
@@ -58,20 +73,17 @@ def toggle_ssh_service():
     if (action == "disable" and choice in ['y', 'yes']) or \
        (action == "enable" and choice in ['y', 'yes', '']):
         try:
-            ssh_service_name = _get_ssh_service_name()
-            if not ssh_service_name:
-                print("Could not determine SSH service name. Cannot toggle service.")
-                return
-
             if action == "enable":
                 print("Enabling and starting SSH service...")
-                subprocess.run(["systemctl", "enable", "--now", f"{ssh_service_name}.service"], check=True, capture_output=True)
+                set_ssh_service(True)
                 print("SSH service enabled and started successfully.")
             else:
                 print("Disabling and stopping SSH service...")
-                subprocess.run(["systemctl", "disable", "--now", f"{ssh_service_name}.service"], check=True, capture_output=True)
+                set_ssh_service(False)
                 print("SSH service stopped and disabled successfully.")
-        except subprocess.CalledProcessError as e:
+        except RuntimeError as e:
+            print(f"{e} Cannot toggle service.")
+        except subprocess.SubprocessError as e:
             print(f"Error executing systemctl command: {e.stderr}")
     else:
         print("No changes made.")
@@ -79,22 +91,41 @@ def toggle_ssh_service():
     input("Press Enter to continue...")
 
 
+def set_ssh_service(enabled):
+    """Enables and starts, or disables and stops, the SSH service."""
+    ssh_service_name = _get_ssh_service_name()
+    if not ssh_service_name:
+        raise RuntimeError("Could not determine SSH service name.")
+    action = "enable" if enabled else "disable"
+    run_command(["systemctl", action, "--now", f"{ssh_service_name}.service"], check=True)
+
+
+def restart_ssh_service():
+    ssh_service_name = _get_ssh_service_name()
+    if not ssh_service_name:
+        raise RuntimeError("Could not determine SSH service name.")
+    run_command(["systemctl", "restart", f"{ssh_service_name}.service"], check=True)
+
+
+def write_hardened_config():
+    """Backs up sshd_config, prepends the hardened settings and returns the backup path."""
+    backup_path = f"{SSHD_CONFIG_PATH}.bak.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    print(f"Creating backup of current configuration at {backup_path}...")
+    shutil.copy2(SSHD_CONFIG_PATH, backup_path)
+
+    with open(SSHD_CONFIG_PATH, 'r') as f:
+        original_content = f.read()
+
+    new_content = "\n".join(HARDENED_SETTINGS) + "\n\n" + original_content
+
+    with open(SSHD_CONFIG_PATH, 'w') as f:
+        f.write(new_content)
+    print(f"Hardened configuration written to {SSHD_CONFIG_PATH}.")
+    return backup_path
+
+
 def harden_ssh():
     """Hardens the SSH server configuration by prepending secure settings."""
-    sshd_config_path = "/etc/ssh/sshd_config"
-
-    hardened_settings = [
-        "# --- Hardened settings by Linux Repository Manager ---",
-        "PermitRootLogin no",
-        "PubkeyAuthentication yes",
-        "PasswordAuthentication no",
-        "ChallengeResponseAuthentication no",
-        "PermitEmptyPasswords no",
-        "X11Forwarding no",
-        "MaxAuthTries 3",
-        "LoginGraceTime 20",
-        "# --- End of hardened settings ---"
-    ]
 
     print("\n--- SSH Hardening ---")
     print("This will apply security settings to your SSH configuration by adding them to the top of the file.")
@@ -112,32 +143,21 @@ def harden_ssh():
         return
 
     try:
-        backup_path = f"{sshd_config_path}.bak.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
-        print(f"Creating backup of current configuration at {backup_path}...")
-        shutil.copy2(sshd_config_path, backup_path)
-
-        with open(sshd_config_path, 'r') as f:
-            original_content = f.read()
-
-        new_content = "\n".join(hardened_settings) + "\n\n" + original_content
-
-        with open(sshd_config_path, 'w') as f:
-            f.write(new_content)
-        print(f"Hardened configuration written to {sshd_config_path}.")
+        write_hardened_config()
 
         restart_choice = input("\nDo you want to restart the SSH service to apply changes now? (yes/no) [yes]: ").strip().lower()
         if restart_choice in ['', 'y', 'yes']:
             print("Restarting SSH service...")
-            ssh_service_name = _get_ssh_service_name()
-            if not ssh_service_name:
-                print("Could not determine SSH service name. Cannot restart service.")
+            try:
+                restart_ssh_service()
+            except RuntimeError as e:
+                print(f"{e} Cannot restart service.")
                 return
-            subprocess.run(["systemctl", "restart", f"{ssh_service_name}.service"], check=True, capture_output=True)
             print("SSH service restarted.")
         else:
             print("Please restart the SSH service manually ('sudo systemctl restart ssh') to apply changes.")
 
-    except (FileNotFoundError, PermissionError, subprocess.CalledProcessError) as e:
+    except (FileNotFoundError, PermissionError, subprocess.SubprocessError) as e:
         print(f"An error occurred: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
@@ -0,0 +1,126 @@
+import time
+
+from apply.apply_graph import Task, run_graph
+from core import parse_selection
+from storage import storage_inventory, storage_mkfs, storage_setup
+
+# Disks partitioned and formatted at once. mkfs mostly waits on the storage,
+# but every LUN behind one array shares its controllers.
+BATCH_FORMAT_CONCURRENCY = 8
+
+
+def get_blank_candidates(transport=None):
+    """Returns whole disks and multipath maps with nothing mounted on them or their partitions."""
+    candidates = []
+    for device_info in storage_inventory.collapse_multipath(storage_inventory.get_devices(types=("disk", "mpath"), transport=transport)):
+        partitions = storage_inventory.get_partitions(device_info.name)
+        if device_info.mountpoint or any(part.mountpoint for part in partitions):
+            continue
+        candidates.append(device_info)
+    return candidates
+
+
+def build_format_tasks(disk_paths, fs_type, force=False, mkfs_profile="default", stripe=None):
+    """Returns the partition -> mkfs tasks for every disk, the dict their partitions are recorded in,
+    and the dict of their collected output lines.
+
+    mkfs fails when xfs_info shows the filesystem does not match the profile.
+    """
+    targets = {}
+    outputs = {disk_path: [] for disk_path in disk_paths}
+    tasks = []
+    for disk_path in disk_paths:
+        def partition(disk_path=disk_path):
+            targets[disk_path] = storage_setup.partition_whole_disk(disk_path, output=outputs[disk_path])
+
+        def mkfs(disk_path=disk_path):
+            storage_setup.create_filesystem(targets[disk_path], fs_type, force=force, extra_args=storage_mkfs.mkfs_args(fs_type, mkfs_profile, stripe, targets[disk_path]), output=outputs[disk_path])
+            problems = storage_mkfs.verify_filesystem(targets[disk_path], fs_type, mkfs_profile, stripe)
+            if problems:
+                raise RuntimeError("; ".join(problems))
+
+        tasks.append(Task(f"partition:{disk_path}", partition))
+        tasks.append(Task(f"mkfs:{disk_path}", mkfs, [f"partition:{disk_path}"]))
+    return tasks, targets, outputs
+
+
+def format_disks(disk_paths, fs_type, max_parallel=BATCH_FORMAT_CONCURRENCY, force=False, mkfs_profile="default", stripe=None):
+    """Partitions and formats every disk, up to max_parallel at a time.
+
+    Returns one (disk path, status, partition path, partition seconds, mkfs
+    seconds, error, output lines) per disk, status being "ok" or "failed".
+    """
+    tasks, targets, outputs = build_format_tasks(disk_paths, fs_type, force, mkfs_profile, stripe)
+    results = run_graph(tasks, max_workers=max_parallel)
+    report = []
+    for disk_path in disk_paths:
+        _, partition_time, partition_error = results[f"partition:{disk_path}"]
+        mkfs_status, mkfs_time, mkfs_error = results[f"mkfs:{disk_path}"]
+        status = "ok" if mkfs_status == "ok" else "failed"
+        report.append((disk_path, status, targets.get(disk_path, ""), partition_time, mkfs_time, partition_error or mkfs_error, outputs[disk_path]))
+    return report
+
+
+def print_report(report, wall):
+    print("\n--- Batch Format Report ---")
+    print(f"{'DEVICE':<28} {'STATUS':<7} {'PARTITION':<28} {'PART':>6} {'MKFS':>7} {'TOTAL':>7}")
+    for disk_path, status, partition, partition_time, mkfs_time, error, output in report:
+        print(f"{disk_path:<28} {status.upper():<7} {partition or '-':<28} {partition_time:>5.1f}s {mkfs_time:>6.1f}s {partition_time + mkfs_time:>6.1f}s")
+        if error:
+            print(f"  {error}")
+            # The commands' own output explains the failure; on success it is only noise.
+            for line in output:
+                print(f"    {line}")
+    succeeded = sum(1 for entry in report if entry[1] == "ok")
+    serial = sum(entry[3] + entry[4] for entry in report)
+    print(f"\n{succeeded}/{len(report)} disk(s) ready in {wall:.1f}s (one at a time: {serial:.1f}s).")
+
+
+def batch_format(transport=None):
+    """Partitions and formats several blank disks at once. transport="iscsi" limits the list to LUNs."""
+    print("\n--- Batch Format Disks ---")
+    candidates = get_blank_candidates(transport)
+    if not candidates:
+        print("No unmounted disks found.")
+        input("Press Enter to continue...")
+        return
+
+    print("\nDisks with nothing mounted:")
+    for i, device_info in enumerate(candidates):
+        partitions = storage_inventory.get_partitions(device_info.name)
+        note = f" [{len(partitions)} partition(s) will be destroyed]" if partitions else ""
+        print(f"{i + 1}. {device_info.path} ({device_info.size_text}){note}")
+
+    while True:
+        try:
+            indices = parse_selection(input("\nSelect the disks to format (e.g., 1,3-5 or 'all'): "), len(candidates))
+            if indices:
+                break
+            print("No disks selected.")
+        except ValueError:
+            print("Invalid input.")
+    disk_paths = [candidates[i].path for i in indices]
+
+    print("\nAvailable filesystems: xfs, ext4, ext3, ext2")
+    fs_choice = input("Enter the filesystem to use (default: xfs): ").lower().strip() or "xfs"
+    if fs_choice not in ["xfs", "ext4", "ext3", "ext2"]:
+        print("Invalid filesystem choice. Using xfs instead.")
+        fs_choice = "xfs"
+    # LUNs formatted together normally come from one array, so they share its stripe.
+    mkfs_profile, stripe = storage_mkfs.choose_mkfs_profile(disk_paths[0], fs_choice)
+
+    jobs_input = input(f"Disks to prepare at once [{BATCH_FORMAT_CONCURRENCY}]: ").strip()
+    max_parallel = int(jobs_input) if jobs_input.isdigit() and int(jobs_input) > 0 else BATCH_FORMAT_CONCURRENCY
+
+    print(f"\nWARNING: {len(disk_paths)} disk(s) will get a new GPT label with one {fs_choice} partition. ALL DATA ON THEM WILL BE ERASED:")
+    for disk_path in disk_paths:
+        print(f"  {disk_path}")
+    if input("Are you sure you want to continue? (yes/no): ").lower().strip() != "yes":
+        print("Formatting cancelled.")
+        input("Press Enter to continue...")
+        return
+
+    start = time.monotonic()
+    report = format_disks(disk_paths, fs_choice, max_parallel, mkfs_profile=mkfs_profile, stripe=stripe)
+    print_report(report, time.monotonic() - start)
+    input("\nPress Enter to continue...")
@@ -0,0 +1,325 @@
+import datetime
+import errno
+import json
+import mmap
+import os
+import random
+import stat
+import threading
+import time
+
+from storage import storage_inventory, storage_probe
+
+RESULTS_PATH = "/var/lib/lrm/disk_benchmarks.jsonl"
+
+# name: (sequential, writes). Sequential tests give every job its own
+# region of the target so streams do not overlap.
+TESTS = {
+    "seq-read": (True, False),
+    "seq-write": (True, True),
+    "rand-read": (False, False),
+    "rand-write": (False, True),
+}
+SEQ_BLOCK_SIZE = 1024 * 1024
+RAND_BLOCK_SIZE = 4096
+QUEUE_DEPTH = 8
+JOBS = 2
+DURATION = 10.0
+SCRATCH_FILE_SIZE = 1024 ** 3
+# O_DIRECT needs buffers, offsets and sizes aligned to the logical block size.
+ALIGNMENT = 4096
+
+
+def _percentiles(latencies):
+    """Returns p50/p99/p99.9 in ms (nearest rank) of latencies in ns."""
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"p50": 0.0, "p99": 0.0, "p999": 0.0}
+    def rank(pct):
+        return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))] / 1e6
+    return {"p50": rank(50), "p99": rank(99), "p999": rank(99.9)}
+
+
+def open_target(path, write):
+    """Opens a device or file for direct I/O. Returns (fd, direct).
+
+    Block devices are opened exclusively for writes, so the kernel refuses
+    (EBUSY) while they are mounted or held by LVM, md or dm. Filesystems
+    without O_DIRECT (tmpfs) fall back to buffered I/O.
+    """
+    flags = (os.O_RDWR if write else os.O_RDONLY) | getattr(os, "O_DIRECT", 0)
+    if write and stat.S_ISBLK(os.stat(path).st_mode):
+        flags |= os.O_EXCL
+    try:
+        return os.open(path, flags), bool(getattr(os, "O_DIRECT", 0))
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+    return os.open(path, flags & ~os.O_DIRECT), False
+
+
+def get_busy_reason(device_info):
+    """Returns why writing to a device would hit live data (a mounted partition, an LVM PV, an md member...), or ""."""
+    if device_info.mountpoint:
+        return f"it is mounted at {device_info.mountpoint}"
+    pending = list(device_info.children)
+    while pending:
+        child = pending.pop()
+        if child.mountpoint:
+            return f"{child.path} is mounted at {child.mountpoint}"
+        if child.type != "part":
+            return f"it is in use by {child.path}"
+        pending += child.children
+    holders = storage_probe.get_holders(device_info.name)
+    if holders:
+        return f"it is in use by {storage_probe.device_path(holders[0])}"
+    return ""
+
+
+def can_open_exclusively(path):
+    """Checks that no filesystem, LVM, md or dm claims a block device (open with O_EXCL)."""
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_EXCL)
+    except OSError as e:
+        if e.errno == errno.EBUSY:
+            return False
+        raise
+    os.close(fd)
+    return True
+
+
+def get_target_size(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+
+
+def prepare_scratch_file(path, size=SCRATCH_FILE_SIZE):
+    """Creates a scratch file filled with random data so reads hit written blocks, not holes."""
+    size -= size % SEQ_BLOCK_SIZE
+    if os.path.isfile(path) and os.path.getsize(path) >= size:
+        return
+    chunk = os.urandom(SEQ_BLOCK_SIZE)
+    with open(path, "wb") as f:
+        for _ in range(size // SEQ_BLOCK_SIZE):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def run_test(path, test, block_size, queue_depth=QUEUE_DEPTH, jobs=JOBS, duration=DURATION):
+    """Runs one test for `duration` seconds and returns its results.
+
+    Every job keeps queue_depth I/Os in flight with one thread per I/O, each
+    doing pread/pwrite into its own page-aligned buffer; the GIL is released
+    during the system call, so the threads really overlap.
+    """
+    sequential, write = TESTS[test]
+    if block_size % ALIGNMENT:
+        raise ValueError(f"the block size must be a multiple of {ALIGNMENT}")
+    blocks = get_target_size(path) // block_size
+    if blocks < jobs:
+        raise ValueError(f"{path} is too small for {jobs} job(s) of {block_size}-byte blocks")
+    region = blocks // jobs
+    fd, direct = open_target(path, write)
+    cursors = [0] * jobs
+    lock = threading.Lock()
+    latencies, totals, errors = [], [0], []
+    deadline = time.monotonic() + duration
+
+    def worker(job, seed):
+        try:
+            run_worker(job, seed)
+        except OSError as e:
+            errors.append(e)
+
+    def run_worker(job, seed):
+        buffer = mmap.mmap(-1, block_size)
+        if write:
+            # Random data, so arrays that compress or deduplicate cannot shortcut the writes.
+            buffer.write(os.urandom(block_size))
+        rng = random.Random(seed)
+        local, done = [], 0
+        while time.monotonic() < deadline:
+            if sequential:
+                with lock:
+                    block = job * region + cursors[job]
+                    cursors[job] = (cursors[job] + 1) % region
+            else:
+                block = rng.randrange(blocks)
+            started = time.perf_counter_ns()
+            if write:
+                os.pwritev(fd, [buffer], block * block_size)
+            else:
+                os.preadv(fd, [buffer], block * block_size)
+            local.append(time.perf_counter_ns() - started)
+            done += 1
+        with lock:
+            latencies.extend(local)
+            totals[0] += done
+        buffer.close()
+
+    threads = [threading.Thread(target=worker, args=(job, job * queue_depth + slot), daemon=True)
+               for job in range(jobs) for slot in range(queue_depth)]
+    start = time.monotonic()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if write:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+    elapsed = time.monotonic() - start
+    if errors:
+        raise errors[0]
+
+    result = {"test": test, "block_size": block_size, "queue_depth": queue_depth, "jobs": jobs, "direct": direct,
+              "seconds": round(elapsed, 3), "ios": totals[0],
+              "mb_s": round(totals[0] * block_size / elapsed / 1e6, 1), "iops": round(totals[0] / elapsed)}
+    result.update({key: round(value, 3) for key, value in _percentiles(latencies).items()})
+    return result
+
+
+def load_results(target):
+    """Returns the saved runs of a target, oldest first."""
+    runs = []
+    try:
+        with open(RESULTS_PATH, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("target") == target:
+                    runs.append(entry)
+    except OSError:
+        pass
+    return runs
+
+
+def save_result(target, results, label=""):
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "a") as f:
+        f.write(json.dumps({"time": datetime.datetime.now().isoformat(timespec="seconds"), "target": target,
+                            "label": label, "results": results}) + "\n")
+
+
+def find_previous(runs, result):
+    """Returns the latest saved result of the same test with the same parameters, or None."""
+    keys = ("test", "block_size", "queue_depth", "jobs")
+    for run in reversed(runs):
+        for previous in run.get("results", []):
+            if all(previous.get(key) == result[key] for key in keys):
+                return run, previous
+    return None
+
+
+def print_results(results, runs=()):
+    print(f"\n{'TEST':<11} {'BS':>5} {'QD':>6} {'MB/s':>9} {'IOPS':>9} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9}  VS LAST RUN")
+    for result in results:
+        compare = ""
+        previous = find_previous(runs, result)
+        if previous and previous[1].get("mb_s"):
+            run, old = previous
+            change = (result["mb_s"] - old["mb_s"]) / old["mb_s"] * 100
+            compare = f"{change:+.0f}% MB/s, p99 {old['p99']:.2f} -> {result['p99']:.2f} ms ({run['time']}{', ' + run['label'] if run.get('label') else ''})"
+        print(f"{result['test']:<11} {storage_probe.format_size(result['block_size']):>5} {result['jobs']}x{result['queue_depth']:<4} "
+              f"{result['mb_s']:>9.1f} {result['iops']:>9} {result['p50']:>8.2f} {result['p99']:>8.2f} {result['p999']:>9.2f}  {compare}")
+    if any(not result["direct"] for result in results):
+        print("Note: the target does not support O_DIRECT; results include the page cache.")
+
+
+def _ask_int(prompt, default):
+    value = input(f"{prompt} [{default}]: ").strip()
+    return int(value) if value.isdigit() and int(value) > 0 else default
+
+
+def _ask_block_size(prompt, default):
+    value = input(f"{prompt} [{storage_probe.format_size(default)}]: ").strip().upper()
+    try:
+        size = int(value[:-1]) * {"K": 1024, "M": 1024 ** 2}[value[-1]] if value else default
+    except (KeyError, ValueError):
+        print("Invalid size, using the default.")
+        return default
+    if size % ALIGNMENT:
+        print(f"The block size must be a multiple of {ALIGNMENT // 1024}K, using the default.")
+        return default
+    return size
+
+
+def _select_target(transport=None):
+    """Returns (path, why writes are unsafe or "", whether write tests need a typed confirmation), or (None, "", False).
+
+    Only a scratch file created here may be written to without asking: an
+    existing file could be a backup file or a VM image.
+    """
+    devices = storage_inventory.collapse_multipath(storage_inventory.get_devices(types=("disk", "mpath", "part"), transport=transport))
+    print("\nDevices:")
+    for i, device_info in enumerate(devices):
+        mountpoint = f" (Mounted at: {device_info.mountpoint})" if device_info.mountpoint else ""
+        print(f"{i + 1}. {device_info.path} ({device_info.size_text}){mountpoint}")
+    choice = input("Select a device, or enter the path of a scratch file or loop device (e.g., /srv/veeam/lrm-bench.dat): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(devices):
+        device_info = devices[int(choice) - 1]
+        return device_info.path, get_busy_reason(device_info), True
+    if not choice.startswith("/"):
+        print("Invalid choice.")
+        return None, "", False
+    if os.path.exists(choice):
+        busy = ""
+        if stat.S_ISBLK(os.stat(choice).st_mode):
+            device_info = storage_inventory.get_device(storage_probe.device_name(choice))
+            busy = get_busy_reason(device_info) if device_info else ""
+        return choice, busy, True
+    size = _ask_int("Scratch file size in MiB", SCRATCH_FILE_SIZE // 1024 ** 2) * 1024 ** 2
+    print(f"Preparing {choice}...")
+    prepare_scratch_file(choice, size)
+    return choice, "", False
+
+
+def benchmark_disk(transport=None):
+    """Measures throughput and latency of a device, LUN or scratch file and saves the results."""
+    print("\n--- Benchmark Disk ---")
+    try:
+        target, busy, confirm_writes = _select_target(transport)
+        if not target:
+            input("Press Enter to continue...")
+            return
+
+        tests = list(TESTS)
+        if not busy and stat.S_ISBLK(os.stat(target).st_mode) and not can_open_exclusively(target):
+            busy = "the kernel reports it busy"
+        if busy:
+            print(f"Only the read tests will run on {target}: {busy}. Benchmark a scratch file on its filesystem to test writes.")
+            tests = [test for test in tests if not TESTS[test][1]]
+        elif confirm_writes and input(f"Write tests destroy the data in {target}. Type its path to include them, or press Enter for read tests only: ").strip() != target:
+            tests = [test for test in tests if not TESTS[test][1]]
+
+        seq_block_size = _ask_block_size("Sequential block size", SEQ_BLOCK_SIZE)
+        rand_block_size = _ask_block_size("Random block size", RAND_BLOCK_SIZE)
+        queue_depth = _ask_int("Queue depth per job", QUEUE_DEPTH)
+        jobs = _ask_int("Jobs (parallel streams)", JOBS)
+        duration = _ask_int("Seconds per test", int(DURATION))
+        label = input("Label for this run (e.g., before tuning), optional: ").strip()
+
+        runs = load_results(target)
+        results = []
+        for test in tests:
+            print(f"Running {test} on {target} for {duration}s...")
+            block_size = seq_block_size if TESTS[test][0] else rand_block_size
+            results.append(run_test(target, test, block_size, queue_depth, jobs, duration))
+        print_results(results, runs)
+        save_result(target, results, label)
+        print(f"\nResults saved to {RESULTS_PATH}.")
+    except OSError as e:
+        print(f"Error: {e}")
+    except ValueError as e:
+        print(f"Error: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+    input("\nPress Enter to continue...")
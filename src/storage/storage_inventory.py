@@ -0,0 +1,237 @@
+import json
+import threading
+
+from core import run_command
+from storage import storage_probe
+
+# The kernel bumps this counter on every uevent (disk added/removed, partition
+# table re-read, udev "change" after mkfs...). As long as it has not moved, the
+# block device tree we built last time is still valid.
+UEVENT_SEQNUM_PATH = "/sys/kernel/uevent_seqnum"
+MOUNTINFO_PATH = "/proc/self/mountinfo"
+
+LSBLK_COLUMNS = "NAME,KNAME,PKNAME,MAJ:MIN,SIZE,TYPE,TRAN,FSTYPE,UUID,LABEL,WWN,SERIAL"
+
+_lock = threading.Lock()
+_devices = None
+_indexes = {}
+_seqnum = None
+
+
+class BlockDevice:
+    """One node of the block device tree: a disk, a partition or a holder (dm, md).
+
+    parents and children are nodes too; a multipath map or RAID array has one
+    parent per path or member.
+    """
+    __slots__ = ("name", "path", "devno", "size", "type", "tran", "fstype", "uuid", "label",
+                 "wwn", "serial", "mountpoint", "parents", "children")
+
+    def __init__(self, row):
+        self.name = row["kname"] or row["name"]
+        self.path = storage_probe.device_path(self.name)
+        self.devno = row["maj:min"]
+        self.size = row["size"]
+        self.type = row["type"]
+        self.tran = row["tran"]
+        self.fstype = row["fstype"]
+        self.uuid = row["uuid"]
+        self.label = row["label"]
+        self.wwn = row["wwn"]
+        self.serial = row["serial"]
+        self.mountpoint = ""
+        self.parents = []
+        self.children = []
+
+    @property
+    def size_text(self):
+        """The size the way lsblk prints it (e.g. 500M, 1.8T)."""
+        return storage_probe.format_size(self.size)
+
+    def __repr__(self):
+        return f"BlockDevice({self.name!r}, {self.type!r})"
+
+
+def _read_seqnum():
+    try:
+        with open(UEVENT_SEQNUM_PATH, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_mountpoints():
+    """Maps "major:minor" to the first mount point of that device.
+
+    Mounting does not generate a uevent, so mount points are always read fresh
+    from mountinfo instead of being cached with the rest of the tree.
+    """
+    mountpoints = {}
+    try:
+        with open(MOUNTINFO_PATH, "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 4 and fields[2] not in mountpoints:
+                    mountpoints[fields[2]] = fields[4].replace("\\040", " ")
+    except OSError:
+        pass
+    return mountpoints
+
+
+def _flatten(nodes, parent, rows):
+    """Turns lsblk's nested JSON into one row per device and parent, like storage_probe.list_device_rows()."""
+    for node in nodes:
+        row = {column: node.get(column) or "" for column in LSBLK_COLUMNS.lower().split(",")}
+        # lsblk before 2.33 prints the byte size as a string.
+        row["size"] = int(row["size"] or 0)
+        row["pkname"] = row["pkname"] or parent
+        rows.append(row)
+        _flatten(node.get("children", []), row["kname"] or row["name"], rows)
+    return rows
+
+
+def _lsblk_rows():
+    result = run_command(["lsblk", "-J", "-b", "-o", LSBLK_COLUMNS], check=True)
+    return _flatten(json.loads(result.stdout).get("blockdevices", []), "", [])
+
+
+def _build_devices():
+    """Builds the whole block device tree with a single lsblk call.
+
+    Minimal images without lsblk get the same tree straight from sysfs.
+    """
+    try:
+        rows = _lsblk_rows()
+    except FileNotFoundError:
+        rows = storage_probe.list_device_rows()
+
+    devices = {}
+    parent_names = {}
+    for row in rows:
+        name = row["kname"] or row["name"]
+        # Multipath and RAID members show the same holder once per path; keep one node.
+        if name not in devices:
+            devices[name] = BlockDevice(row)
+            parent_names[name] = []
+        if row["pkname"] and row["pkname"] not in parent_names[name]:
+            parent_names[name].append(row["pkname"])
+
+    for name, device in devices.items():
+        for parent in parent_names[name]:
+            if parent in devices:
+                device.parents.append(devices[parent])
+                devices[parent].children.append(device)
+                # lsblk only reports the transport on the disk itself
+                if not device.tran:
+                    device.tran = devices[parent].tran
+
+    return devices
+
+
+def _build_indexes(devices):
+    """Indexes the nodes by WWN and serial.
+
+    Every path of a multipath LUN carries the same WWN and serial, so both
+    map to lists.
+    """
+    indexes = {"wwn": {}, "serial": {}}
+    for device in devices.values():
+        for key in ("wwn", "serial"):
+            value = getattr(device, key)
+            if value:
+                indexes[key].setdefault(value, []).append(device)
+    return indexes
+
+
+def _get_tree():
+    global _devices, _indexes, _seqnum
+    with _lock:
+        seqnum = _read_seqnum()
+        if _devices is None or seqnum is None or seqnum != _seqnum:
+            _devices = _build_devices()
+            _indexes = _build_indexes(_devices)
+            _seqnum = seqnum
+
+        mountpoints = _read_mountpoints()
+        for device in _devices.values():
+            device.mountpoint = mountpoints.get(device.devno, "")
+        return _devices
+
+
+def invalidate():
+    """Drops the cached tree. Call after anything that changes disks or partitions."""
+    global _devices
+    with _lock:
+        _devices = None
+
+
+def get_devices(types=None, transport=None):
+    """Returns device nodes in lsblk order, optionally filtered by type and transport."""
+    devices = []
+    for device in _get_tree().values():
+        if types and device.type not in types:
+            continue
+        if transport and device.tran.lower() != transport:
+            continue
+        devices.append(device)
+    return devices
+
+
+def get_device(name):
+    """Returns the node for a kernel name such as 'sdb1', or None."""
+    return _get_tree().get(name)
+
+
+def find_by_wwn(wwn):
+    """Returns every node with this WWN: one per path of a multipath LUN."""
+    _get_tree()
+    return list(_indexes["wwn"].get(wwn, []))
+
+
+def find_by_serial(serial):
+    _get_tree()
+    return list(_indexes["serial"].get(serial, []))
+
+
+def collapse_multipath(devices):
+    """Replaces the path disks of a multipath map with the map itself.
+
+    A LUN reached over two portals shows up as two disks (sdb, sdc) holding
+    one mpath device; only the mpath device may be partitioned or mounted.
+    """
+    collapsed = []
+    seen = set()
+    for device in devices:
+        maps = [child for child in device.children if child.type == "mpath"]
+        for candidate in maps or [device]:
+            if candidate.name not in seen:
+                seen.add(candidate.name)
+                collapsed.append(candidate)
+    return collapsed
+
+
+def get_partitions(disk_name):
+    """Returns the partition nodes of a disk, in order."""
+    disk = _get_tree().get(disk_name)
+    if not disk:
+        return []
+    return [child for child in disk.children if child.type == "part"]
+
+
+def print_tree(names=None):
+    """Prints the device tree (or only the given top-level devices) like lsblk."""
+    tree = _get_tree()
+    print(f"{'NAME':<24} {'SIZE':>8} {'TYPE':<6} {'MOUNTPOINT':<24} {'FSTYPE':<8} LABEL")
+
+    def print_device(device, prefix, branch):
+        print(f"{(prefix + branch + device.name):<24} {device.size_text:>8} {device.type:<6} "
+              f"{device.mountpoint:<24} {device.fstype:<8} {device.label}")
+        child_prefix = prefix + {"": "", "├─": "│ ", "└─": "  "}[branch]
+        for i, child in enumerate(device.children):
+            print_device(child, child_prefix, "└─" if i == len(device.children) - 1 else "├─")
+
+    if names is None:
+        names = [name for name, device in tree.items() if not device.parents]
+    for name in names:
+        if name in tree:
+            print_device(tree[name], "", "")
@@ -0,0 +1,285 @@
+import os
+import shutil
+import subprocess
+
+from core import parse_selection, run_command, select_option
+from storage import storage_batch, storage_inventory, storage_mkfs, storage_partition, storage_probe, storage_raid, storage_setup
+
+# Striping spreads every write over all PVs; with one PV per LUN that is
+# what gets a repository past the throughput of a single LUN.
+STRIPE_SIZES = ["64K", "128K", "256K", "512K", "1M"]
+DEFAULT_STRIPE_SIZE = "256K"
+# Thin pool chunks: backup files are written once in large blocks, so big
+# chunks keep the pool metadata small. Veeam blocks compress to about 512K.
+THIN_CHUNK_SIZES = ["256K", "512K", "1M", "2M"]
+DEFAULT_THIN_CHUNK = "512K"
+
+CACHE_MODES = {
+    "writecache": {"description": "dm-writecache: absorbs backup writes on the SSD, recommended", "type": "writecache", "args": []},
+    "writethrough": {"description": "dm-cache: caches reads (restores), writes go to both", "type": "cache", "args": ["--cachemode", "writethrough"]},
+    "writeback": {"description": "dm-cache: caches reads and writes, SSD loss loses data", "type": "cache", "args": ["--cachemode", "writeback"]},
+}
+
+LVS_FIELDS = "lv_name,vg_name,lv_size,segtype,stripes,stripe_size,chunk_size,pool_lv,data_percent,devices"
+
+
+def get_vgs():
+    """Returns the volume groups as [{name, pv_count, size, free}], sizes in bytes."""
+    result = run_command(["vgs", "--noheadings", "--units", "b", "--nosuffix", "--separator", ":",
+                          "-o", "vg_name,pv_count,vg_size,vg_free"], check=True)
+    vgs = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(":")
+        if len(fields) == 4:
+            vgs.append({"name": fields[0], "pv_count": int(fields[1]), "size": int(fields[2]), "free": int(fields[3])})
+    return vgs
+
+
+def get_lvs(vg_name):
+    """Returns the names of the visible logical volumes in a volume group."""
+    result = run_command(["lvs", "--noheadings", "-o", "lv_name", vg_name], check=True)
+    return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+
+def get_free_disks():
+    """Returns unused disks and LUNs: nothing mounted and no RAID, LVM or multipath on top."""
+    return [device_info for device_info in storage_batch.get_blank_candidates()
+            if not storage_probe.get_holders(device_info.name)]
+
+
+def is_rotational(name):
+    try:
+        with open(os.path.join(storage_probe.SYS_CLASS_BLOCK, name, "queue", "rotational"), "r") as f:
+            return f.read().strip() != "0"
+    except OSError:
+        return True
+
+
+def size_args(size_bytes):
+    """Returns the lvcreate size arguments: all free space for None."""
+    return ["-l", "100%FREE"] if size_bytes is None else ["-L", f"{size_bytes}b"]
+
+
+def build_striped_lv_command(vg_name, lv_name, stripes, stripe_size, size_bytes=None):
+    return ["lvcreate", "-y", "-n", lv_name, "-i", str(stripes), "-I", stripe_size.lower()] + size_args(size_bytes) + [vg_name]
+
+
+def build_thin_pool_command(vg_name, pool_name, chunk_size, size_bytes=None, stripes=1, stripe_size=DEFAULT_STRIPE_SIZE):
+    """Returns the lvcreate call for a thin pool.
+
+    --zero n skips zeroing newly provisioned chunks; backup files overwrite
+    them completely anyway.
+    """
+    command = ["lvcreate", "-y", "--type", "thin-pool", "-n", pool_name, "--chunksize", chunk_size.lower(), "--zero", "n"]
+    if stripes > 1:
+        command += ["-i", str(stripes), "-I", stripe_size.lower()]
+    return command + size_args(size_bytes) + [vg_name]
+
+
+def build_wipe_command(disk_path):
+    """pvcreate refuses a disk that still has a partition table, so the signatures go first."""
+    return ["wipefs", "-a", disk_path]
+
+
+def build_cache_commands(vg_name, lv_name, ssd_path, mode="writecache", size_bytes=None):
+    """Returns the calls that add an SSD to the VG and attach it to the LV as a cache volume."""
+    cache_name = f"{lv_name}_cache"
+    size = ["-l", "100%PVS"] if size_bytes is None else ["-L", f"{size_bytes}b"]
+    return [
+        build_wipe_command(ssd_path),
+        ["pvcreate", "-y", ssd_path],
+        ["vgextend", vg_name, ssd_path],
+        ["lvcreate", "-y", "-n", cache_name] + size + [vg_name, ssd_path],
+        ["lvconvert", "-y", "--type", CACHE_MODES[mode]["type"], "--cachevol", cache_name] + CACHE_MODES[mode]["args"] + [f"{vg_name}/{lv_name}"],
+    ]
+
+
+def print_layout(vg_name=None):
+    print("\nLogical volumes:")
+    run_command(["lvs", "-a", "--units", "g", "-o", LVS_FIELDS] + ([vg_name] if vg_name else []), capture=False)
+
+
+def _run_all(commands):
+    try:
+        for command in commands:
+            run_command(command, check=True)
+    finally:
+        storage_inventory.invalidate()
+
+
+def _select_disks(prompt, minimum=1):
+    candidates = get_free_disks()
+    if len(candidates) < minimum:
+        print(f"At least {minimum} unused disk(s) needed.")
+        return []
+    print("\nUnused disks and LUNs:")
+    for i, device_info in enumerate(candidates):
+        partitions = storage_inventory.get_partitions(device_info.name)
+        note = f" [{len(partitions)} partition(s) will be destroyed]" if partitions else ""
+        kind = "HDD" if is_rotational(device_info.name) else "SSD"
+        print(f"{i + 1}. {device_info.path} ({device_info.size_text}, {kind}){note}")
+    while True:
+        try:
+            indices = parse_selection(input(prompt), len(candidates))
+            if len(indices) >= minimum:
+                return [candidates[i].path for i in indices]
+            print(f"Select at least {minimum} disk(s).")
+        except ValueError:
+            print("Invalid input.")
+
+
+def _select_vg():
+    vgs = get_vgs()
+    if not vgs:
+        print("No volume groups found. Create one first.")
+        return None
+    print("\nVolume groups:")
+    for i, vg in enumerate(vgs):
+        print(f"{i + 1}. {vg['name']} ({vg['pv_count']} PV(s), {storage_probe.format_size(vg['free'])} free of {storage_probe.format_size(vg['size'])})")
+    while True:
+        choice = input(f"Select the volume group (1-{len(vgs)}): ").strip()
+        if choice.isdigit() and 1 <= int(choice) <= len(vgs):
+            return vgs[int(choice) - 1]
+        print("Invalid choice.")
+
+
+def _ask_size(prompt):
+    while True:
+        try:
+            return storage_partition.parse_size(input(prompt).strip() or "ALL")
+        except ValueError as e:
+            print(f"Invalid size: {e}.")
+
+
+def _offer_format(device_path, stripe):
+    if input(f"\nFormat {device_path} now? (yes/no) [yes]: ").lower().strip() not in ("", "yes", "y"):
+        return
+    fs_choice = input("Enter the filesystem to use (default: xfs): ").lower().strip() or "xfs"
+    if fs_choice not in ["xfs", "ext4", "ext3", "ext2"]:
+        print("Invalid filesystem choice. Using xfs instead.")
+        fs_choice = "xfs"
+    mkfs_profile, stripe = storage_mkfs.choose_mkfs_profile(device_path, fs_choice, stripe)
+    storage_setup.create_filesystem(device_path, fs_choice, capture=False, extra_args=storage_mkfs.mkfs_args(fs_choice, mkfs_profile, stripe, device_path))
+    print(f"Filesystem created successfully on {device_path}.")
+    storage_mkfs.report_verification(device_path, fs_choice, mkfs_profile, stripe)
+
+
+def create_vg():
+    disk_paths = _select_disks("\nSelect the disks or LUNs for the volume group (e.g., 1,3-5 or 'all'): ")
+    if not disk_paths:
+        return
+    vg_name = input("Enter the volume group name [repo_vg]: ").strip() or "repo_vg"
+    print(f"\nWARNING: ALL DATA ON THESE DISKS WILL BE ERASED: {', '.join(disk_paths)}")
+    if input("Are you sure you want to continue? (yes/no): ").lower().strip() != "yes":
+        print("Cancelled.")
+        return
+    _run_all([build_wipe_command(disk_path) for disk_path in disk_paths] + [["pvcreate", "-y"] + disk_paths, ["vgcreate", vg_name] + disk_paths])
+    print(f"Volume group {vg_name} created with {len(disk_paths)} PV(s).")
+
+
+def create_striped_lv():
+    vg = _select_vg()
+    if not vg:
+        return
+    stripes_input = input(f"Number of stripes (PVs to spread over) [{vg['pv_count']}]: ").strip()
+    stripes = int(stripes_input) if stripes_input.isdigit() and 1 <= int(stripes_input) <= vg["pv_count"] else vg["pv_count"]
+    stripe_size = storage_raid.ask_choice("Stripe sizes", {size: {"description": ""} for size in STRIPE_SIZES}, DEFAULT_STRIPE_SIZE)
+    size_bytes = _ask_size(f"Size (e.g., 10T, 500G, or 'ALL' for {storage_probe.format_size(vg['free'])}) [ALL]: ")
+    lv_name = input("Enter the logical volume name [repo]: ").strip() or "repo"
+    _run_all([build_striped_lv_command(vg["name"], lv_name, stripes, stripe_size, size_bytes)])
+    print(f"Logical volume /dev/{vg['name']}/{lv_name} created, striped over {stripes} PV(s) in {stripe_size} units.")
+    print_layout(vg["name"])
+    _offer_format(f"/dev/{vg['name']}/{lv_name}", (storage_raid.parse_chunk(stripe_size), stripes) if stripes > 1 else None)
+
+
+def create_thin_pool():
+    vg = _select_vg()
+    if not vg:
+        return
+    chunk_size = storage_raid.ask_choice("Thin pool chunk sizes", {size: {"description": ""} for size in THIN_CHUNK_SIZES}, DEFAULT_THIN_CHUNK)
+    size_bytes = _ask_size(f"Pool size (e.g., 10T, or 'ALL' for {storage_probe.format_size(vg['free'])}) [ALL]: ")
+    pool_name = input("Enter the thin pool name [repo_pool]: ").strip() or "repo_pool"
+    stripes = vg["pv_count"]
+    commands = [build_thin_pool_command(vg["name"], pool_name, chunk_size, size_bytes, stripes)]
+
+    lv_name = None
+    while True:
+        volume = input("Enter the virtual size of a thin volume to create in it (e.g., 20T), or press Enter to skip: ").strip()
+        try:
+            volume_bytes = storage_partition.parse_size(volume) if volume else None
+            break
+        except ValueError as e:
+            print(f"Invalid size: {e}.")
+    if volume_bytes:
+        lv_name = input("Enter the thin volume name [repo]: ").strip() or "repo"
+        commands.append(["lvcreate", "-y", "-n", lv_name, "-V", f"{volume_bytes}b", "--thinpool", pool_name, vg["name"]])
+    _run_all(commands)
+    print(f"Thin pool {vg['name']}/{pool_name} created with {chunk_size} chunks.")
+    print_layout(vg["name"])
+    if lv_name:
+        # One pool chunk is the unit the filesystem should allocate in.
+        _offer_format(f"/dev/{vg['name']}/{lv_name}", (storage_raid.parse_chunk(chunk_size), 1))
+
+
+def attach_cache():
+    vg = _select_vg()
+    if not vg:
+        return
+    lvs = get_lvs(vg["name"])
+    if not lvs:
+        print(f"No logical volumes in {vg['name']}.")
+        return
+    print("\nLogical volumes:")
+    for i, lv in enumerate(lvs):
+        print(f"{i + 1}. {lv}")
+    choice = input(f"Select the logical volume to cache (1-{len(lvs)}): ").strip()
+    if not (choice.isdigit() and 1 <= int(choice) <= len(lvs)):
+        print("Invalid choice.")
+        return
+    lv_name = lvs[int(choice) - 1]
+    ssd_paths = _select_disks("\nSelect the SSD for the cache: ")
+    if not ssd_paths:
+        return
+    if is_rotational(storage_probe.device_name(ssd_paths[0])):
+        print(f"Warning: {ssd_paths[0]} reports a rotational device.")
+    mode = storage_raid.ask_choice("Cache modes", CACHE_MODES, "writecache")
+    size_bytes = _ask_size("Cache size (e.g., 800G, or 'ALL' for the whole SSD) [ALL]: ")
+    if input(f"{ssd_paths[0]} will be added to {vg['name']} and erased. Continue? (yes/no): ").lower().strip() != "yes":
+        print("Cancelled.")
+        return
+    _run_all(build_cache_commands(vg["name"], lv_name, ssd_paths[0], mode, size_bytes))
+    print(f"{ssd_paths[0]} now caches {vg['name']}/{lv_name} ({mode}).")
+    print_layout(vg["name"])
+
+
+def setup_lvm():
+    """Creates volume groups, striped volumes, thin pools and SSD caches."""
+    if not shutil.which("lvcreate"):
+        print("Error: 'lvcreate' not found. Install the 'lvm2' package.")
+        input("Press Enter to continue...")
+        return
+
+    options = [
+        "Create Volume Group from Disks/LUNs",
+        "Create Striped Logical Volume",
+        "Create Thin Pool",
+        "Attach SSD Cache to a Logical Volume",
+        "Show LVM Layout",
+    ]
+    actions = [create_vg, create_striped_lv, create_thin_pool, attach_cache, print_layout]
+    while True:
+        choice = select_option(options, subtitle="LVM")
+        if choice == 0:
+            break
+        if not 1 <= choice <= len(actions):
+            print("Invalid choice. Try again.\n")
+            continue
+        try:
+            actions[choice - 1]()
+        except subprocess.CalledProcessError as e:
+            print(f"Error: {(e.stderr or '').strip() or e}")
+        except subprocess.SubprocessError as e:
+            print(f"An error occurred: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+        input("Press Enter to continue...")
@@ -1,5 +1,5 @@
-from core import clear_screen, display_menu, get_choice
-from storage import storage_setup
+from core import select_option
+from storage import storage_batch, storage_benchmark, storage_lvm, storage_queue, storage_raid, storage_setup
 
 
 def storage_menu():
@@ -10,13 +10,14 @@ def storage_menu():
         "Format Disk",
         "Partition Disk",
         "Setup RAID",
-        "Setup LVM"
+        "Setup LVM",
+        "Batch Format Disks (partition + mkfs, concurrently)",
+        "Benchmark Disk",
+        "Tune Block Queues (scheduler, read-ahead, request size)"
     ]
 
     while True:
-        clear_screen()
-        display_menu(options)
-        choice = get_choice(options)
+        choice = select_option(options)
 
         if choice == 0:
             break
@@ -29,8 +30,14 @@ def storage_menu():
         elif choice == 4:
             storage_setup.partition_disk()
         elif choice == 5:
-            storage_setup.setup_raid()
+            storage_raid.setup_raid()
         elif choice == 6:
-            storage_setup.setup_lvm()
+            storage_lvm.setup_lvm()
+        elif choice == 7:
+            storage_batch.batch_format()
+        elif choice == 8:
+            storage_benchmark.benchmark_disk()
+        elif choice == 9:
+            storage_queue.tune_block_queues()
         else:
             print("Invalid choice. Try again.\n")
\ No newline at end of file
@@ -0,0 +1,196 @@
+import os
+import re
+
+from core import run_command
+from storage import storage_probe
+
+# mkfs options per workload. The "veeam" XFS profile enables reflink (Fast
+# Clone needs it, and it needs crc), uses 4k blocks, aligns data and log to
+# the stripe of the array behind the device and sizes the log to the device.
+MKFS_PROFILES = {
+    "xfs": {
+        "default": {"description": "mkfs.xfs defaults", "args": [], "align": False},
+        "veeam": {"description": "Veeam Fast Clone: reflink=1, crc=1, 4k blocks, stripe aligned, log sized to the device",
+                  "args": ["-b", "size=4096", "-m", "reflink=1,crc=1"], "align": True, "log_size": True},
+    },
+    "ext4": {
+        "default": {"description": "mkfs.ext4 defaults", "args": [], "align": False},
+        "aligned": {"description": "stride/stripe_width matched to the array", "args": [], "align": True},
+    },
+}
+
+# XFS refuses a log stripe unit above 256 KiB.
+MAX_LOG_SU = 256 * 1024
+BLOCK_SIZE = 4096
+# Clones and block frees of synthetic fulls are metadata heavy, so the veeam
+# profile gives the log 1/1024 of the device: twice the mkfs.xfs default ratio.
+# Below 64 GiB that is no more than mkfs picks itself, and XFS caps the log
+# at 2038 MiB.
+LOG_SIZE_RATIO = 1024
+MIN_LOG_SIZE = 64 * 1024 * 1024
+MAX_LOG_SIZE = 2038 * 1024 * 1024
+
+
+def _read_int(path):
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def get_io_sizes(device_path):
+    """Returns (minimum_io_size, optimal_io_size) in bytes from the device's queue, or its disk's for a partition."""
+    name = storage_probe.device_name(device_path)
+    queue = os.path.join(storage_probe.SYS_CLASS_BLOCK, name, "queue")
+    if not os.path.isdir(queue):
+        queue = os.path.join(storage_probe.SYS_CLASS_BLOCK, storage_probe.get_parent_disk(name), "queue")
+    return _read_int(os.path.join(queue, "minimum_io_size")), _read_int(os.path.join(queue, "optimal_io_size"))
+
+
+def detect_stripe(device_path):
+    """Returns (stripe unit in bytes, stripe width in units) advertised by the device, or None.
+
+    RAID and most SAN LUNs report their chunk as minimum_io_size and the full
+    stripe as optimal_io_size. Plain disks leave optimal_io_size at 0.
+    """
+    min_io, opt_io = get_io_sizes(device_path)
+    if min_io >= BLOCK_SIZE and opt_io > min_io and opt_io % min_io == 0:
+        return min_io, opt_io // min_io
+    return None
+
+
+def parse_stripe(text):
+    """Turns '64k,4' (stripe unit, data disks) into (65536, 4). Raises ValueError."""
+    su_text, _, sw_text = text.replace(" ", "").lower().partition(",")
+    multiplier = {"k": 1024, "m": 1024 * 1024}.get(su_text[-1:], 1)
+    su = int(su_text.rstrip("km")) * multiplier
+    sw = int(sw_text)
+    if su < BLOCK_SIZE or su % BLOCK_SIZE or sw < 1:
+        raise ValueError(f"invalid stripe {text}: the unit must be a multiple of 4k and the width at least 1")
+    return su, sw
+
+
+def log_size(device_path, su=0):
+    """Returns the XFS log size in bytes for a device, or 0 to leave it to mkfs.xfs.
+
+    The size is a whole number of MiB and of log stripe units.
+    """
+    size = min(storage_probe.get_size(storage_probe.device_name(device_path)) // LOG_SIZE_RATIO, MAX_LOG_SIZE)
+    size -= size % (1024 * 1024)
+    if su:
+        size -= size % su
+    return size if size > MIN_LOG_SIZE else 0
+
+
+def mkfs_args(fs_type, profile="default", stripe=None, device_path=None):
+    """Returns the extra mkfs arguments for a profile and an optional (su bytes, sw) stripe.
+
+    The XFS log is only sized when the device to format is given.
+    """
+    settings = MKFS_PROFILES.get(fs_type, {}).get(profile, {"args": [], "align": False})
+    args = list(settings["args"])
+    aligned = settings["align"] and stripe
+    if fs_type == "xfs":
+        log_options = []
+        if aligned:
+            su, sw = stripe
+            args += ["-d", f"su={su // 1024}k,sw={sw}"]
+            if su <= MAX_LOG_SU:
+                log_options.append(f"su={su // 1024}k")
+        if settings.get("log_size") and device_path:
+            size = log_size(device_path, stripe[0] if log_options else 0)
+            if size:
+                log_options.append(f"size={size // (1024 * 1024)}m")
+        if log_options:
+            args += ["-l", ",".join(log_options)]
+    elif fs_type == "ext4" and aligned:
+        su, sw = stripe
+        stride = su // BLOCK_SIZE
+        args += ["-b", str(BLOCK_SIZE), "-E", f"stride={stride},stripe_width={stride * sw}"]
+    return args
+
+
+def parse_xfs_info(output):
+    """Extracts crc, reflink, block size and stripe (in bytes) from xfs_info output."""
+    info = {}
+    for key in ("crc", "reflink"):
+        match = re.search(rf"\b{key}=(\d+)", output)
+        info[key] = int(match.group(1)) if match else None
+    match = re.search(r"^data\s+=.*?bsize=(\d+)", output, re.MULTILINE)
+    info["bsize"] = int(match.group(1)) if match else BLOCK_SIZE
+    match = re.search(r"sunit=(\d+)\s+swidth=(\d+) blks", output)
+    sunit, swidth = (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+    info["su"] = sunit * info["bsize"]
+    info["sw"] = swidth // sunit if sunit else 0
+    return info
+
+
+def verify_filesystem(device_path, fs_type, profile="default", stripe=None):
+    """Checks a new filesystem against what its profile asked for. Returns the list of problems.
+
+    Only XFS is checked, with xfs_info.
+    """
+    if fs_type != "xfs":
+        return []
+    result = run_command(["xfs_info", device_path])
+    if result.returncode != 0:
+        return [f"xfs_info failed: {(result.stderr or '').strip() or result.returncode}"]
+    info = parse_xfs_info(result.stdout)
+    problems = []
+    if profile == "veeam":
+        for key in ("crc", "reflink"):
+            if info[key] != 1:
+                problems.append(f"{key} is {info[key]}, Fast Clone needs {key}=1")
+    if MKFS_PROFILES["xfs"].get(profile, {}).get("align") and stripe and (info["su"], info["sw"]) != tuple(stripe):
+        problems.append(f"stripe is su={info['su'] // 1024}k sw={info['sw']}, expected su={stripe[0] // 1024}k sw={stripe[1]}")
+    return problems
+
+
+def choose_mkfs_profile(device_path, fs_type, stripe=None):
+    """Asks for an mkfs profile and, if it aligns, the stripe. Returns (profile, stripe or None).
+
+    A known stripe (e.g. of an array just built) is offered instead of what the device reports.
+    """
+    profiles = MKFS_PROFILES.get(fs_type)
+    if not profiles:
+        return "default", None
+    names = list(profiles)
+    print(f"\nmkfs profiles for {fs_type}:")
+    for i, name in enumerate(names):
+        print(f"{i + 1}. {name} ({profiles[name]['description']})")
+    choice = input(f"Enter your choice (1-{len(names)}, default {names.index('veeam') + 1 if 'veeam' in names else 1}): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(names):
+        profile = names[int(choice) - 1]
+    else:
+        profile = "veeam" if "veeam" in names else "default"
+    if not profiles[profile]["align"]:
+        return profile, None
+
+    if stripe:
+        print(f"The array's stripe is su={stripe[0] // 1024}k sw={stripe[1]}.")
+    elif detect_stripe(device_path):
+        stripe = detect_stripe(device_path)
+        print(f"The device reports a stripe of su={stripe[0] // 1024}k sw={stripe[1]} (minimum/optimal I/O size).")
+    else:
+        print("The device reports no stripe geometry.")
+    while True:
+        text = input("Enter the array stripe as unit,data disks (e.g., 64k,4), or press Enter to "
+                     f"{'use the detected one' if stripe else 'skip alignment'}: ").strip()
+        if not text:
+            return profile, stripe
+        try:
+            return profile, parse_stripe(text)
+        except ValueError as e:
+            print(f"Invalid input: {e}")
+
+
+def report_verification(device_path, fs_type, profile, stripe):
+    problems = verify_filesystem(device_path, fs_type, profile, stripe)
+    if problems:
+        print(f"WARNING: {device_path} does not match the '{profile}' profile:")
+        for problem in problems:
+            print(f"  {problem}")
+    elif fs_type == "xfs":
+        print(f"xfs_info confirms the '{profile}' profile on {device_path}.")
+    return problems
@@ -0,0 +1,137 @@
+import os
+
+from core import run_command
+from storage import storage_probe
+
+SYSTEMD_UNIT_DIR = "/etc/systemd/system"
+
+# Filesystem options per workload. logbsize/logbufs give XFS bigger and more
+# in-memory log buffers, which helps metadata-heavy ingest; largeio reports
+# the stripe width as the preferred I/O size to applications.
+MOUNT_PROFILES = {
+    "xfs": {
+        "default": {"description": "distribution defaults", "options": "defaults"},
+        "backup-ingest": {"description": "large sequential writes", "options": "noatime,largeio,inode64,logbufs=8,logbsize=256k"},
+        "general": {"description": "mixed workloads", "options": "noatime,inode64"},
+    },
+    "ext4": {
+        "default": {"description": "distribution defaults", "options": "defaults"},
+        "backup-ingest": {"description": "large sequential writes, journal committed every 60s", "options": "noatime,commit=60,data=ordered"},
+        "throughput": {"description": "fastest, metadata-only journaling (data=writeback)", "options": "noatime,commit=60,data=writeback"},
+    },
+}
+for _fs_type in ("ext3", "ext2"):
+    MOUNT_PROFILES[_fs_type] = {
+        "default": {"description": "distribution defaults", "options": "defaults"},
+        "general": {"description": "no access time updates", "options": "noatime"},
+    }
+
+# Seconds boot waits for a network LUN before giving up on its mount.
+DEVICE_TIMEOUT = 30
+
+
+def get_mount_options(fs_type, profile="default"):
+    return MOUNT_PROFILES.get(fs_type, {}).get(profile, {}).get("options", "defaults")
+
+
+def choose_mount_profile(fs_type):
+    """Asks for one of the filesystem's mount profiles and returns its name."""
+    profiles = MOUNT_PROFILES.get(fs_type)
+    if not profiles:
+        return "default"
+    names = list(profiles)
+    print(f"\nMount profiles for {fs_type}:")
+    for i, name in enumerate(names):
+        print(f"{i + 1}. {name} ({profiles[name]['description']}): {profiles[name]['options']}")
+    choice = input(f"Enter your choice (1-{len(names)}, default 1): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(names):
+        return names[int(choice) - 1]
+    return "default"
+
+
+def persistent_options(options, network=False, device_timeout=DEVICE_TIMEOUT):
+    """Adds what a network device needs in fstab: wait for the network, never block boot for long."""
+    if not network:
+        return options
+    return f"{options},_netdev,nofail,x-systemd.device-timeout={device_timeout}s"
+
+
+def escape_path(path):
+    """Escapes a path the way `systemd-escape --path` does (/srv/veeam-1 -> srv-veeam\\x2d1)."""
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        return "-"
+    escaped = []
+    for char in "/".join(parts):
+        if char == "/":
+            escaped.append("-")
+        elif (char.isascii() and char.isalnum()) or (char in ":_." and not (char == "." and not escaped)):
+            escaped.append(char)
+        else:
+            escaped.extend(f"\\x{byte:02x}" for byte in char.encode())
+    return "".join(escaped)
+
+
+def mount_unit_name(mount_point):
+    return f"{escape_path(mount_point)}.mount"
+
+
+def build_mount_unit(uuid, mount_point, fs_type, options, network=False):
+    """Returns a .mount unit for a filesystem.
+
+    Network devices are ordered after the network and the iSCSI login
+    services (their names differ between distributions) and are only wanted
+    by remote-fs.target, so a missing LUN does not fail the boot.
+    """
+    lines = ["# Generated by Linux Repository Manager", "[Unit]", f"Description=Mount {mount_point}"]
+    if network:
+        lines += [
+            "Wants=network-online.target",
+            "After=network-online.target iscsid.service iscsi.service open-iscsi.service multipathd.service",
+        ]
+        options = f"{options},_netdev,nofail"
+    lines += [
+        "",
+        "[Mount]",
+        f"What=/dev/disk/by-uuid/{uuid}",
+        f"Where={mount_point}",
+        f"Type={fs_type}",
+        f"Options={options}",
+        f"TimeoutSec={DEVICE_TIMEOUT * 4}",
+        "",
+        "[Install]",
+        f"WantedBy={'remote-fs.target' if network else 'local-fs.target'}",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def build_device_timeout_dropin(device_timeout=DEVICE_TIMEOUT):
+    """Returns the drop-in that bounds how long systemd waits for the device, like x-systemd.device-timeout."""
+    return f"[Unit]\nJobTimeoutSec={device_timeout}\nJobRunningTimeoutSec={device_timeout}\n"
+
+
+def write_mount_unit(device_path, mount_point, options, network=False, uuid=None, fs_type=None, device_timeout=DEVICE_TIMEOUT):
+    """Writes and enables a .mount unit (plus the device timeout drop-in) and returns the unit name.
+
+    Raises ValueError if the device has no filesystem.
+    """
+    if not uuid or not fs_type:
+        probed_uuid, probed_type = storage_probe.get_filesystem(device_path)
+        uuid = uuid or probed_uuid
+        fs_type = fs_type or probed_type
+    if not uuid or not fs_type:
+        raise ValueError(f"Could not determine the UUID and filesystem type of {device_path}.")
+
+    unit = mount_unit_name(mount_point)
+    with open(os.path.join(SYSTEMD_UNIT_DIR, unit), "w") as f:
+        f.write(build_mount_unit(uuid, mount_point, fs_type, options, network))
+    device_unit = f"{escape_path(f'/dev/disk/by-uuid/{uuid}')}.device"
+    dropin_dir = os.path.join(SYSTEMD_UNIT_DIR, f"{device_unit}.d")
+    os.makedirs(dropin_dir, exist_ok=True)
+    with open(os.path.join(dropin_dir, "lrm-timeout.conf"), "w") as f:
+        f.write(build_device_timeout_dropin(device_timeout))
+
+    run_command(["systemctl", "daemon-reload"], check=True)
+    run_command(["systemctl", "enable", unit], check=True)
+    return unit
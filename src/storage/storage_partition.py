@@ -0,0 +1,162 @@
+import math
+import os
+
+from core import run_command
+from storage import storage_probe
+
+# Partitions start on a multiple of 1 MiB at least, like parted's "optimal"
+# alignment, so they also suit arrays that do not report their geometry.
+MIN_ALIGNMENT = 1024 * 1024
+# The GPT partition entry array: 128 entries of 128 bytes, at both ends of the disk.
+GPT_ENTRIES_SIZE = 128 * 128
+
+SIZE_UNITS = {"M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def _read_int(path):
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def get_topology(name):
+    """Returns the I/O topology of a disk in bytes: logical, physical, min_io, opt_io and offset.
+
+    offset is where the first naturally aligned byte lies (alignment_offset),
+    which is not 0 on disks that emulate 512-byte sectors with an odd offset.
+    """
+    disk_dir = os.path.join(storage_probe.SYS_CLASS_BLOCK, name)
+    queue = os.path.join(disk_dir, "queue")
+    offset_path = os.path.join(disk_dir, "alignment_offset")
+    if not os.path.exists(offset_path):
+        offset_path = os.path.join(queue, "alignment_offset")
+    return {
+        "logical": _read_int(os.path.join(queue, "logical_block_size")) or storage_probe.SECTOR_SIZE,
+        "physical": _read_int(os.path.join(queue, "physical_block_size")),
+        "min_io": _read_int(os.path.join(queue, "minimum_io_size")),
+        "opt_io": _read_int(os.path.join(queue, "optimal_io_size")),
+        "offset": _read_int(offset_path),
+    }
+
+
+def usable_opt_io(topology):
+    """Returns optimal_io_size, or 0 if it is not a plausible stripe width.
+
+    Like parted and libblkid, the value is only trusted when it is a multiple
+    of the minimum I/O (or physical) size and a power of two or whole MiBs.
+    Many SAN LUNs and USB bridges report 33553920 (0xFFFF sectors), which
+    would push the first partition out by gigabytes.
+    """
+    opt_io = topology["opt_io"]
+    unit = topology["min_io"] or topology["physical"] or topology["logical"]
+    if opt_io <= 0 or opt_io % unit:
+        return 0
+    if opt_io & (opt_io - 1) and opt_io % MIN_ALIGNMENT:
+        return 0
+    return opt_io
+
+
+def io_grain(topology):
+    """Returns the smallest unit a partition start must be a multiple of to avoid split I/O (bytes)."""
+    grain = topology["logical"]
+    for size in (topology["physical"], topology["min_io"], usable_opt_io(topology)):
+        if size:
+            grain = math.lcm(grain, size)
+    return grain
+
+
+def read_table(disk_path):
+    """Returns (label or None, size in logical sectors, [(number, start, end)]) from `parted -m unit s print`."""
+    result = run_command(["parted", "-m", "-s", disk_path, "unit", "s", "print"])
+    label, total, partitions = None, 0, []
+    for line in result.stdout.splitlines():
+        fields = line.rstrip(";").split(":")
+        if len(fields) >= 6 and fields[0] == disk_path:
+            total = int(fields[1].rstrip("s"))
+            label = fields[5] if fields[5] not in ("unknown", "") else None
+        elif len(fields) >= 3 and fields[0].isdigit():
+            partitions.append((int(fields[0]), int(fields[1].rstrip("s")), int(fields[2].rstrip("s"))))
+    return label, total, partitions
+
+
+def parse_size(text):
+    """Turns '10G', '500M' or '1.5T' into bytes, or None for 'ALL'. Raises ValueError."""
+    text = text.strip().upper()
+    if text == "ALL":
+        return None
+    if text[-1:] not in SIZE_UNITS:
+        raise ValueError("use an M, G or T suffix (e.g., 10G) or 'ALL'")
+    size = int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    if size <= 0:
+        raise ValueError("the size must be positive")
+    return size
+
+
+def plan_partition(topology, total_sectors, partitions, size_bytes=None):
+    """Returns the new partition as {number, start, end, size}, sectors being logical sectors.
+
+    It starts at the first aligned sector after the last partition and its
+    size is rounded up to whole alignment units, so the next one is aligned
+    too. size_bytes None takes the remaining space. Raises ValueError if it
+    does not fit.
+    """
+    logical = topology["logical"]
+    grain = math.lcm(io_grain(topology), MIN_ALIGNMENT) // logical
+    offset = topology["offset"] // logical
+    gpt_sectors = GPT_ENTRIES_SIZE // logical
+    first_free = max([end + 1 for _, _, end in partitions] + [2 + gpt_sectors])
+    last_usable = total_sectors - gpt_sectors - 2
+
+    start = first_free + (offset - first_free) % grain
+    if size_bytes is None:
+        end = start + (last_usable + 1 - start) // grain * grain - 1
+    else:
+        end = start + -(-size_bytes // logical // grain) * grain - 1
+    if end <= start or end > last_usable:
+        free = max(0, last_usable + 1 - start) * logical
+        raise ValueError(f"not enough free space after the last partition ({storage_probe.format_size(free)} free when aligned)")
+
+    used = {number for number, _, _ in partitions}
+    number = next(n for n in range(1, len(used) + 2) if n not in used)
+    return {"number": number, "start": start, "end": end, "size": (end - start + 1) * logical}
+
+
+def describe_plan(disk_path, topology, plan):
+    grain = math.lcm(io_grain(topology), MIN_ALIGNMENT)
+    print(f"\nTopology of {disk_path}: logical {topology['logical']}B, physical {topology['physical']}B, "
+          f"minimum I/O {topology['min_io']}B, optimal I/O {topology['opt_io']}B"
+          f"{'' if usable_opt_io(topology) or not topology['opt_io'] else ' (implausible, ignored)'}, alignment offset {topology['offset']}B")
+    print(f"Partition {plan['number']}: sectors {plan['start']}-{plan['end']} "
+          f"({storage_probe.format_size(plan['size'])}, aligned to {storage_probe.format_size(grain)})")
+
+
+def build_parted_command(disk_path, plan, new_label=False):
+    """Returns the single parted call that creates the planned partition (and the GPT label if asked)."""
+    # The plan is already aligned; "-a none" stops parted from moving it.
+    command = ["parted", "-s", "-a", "none", disk_path]
+    if new_label:
+        command += ["mklabel", "gpt"]
+    return command + ["unit", "s", "mkpart", "primary", f"{plan['start']}s", f"{plan['end']}s"]
+
+
+def get_partition_start(disk_path, number, topology):
+    """Returns where partition <number> starts, in bytes, or None if it is not there.
+
+    The kernel's view comes from sysfs. Partitions of multipath maps are dm
+    devices without a start, so for them the table is read back instead.
+    """
+    partition = storage_probe.get_partition(storage_probe.device_name(disk_path), number)
+    start_path = os.path.join(storage_probe.SYS_CLASS_BLOCK, partition, "start")
+    if partition and os.path.exists(start_path):
+        return _read_int(start_path) * storage_probe.SECTOR_SIZE
+    for partition_number, start, _ in read_table(disk_path)[2]:
+        if partition_number == number:
+            return start * topology["logical"]
+    return None
+
+
+def is_aligned(start, topology):
+    """Checks a partition start (bytes) against the disk's I/O grain."""
+    return start is not None and (start - topology["offset"]) % io_grain(topology) == 0
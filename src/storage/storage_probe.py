@@ -0,0 +1,335 @@
+import os
+import re
+import shutil
+
+from core import run_command
+
+# Everything here is answered from sysfs, the udev database and the /dev/disk
+# symlinks, so probing hundreds of paths costs file reads instead of forks and
+# keeps working on minimal images without udevadm, blkid or lsblk.
+SYS_BLOCK = "/sys/block"
+SYS_CLASS_BLOCK = "/sys/class/block"
+ISCSI_SESSION_CLASS = "/sys/class/iscsi_session"
+UDEV_DATA = "/run/udev/data"
+DISK_BY_UUID = "/dev/disk/by-uuid"
+
+SECTOR_SIZE = 512
+
+
+def _read(path, default=""):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+def device_name(device):
+    """Returns the kernel name for '/dev/sdb1', '/dev/mapper/mpatha' or 'sdb1'."""
+    if device.startswith("/"):
+        device = os.path.realpath(device)
+    return os.path.basename(device)
+
+
+def list_block_devices():
+    """Returns the kernel names of all top-level block devices (disks, dm, md...)."""
+    try:
+        return sorted(os.listdir(SYS_BLOCK))
+    except OSError:
+        return []
+
+
+def is_partition(name):
+    return os.path.exists(os.path.join(SYS_CLASS_BLOCK, name, "partition"))
+
+
+def get_parent_disk(name):
+    """Returns the disk a partition belongs to, or the name itself for a disk."""
+    if is_partition(name):
+        return os.path.basename(os.path.dirname(os.path.realpath(os.path.join(SYS_CLASS_BLOCK, name))))
+    return name
+
+
+def get_partitions(name):
+    """Returns the partitions of a disk, ordered by partition number."""
+    disk_dir = os.path.join(SYS_BLOCK, name)
+    try:
+        entries = os.listdir(disk_dir)
+    except OSError:
+        return []
+    partitions = [entry for entry in entries if os.path.exists(os.path.join(disk_dir, entry, "partition"))]
+    return sorted(partitions, key=lambda part: int(_read(os.path.join(disk_dir, part, "partition"), "0")))
+
+
+def get_dm_name(name):
+    """Returns the device-mapper name of a dm device (dm-3 -> 'mpatha'), or ''."""
+    return _read(os.path.join(SYS_CLASS_BLOCK, name, "dm", "name"))
+
+
+def device_path(name):
+    """Returns the path users know a device by: /dev/mapper/<name> for dm devices, else /dev/<name>."""
+    dm_name = get_dm_name(name)
+    if dm_name:
+        return os.path.join("/dev/mapper", dm_name)
+    return os.path.join("/dev", name)
+
+
+def get_partition(name, number):
+    """Returns the kernel name of partition <number> on a disk or multipath map, or "" if it does not exist (yet).
+
+    Partitions of a multipath map are dm devices of their own (kpartx), found
+    through the map's holders.
+    """
+    if get_dm_name(name):
+        for holder in get_holders(name):
+            if _read(os.path.join(SYS_CLASS_BLOCK, holder, "dm", "uuid")).startswith(f"part{number}-"):
+                return holder
+        return ""
+
+    for partition in get_partitions(name):
+        if _read(os.path.join(SYS_BLOCK, name, partition, "partition")) == str(number):
+            return partition
+    return ""
+
+
+def partition_path(disk_path, number):
+    """Returns the /dev path of partition <number> on a disk (sdb -> sdb1, nvme0n1 -> nvme0n1p1).
+
+    A multipath map's partitions follow its name: /dev/mapper/mpatha -> /dev/mapper/mpatha1.
+    Partitions that do not exist yet get the name the kernel will give them.
+    """
+    name = device_name(disk_path)
+    partition = get_partition(name, number)
+    if partition:
+        return device_path(partition)
+    dm_name = get_dm_name(name)
+    if dm_name:
+        return f"/dev/mapper/{dm_name}{number}"
+    separator = "p" if name[-1].isdigit() else ""
+    return f"/dev/{name}{separator}{number}"
+
+
+def get_holders(name):
+    """Returns the dm/md devices stacked on top of a device."""
+    try:
+        return sorted(os.listdir(os.path.join(SYS_CLASS_BLOCK, name, "holders")))
+    except OSError:
+        return []
+
+
+def get_slaves(name):
+    """Returns the devices a dm/md device is built from."""
+    try:
+        return sorted(os.listdir(os.path.join(SYS_CLASS_BLOCK, name, "slaves")))
+    except OSError:
+        return []
+
+
+def get_size(name):
+    """Returns the device size in bytes (sysfs always counts 512-byte sectors)."""
+    return int(_read(os.path.join(SYS_CLASS_BLOCK, name, "size"), "0")) * SECTOR_SIZE
+
+
+def get_devno(name):
+    """Returns the "major:minor" of a device."""
+    return _read(os.path.join(SYS_CLASS_BLOCK, name, "dev"))
+
+
+def get_device_type(name):
+    """Returns the lsblk-style TYPE: disk, part, mpath, lvm, crypt, raidN, loop, rom."""
+    if is_partition(name):
+        return "part"
+    if name.startswith("loop"):
+        return "loop"
+    if name.startswith("sr"):
+        return "rom"
+    dm_uuid = _read(os.path.join(SYS_CLASS_BLOCK, name, "dm", "uuid"))
+    if dm_uuid:
+        if re.match(r"part\d+-", dm_uuid):
+            return "part"
+        for prefix, dm_type in (("mpath-", "mpath"), ("LVM-", "lvm"), ("CRYPT-", "crypt")):
+            if dm_uuid.startswith(prefix):
+                return dm_type
+        return "dm"
+    md_level = _read(os.path.join(SYS_CLASS_BLOCK, name, "md", "level"))
+    if md_level:
+        return md_level
+    return "disk"
+
+
+def get_iscsi_session(name):
+    """Returns the iscsi_session (e.g. 'session3') a SCSI disk is reached through, or None."""
+    device_path = os.path.realpath(os.path.join(SYS_CLASS_BLOCK, get_parent_disk(name), "device"))
+    match = re.search(r"/(session\d+)/", device_path)
+    if match and os.path.isdir(os.path.join(ISCSI_SESSION_CLASS, match.group(1))):
+        return match.group(1)
+    return None
+
+
+def get_transport(name):
+    """Returns the transport of a device (iscsi, nvme, usb, sata, virtio) or ''.
+
+    Stacked devices (multipath maps and their partitions) report the
+    transport of the paths underneath.
+    """
+    slaves = get_slaves(name)
+    if slaves:
+        return get_transport(slaves[0])
+    if get_iscsi_session(name):
+        return "iscsi"
+    transport = get_udev_properties(name).get("ID_SCSI_TRANSPORT", "")
+    if transport:
+        return transport
+    device_path = os.path.realpath(os.path.join(SYS_CLASS_BLOCK, get_parent_disk(name), "device"))
+    for marker, transport in (("/nvme", "nvme"), ("/usb", "usb"), ("/ata", "sata"), ("/virtio", "virtio")):
+        if marker in device_path:
+            return transport
+    return ""
+
+
+def is_iscsi(device):
+    return get_transport(device_name(device)) == "iscsi"
+
+
+def get_udev_properties(name):
+    """Returns the E: properties udev recorded for a device in /run/udev/data."""
+    properties = {}
+    devno = get_devno(name)
+    if not devno:
+        return properties
+    try:
+        with open(os.path.join(UDEV_DATA, f"b{devno}"), "r") as f:
+            for line in f:
+                if line.startswith("E:") and "=" in line:
+                    key, value = line[2:].rstrip("\n").split("=", 1)
+                    properties[key] = value
+    except OSError:
+        pass
+    return properties
+
+
+def _uuid_from_by_uuid(name):
+    try:
+        for uuid in os.listdir(DISK_BY_UUID):
+            if device_name(os.path.join(DISK_BY_UUID, uuid)) == name:
+                return uuid
+    except OSError:
+        pass
+    return ""
+
+
+def _format_uuid(raw):
+    hex_uuid = raw.hex()
+    return f"{hex_uuid[0:8]}-{hex_uuid[8:12]}-{hex_uuid[12:16]}-{hex_uuid[16:20]}-{hex_uuid[20:32]}"
+
+
+def _read_superblock(name):
+    """Identifies XFS and ext2/3/4 (the filesystems this tool creates) by their superblock.
+
+    Used right after mkfs, before udev has caught up, and on hosts without udev.
+    """
+    try:
+        with open(os.path.join("/dev", name), "rb") as f:
+            header = f.read(2048)
+    except OSError:
+        return "", ""
+
+    if header[0:4] == b"XFSB":
+        return _format_uuid(header[32:48]), "xfs"
+
+    ext = header[1024:]
+    if len(ext) >= 0x78 and ext[0x38:0x3A] == b"\x53\xef":
+        compat = int.from_bytes(ext[0x5C:0x60], "little")
+        incompat = int.from_bytes(ext[0x60:0x64], "little")
+        ro_compat = int.from_bytes(ext[0x64:0x68], "little")
+        # extents, 64bit, flex_bg / huge_file, dir_nlink, extra_isize, metadata_csum
+        if incompat & 0x2C0 or ro_compat & 0x468:
+            fs_type = "ext4"
+        elif compat & 0x4:
+            fs_type = "ext3"
+        else:
+            fs_type = "ext2"
+        return _format_uuid(ext[0x68:0x78]), fs_type
+
+    return "", ""
+
+
+def get_filesystem(device):
+    """Returns (uuid, fstype) for a device; empty strings when it holds no filesystem.
+
+    The udev database is tried first, then the superblock itself. blkid is only
+    forked as a last resort for filesystems we cannot recognise, if it exists.
+    """
+    name = device_name(device)
+    properties = get_udev_properties(name)
+    uuid = properties.get("ID_FS_UUID", "")
+    fs_type = properties.get("ID_FS_TYPE", "")
+
+    if not uuid or not fs_type:
+        sb_uuid, sb_type = _read_superblock(name)
+        uuid = uuid or sb_uuid
+        fs_type = fs_type or sb_type
+
+    if not uuid:
+        uuid = _uuid_from_by_uuid(name)
+
+    if (not uuid or not fs_type) and shutil.which("blkid"):
+        result = run_command(["blkid", "-o", "export", os.path.join("/dev", name)])
+        for line in result.stdout.splitlines():
+            key, _, value = line.partition("=")
+            if key == "UUID" and not uuid:
+                uuid = value
+            elif key == "TYPE" and not fs_type:
+                fs_type = value
+
+    return uuid, fs_type
+
+
+def format_size(size_bytes):
+    """Formats a byte count the way lsblk does (e.g. 500M, 1.8T)."""
+    size = float(size_bytes)
+    for unit in ("B", "K", "M", "G", "T", "P"):
+        if size < 1024 or unit == "P":
+            break
+        size /= 1024
+    if unit == "B":
+        return f"{int(size)}B"
+    return f"{size:.1f}".rstrip("0").rstrip(".") + unit
+
+
+def probe_device(name):
+    """Returns an lsblk -J -b style row for one device, read entirely from sysfs and udev."""
+    properties = get_udev_properties(name)
+    return {
+        "name": name,
+        "kname": name,
+        "pkname": "",
+        "maj:min": get_devno(name),
+        "size": get_size(name),
+        "type": get_device_type(name),
+        "tran": get_transport(name) if not is_partition(name) else "",
+        "fstype": properties.get("ID_FS_TYPE", ""),
+        "uuid": properties.get("ID_FS_UUID", ""),
+        "label": properties.get("ID_FS_LABEL", ""),
+        "wwn": properties.get("ID_WWN_WITH_EXTENSION") or properties.get("ID_WWN", ""),
+        "serial": properties.get("ID_SERIAL_SHORT", ""),
+    }
+
+
+def list_device_rows():
+    """Walks /sys/block and returns one row per device and parent, like a flattened lsblk -J.
+
+    Stacked devices (dm, md) get one row per slave, with pkname set to it.
+    """
+    rows = []
+    for name in list_block_devices():
+        slaves = get_slaves(name)
+        for parent in slaves or [""]:
+            row = probe_device(name)
+            row["pkname"] = parent
+            rows.append(row)
+        for partition in get_partitions(name):
+            row = probe_device(partition)
+            row["pkname"] = name
+            rows.append(row)
+    return rows
@@ -0,0 +1,221 @@
+import os
+import subprocess
+
+from core import run_command
+from storage import storage_inventory, storage_probe, storage_raid
+
+# Runs after 60-persistent-storage.rules has imported ID_WWN and ID_SERIAL.
+UDEV_RULES_PATH = "/etc/udev/rules.d/99-lrm-block-queue.rules"
+
+# Written in this order: nr_requests is limited by the scheduler in use.
+QUEUE_ATTRIBUTES = ["scheduler", "read_ahead_kb", "nr_requests", "max_sectors_kb"]
+
+# read_ahead_kb keeps restores and synthetic fulls streaming; max_sectors_kb
+# lets the block layer send 1 MiB requests, which iSCSI and RAID handle far
+# better than the 512K default. Arrays reorder I/O themselves, so LUNs get "none".
+QUEUE_PROFILES = {
+    "backup-target": {"description": "local HDDs and RAID members: mq-deadline, 4 MiB read-ahead, 1 MiB requests",
+                      "settings": {"scheduler": "mq-deadline", "read_ahead_kb": 4096, "nr_requests": 256, "max_sectors_kb": 1024}},
+    "san-lun": {"description": "iSCSI/FC LUNs: no scheduler, 4 MiB read-ahead, 1 MiB requests",
+                "settings": {"scheduler": "none", "read_ahead_kb": 4096, "nr_requests": 256, "max_sectors_kb": 1024}},
+    "ssd": {"description": "SSD/NVMe cache devices: no scheduler, 128K read-ahead",
+            "settings": {"scheduler": "none", "read_ahead_kb": 128}},
+}
+
+RAID_TYPES = ("raid0", "raid1", "raid4", "raid5", "raid6", "raid10")
+
+
+def _queue_path(name, attribute):
+    return os.path.join(storage_probe.SYS_CLASS_BLOCK, name, "queue", attribute)
+
+
+def _read(path):
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def read_queue(name):
+    """Returns the current queue settings plus the available schedulers and max_hw_sectors_kb."""
+    values = {attribute: _read(_queue_path(name, attribute)) for attribute in QUEUE_ATTRIBUTES}
+    schedulers = values["scheduler"].split()
+    values["schedulers"] = [scheduler.strip("[]") for scheduler in schedulers]
+    values["scheduler"] = next((scheduler.strip("[]") for scheduler in schedulers if scheduler.startswith("[")), values["scheduler"])
+    values["max_hw_sectors_kb"] = _read(_queue_path(name, "max_hw_sectors_kb"))
+    return values
+
+
+def is_stacked(name):
+    """dm and md devices pass I/O to their members; only their read-ahead can be tuned."""
+    return bool(storage_probe.get_slaves(name))
+
+
+def resolve_settings(name, profile, current=None):
+    """Returns the profile's settings that apply to this device, within its limits."""
+    current = current or read_queue(name)
+    settings = dict(QUEUE_PROFILES[profile]["settings"])
+    if is_stacked(name):
+        return {"read_ahead_kb": settings["read_ahead_kb"]}
+    if settings.get("scheduler") and settings["scheduler"] not in current["schedulers"]:
+        del settings["scheduler"]
+    if "max_sectors_kb" in settings and current["max_hw_sectors_kb"].isdigit():
+        settings["max_sectors_kb"] = min(settings["max_sectors_kb"], int(current["max_hw_sectors_kb"]))
+    return settings
+
+
+def get_targets(name):
+    """Returns the devices a tuning of <name> touches: itself, the paths or members below a dm/md device,
+    and for a disk the other paths to the same LUN, which its udev rule matches by WWN or serial too.
+    """
+    targets = [name] + storage_probe.get_slaves(name)
+    device = storage_inventory.get_device(name)
+    if device and device.type == "disk":
+        peers = storage_inventory.find_by_wwn(device.wwn) if device.wwn else storage_inventory.find_by_serial(device.serial)
+        targets += [peer.name for peer in peers if peer.type == "disk" and peer.name not in targets]
+    return targets
+
+
+def apply_settings(name, settings):
+    """Writes the settings to sysfs. Returns the errors."""
+    errors = []
+    for attribute in QUEUE_ATTRIBUTES:
+        if attribute not in settings:
+            continue
+        try:
+            with open(_queue_path(name, attribute), "w") as f:
+                f.write(f"{settings[attribute]}\n")
+        except OSError as e:
+            errors.append(f"{name} {attribute}={settings[attribute]}: {e.strerror or e}")
+    return errors
+
+
+def get_udev_match(name):
+    """Returns a udev match that survives renames (sdb becoming sdc), or None.
+
+    dm and md devices match on their UUID, disks on their WWN or serial.
+    Array members carry the array's MD_UUID too, so it is only used for the
+    md device itself. Where the udev database is unavailable the dm uuid or
+    SCSI wwid attribute is used.
+    """
+    properties = storage_probe.get_udev_properties(name)
+    # Members carry MD_UUID at udev time too, so the kernel name keeps the rule on the array itself.
+    if name.startswith("md"):
+        return f'KERNEL=="md*", ENV{{MD_UUID}}=="{properties["MD_UUID"]}"' if properties.get("MD_UUID") else None
+    if name.startswith("dm-"):
+        uuid = properties.get("DM_UUID") or _read(os.path.join(storage_probe.SYS_CLASS_BLOCK, name, "dm", "uuid"))
+        return f'KERNEL=="dm-*", ENV{{DM_UUID}}=="{uuid}"' if uuid else None
+    for key in ("ID_WWN_WITH_EXTENSION", "ID_WWN", "ID_SERIAL"):
+        if properties.get(key):
+            return f'ENV{{{key}}}=="{properties[key]}"'
+    wwid = _read(os.path.join(storage_probe.SYS_CLASS_BLOCK, name, "device", "wwid"))
+    if wwid:
+        return f'ATTRS{{wwid}}=="{wwid}"'
+    return None
+
+
+def build_rule(match, settings):
+    assignments = ", ".join(f'ATTR{{queue/{attribute}}}="{settings[attribute]}"' for attribute in QUEUE_ATTRIBUTES if attribute in settings)
+    return f'ACTION=="add|change", SUBSYSTEM=="block", ENV{{DEVTYPE}}=="disk", {match}, {assignments}'
+
+
+def write_rules(rules):
+    """Adds or replaces rules in the generated rules file (one per match) and reloads udev."""
+    lines = []
+    try:
+        with open(UDEV_RULES_PATH, "r") as f:
+            lines = [line.rstrip("\n") for line in f if line.strip() and not line.startswith("#")]
+    except FileNotFoundError:
+        pass
+    # Compare on the identity alone, so rules written without the KERNEL== guard are replaced too.
+    lines = [line for line in lines if not any(match.split(", ")[-1] in line for match in rules)]
+    lines += list(rules.values())
+    os.makedirs(os.path.dirname(UDEV_RULES_PATH), exist_ok=True)
+    with open(UDEV_RULES_PATH, "w") as f:
+        f.write("# Generated by Linux Repository Manager: block queue settings\n" + "\n".join(lines) + "\n")
+    run_command(["udevadm", "control", "--reload"], check=True)
+
+
+def get_repository_devices():
+    """Returns the devices repositories live on: iSCSI LUNs, multipath maps and RAID arrays."""
+    devices = storage_inventory.collapse_multipath(storage_inventory.get_devices(types=("disk", "mpath") + RAID_TYPES))
+    return [device_info for device_info in devices
+            if device_info.type in ("mpath",) + RAID_TYPES or device_info.tran.lower() == "iscsi"]
+
+
+def print_queues(devices):
+    print(f"\n{'#':>3}  {'DEVICE':<24} {'SCHEDULER':<12} {'READ-AHEAD':>10} {'NR_REQ':>7} {'MAX_SECT':>9}")
+    for i, device_info in enumerate(devices):
+        values = read_queue(device_info.name)
+        print(f"{i + 1:>3}. {device_info.path:<24} {values['scheduler'] or '-':<12} "
+              f"{values['read_ahead_kb'] + 'K' if values['read_ahead_kb'] else '-':>10} {values['nr_requests'] or '-':>7} "
+              f"{values['max_sectors_kb'] + 'K' if values['max_sectors_kb'] else '-':>9}")
+
+
+def tune_block_queues():
+    """Shows the block queue settings and applies a profile to one or every repository device."""
+    print("\n--- Tune Block Queues ---")
+    try:
+        devices = storage_inventory.collapse_multipath(storage_inventory.get_devices(types=("disk", "mpath") + RAID_TYPES))
+        if not devices:
+            print("No disks found.")
+            input("Press Enter to continue...")
+            return
+        print_queues(devices)
+
+        choice = input("\nSelect a device, 'r' for every repository device (iSCSI LUNs, multipath maps, RAID arrays), or Enter to go back: ").strip().lower()
+        if choice == "r":
+            selected = get_repository_devices()
+        elif choice.isdigit() and 1 <= int(choice) <= len(devices):
+            selected = [devices[int(choice) - 1]]
+        else:
+            return
+        if not selected:
+            print("No repository devices found.")
+            input("Press Enter to continue...")
+            return
+
+        default = "san-lun" if any(d.tran.lower() == "iscsi" or d.type == "mpath" for d in selected) else "backup-target"
+        profile = storage_raid.ask_choice("Queue profiles", QUEUE_PROFILES, default)
+
+        plan = []
+        print("\nChanges:")
+        for device_info in selected:
+            for name in get_targets(device_info.name):
+                current = read_queue(name)
+                settings = resolve_settings(name, profile, current)
+                changes = ", ".join(f"{attribute} {current[attribute] or '?'} -> {settings[attribute]}" for attribute in QUEUE_ATTRIBUTES
+                                    if attribute in settings and str(settings[attribute]) != current[attribute])
+                print(f"  {storage_probe.device_path(name)}: {changes or 'already set'}")
+                plan.append((name, settings))
+        if input("Apply these settings now? (yes/no): ").lower().strip() != "yes":
+            print("Tuning cancelled.")
+            input("Press Enter to continue...")
+            return
+
+        errors = [error for name, settings in plan for error in apply_settings(name, settings)]
+        for error in errors:
+            print(f"Warning: could not set {error}")
+        print(f"Settings applied to {len(plan)} device(s).")
+
+        if input(f"Persist them as udev rules in {UDEV_RULES_PATH}? (yes/no) [yes]: ").lower().strip() in ("", "yes", "y"):
+            rules = {}
+            for name, settings in plan:
+                match = get_udev_match(name)
+                if match and match in rules and rules[match] != build_rule(match, settings):
+                    # Two devices behind one identity (paths of one LUN) with different settings.
+                    print(f"Warning: {storage_probe.device_path(name)} shares {match} with another device; its settings will not persist.")
+                elif match:
+                    rules[match] = build_rule(match, settings)
+                else:
+                    print(f"Warning: {storage_probe.device_path(name)} has no WWN, serial or UUID; its settings will not persist.")
+            if rules:
+                write_rules(rules)
+                print(f"{len(rules)} rule(s) written; udev applies them whenever the devices appear.")
+    except subprocess.SubprocessError as e:
+        print(f"An error occurred: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+    input("Press Enter to continue...")
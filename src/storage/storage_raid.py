@@ -0,0 +1,246 @@
+import os
+import shutil
+import subprocess
+import time
+
+from core import parse_selection, run_command, LONG_TIMEOUT
+from storage import storage_batch, storage_inventory, storage_mkfs, storage_probe, storage_setup
+
+# Debian keeps mdadm.conf in /etc/mdadm, the other distributions in /etc.
+MDADM_CONF_PATHS = ("/etc/mdadm/mdadm.conf", "/etc/mdadm.conf")
+
+# Levels offered for repositories, with the fewest members and the data
+# disks that hold one stripe for n members.
+RAID_LEVELS = {
+    "6": {"description": "two disk failures, best capacity for large arrays, recommended", "min_disks": 4, "data_disks": lambda n: n - 2},
+    "10": {"description": "fastest writes and rebuilds, half the capacity", "min_disks": 4, "data_disks": lambda n: n // 2},
+    "5": {"description": "one disk failure, small arrays only", "min_disks": 3, "data_disks": lambda n: n - 1},
+    "1": {"description": "mirror of two disks", "min_disks": 2, "data_disks": lambda n: 1},
+    "0": {"description": "no redundancy, scratch space only", "min_disks": 2, "data_disks": lambda n: n},
+}
+# Backup files are written in large sequential blocks, so big chunks keep
+# each write on few disks while a full stripe stays a few MiB at most.
+CHUNK_SIZES = ["128K", "256K", "512K", "1M"]
+DEFAULT_CHUNK = "256K"
+
+# Pages (4 KiB) per member the RAID5/6 stripe cache may hold. 8192 lets full
+# stripes be assembled in memory instead of read back for parity.
+STRIPE_CACHE_SIZE = 8192
+# KiB/s per member: "fast" keeps the initial sync going under load.
+SYNC_SPEEDS = {
+    "fast": {"description": "finish the sync first, even under backup load", "min": 100000, "max": 2000000},
+    "background": {"description": "kernel defaults, backups have priority", "min": "system", "max": "system"},
+}
+# A write-intent bitmap makes a resync after a crash only touch dirty
+# regions. Large bitmap chunks cost sequential writes almost nothing.
+BITMAPS = {
+    "internal-large": {"description": "internal bitmap, 128M chunks, recommended", "args": ["--bitmap=internal", "--bitmap-chunk=128M"]},
+    "internal": {"description": "internal bitmap, mdadm's default chunk", "args": ["--bitmap=internal"]},
+    "none": {"description": "no bitmap, full resync after a crash", "args": ["--bitmap=none"]},
+}
+
+PROGRESS_INTERVAL = 2.0
+
+
+def parse_chunk(chunk):
+    """Turns '256K' or '1M' into bytes."""
+    return int(chunk[:-1]) * (1024 * 1024 if chunk.endswith("M") else 1024)
+
+
+def get_stripe(level, disk_count, chunk):
+    """Returns the (stripe unit bytes, data disks) mkfs should align to, or None for a mirror."""
+    if level == "1":
+        return None
+    return parse_chunk(chunk), RAID_LEVELS[level]["data_disks"](disk_count)
+
+
+def build_create_command(name, level, disk_paths, chunk=DEFAULT_CHUNK, bitmap="internal-large"):
+    command = ["mdadm", "--create", f"/dev/md/{name}", "--run", "--metadata=1.2", f"--name={name}",
+               f"--level={level}", f"--raid-devices={len(disk_paths)}"]
+    if level != "1":
+        command.append(f"--chunk={parse_chunk(chunk) // 1024}")
+    # RAID0 has no redundancy to resync, so it takes no bitmap.
+    if level != "0":
+        command += BITMAPS[bitmap]["args"]
+    return command + list(disk_paths)
+
+
+def get_md_name(name):
+    """Returns the kernel name (md127) of /dev/md/<name>."""
+    return storage_probe.device_name(f"/dev/md/{name}")
+
+
+def _md_path(md_name, attribute):
+    return os.path.join(storage_probe.SYS_CLASS_BLOCK, md_name, "md", attribute)
+
+
+def set_md_attribute(md_name, attribute, value):
+    """Writes /sys/block/<md>/md/<attribute>. Returns an error message or None."""
+    try:
+        with open(_md_path(md_name, attribute), "w") as f:
+            f.write(f"{value}\n")
+        return None
+    except OSError as e:
+        return f"{attribute}={value}: {e.strerror or e}"
+
+
+def tune_array(md_name, level, sync_speed="fast", stripe_cache_size=STRIPE_CACHE_SIZE):
+    """Applies the stripe cache (RAID5/6) and resync speed limits. Returns the errors."""
+    settings = [("sync_speed_min", SYNC_SPEEDS[sync_speed]["min"]), ("sync_speed_max", SYNC_SPEEDS[sync_speed]["max"])]
+    if level in ("5", "6"):
+        settings.insert(0, ("stripe_cache_size", stripe_cache_size))
+    errors = [set_md_attribute(md_name, attribute, value) for attribute, value in settings]
+    return [error for error in errors if error]
+
+
+def get_mdadm_conf_path():
+    if os.path.isdir(os.path.dirname(MDADM_CONF_PATHS[0])):
+        return MDADM_CONF_PATHS[0]
+    return MDADM_CONF_PATHS[1]
+
+
+def write_mdadm_conf(name):
+    """Adds the array's ARRAY line to mdadm.conf unless its UUID is already listed. Returns the path."""
+    array_line = run_command(["mdadm", "--detail", "--brief", f"/dev/md/{name}"], check=True).stdout.strip()
+    conf_path = get_mdadm_conf_path()
+    try:
+        with open(conf_path, "r") as f:
+            existing = f.read()
+    except FileNotFoundError:
+        existing = ""
+    uuid = next((field for field in array_line.split() if field.startswith("UUID=")), array_line)
+    if uuid not in existing:
+        with open(conf_path, "a") as f:
+            f.write(f"{array_line}\n")
+    return conf_path
+
+
+def read_sync_progress(md_name):
+    """Returns (action, fraction done or None, KiB/s, KiB left) of a resync, recovery or check."""
+    def read(attribute):
+        try:
+            with open(_md_path(md_name, attribute), "r") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    action = read("sync_action") or "idle"
+    done, _, total = read("sync_completed").partition(" / ")
+    if not (done.isdigit() and total.isdigit() and int(total)):
+        return action, None, 0, 0
+    speed = read("sync_speed")
+    # sync_completed counts 512-byte sectors per member.
+    return action, int(done) / int(total), int(speed) if speed.isdigit() else 0, (int(total) - int(done)) // 2
+
+
+def show_sync_progress(md_name, interval=PROGRESS_INTERVAL):
+    """Prints the resync progress until it finishes or Ctrl+C is pressed."""
+    action = "resync"
+    try:
+        while True:
+            action, fraction, speed, remaining_kib = read_sync_progress(md_name)
+            if fraction is None:
+                print(f"\r{md_name}: {action}, nothing to synchronize.{' ' * 20}")
+                return
+            eta = f", about {remaining_kib // speed // 60} min left" if speed else ""
+            print(f"\r{md_name}: {action} {fraction * 100:5.1f}% at {speed / 1024:.0f} MiB/s{eta} (Ctrl+C to stop watching)", end="", flush=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print(f"\nThe {action} continues in the background; /proc/mdstat shows its progress.")
+
+
+def ask_choice(title, choices, default):
+    """Prints {name: {description}} as a numbered list and returns the chosen name (default on Enter)."""
+    names = list(choices)
+    print(f"\n{title}:")
+    for i, name in enumerate(names):
+        description = choices[name]["description"]
+        print(f"{i + 1}. {name}{f' ({description})' if description else ''}")
+    choice = input(f"Enter your choice (1-{len(names)}, default {names.index(default) + 1}): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(names):
+        return names[int(choice) - 1]
+    return default
+
+
+def setup_raid():
+    """Builds an mdadm array from unused disks, tunes it and optionally formats it aligned to its stripe."""
+    print("\n--- Setup RAID ---")
+    if not shutil.which("mdadm"):
+        print("Error: 'mdadm' not found. Install the 'mdadm' package.")
+        input("Press Enter to continue...")
+        return
+
+    try:
+        candidates = [device_info for device_info in storage_batch.get_blank_candidates()
+                      if not storage_probe.get_holders(device_info.name)]
+        if len(candidates) < 2:
+            print("At least two unused disks are needed.")
+            input("Press Enter to continue...")
+            return
+
+        print("\nUnused disks:")
+        for i, device_info in enumerate(candidates):
+            partitions = storage_inventory.get_partitions(device_info.name)
+            note = f" [{len(partitions)} partition(s) will be destroyed]" if partitions else ""
+            print(f"{i + 1}. {device_info.path} ({device_info.size_text}){note}")
+        while True:
+            try:
+                indices = parse_selection(input("\nSelect the member disks (e.g., 1,3-5 or 'all'): "), len(candidates))
+                if len(indices) >= 2:
+                    break
+                print("Select at least two disks.")
+            except ValueError:
+                print("Invalid input.")
+        disk_paths = [candidates[i].path for i in indices]
+
+        levels = {level: info for level, info in RAID_LEVELS.items() if len(disk_paths) >= info["min_disks"]}
+        level = ask_choice("RAID levels", levels, "6" if "6" in levels else next(iter(levels)))
+        chunk = DEFAULT_CHUNK if level == "1" else ask_choice("Chunk sizes", {size: {"description": ""} for size in CHUNK_SIZES}, DEFAULT_CHUNK)
+        bitmap = "none" if level == "0" else ask_choice("Write-intent bitmap", BITMAPS, "internal-large")
+        sync_speed = ask_choice("Initial sync speed", SYNC_SPEEDS, "fast")
+
+        name = input("Enter the array name [repo]: ").strip() or "repo"
+        stripe = get_stripe(level, len(disk_paths), chunk)
+        print(f"\nRAID{level} '{name}' over {len(disk_paths)} disk(s)" +
+              (f", chunk {chunk}, full stripe {storage_probe.format_size(stripe[0] * stripe[1])} ({stripe[1]} data disks)" if stripe else ""))
+        if level in ("5", "6"):
+            print(f"The stripe cache will use up to {storage_probe.format_size(STRIPE_CACHE_SIZE * 4096 * len(disk_paths))} of memory.")
+        print("WARNING: ALL DATA ON THESE DISKS WILL BE ERASED:")
+        for disk_path in disk_paths:
+            print(f"  {disk_path}")
+        if input("Are you sure you want to continue? (yes/no): ").lower().strip() != "yes":
+            print("RAID setup cancelled.")
+            input("Press Enter to continue...")
+            return
+
+        print(f"Creating /dev/md/{name}...")
+        try:
+            run_command(build_create_command(name, level, disk_paths, chunk, bitmap), timeout=LONG_TIMEOUT, check=True)
+        finally:
+            storage_inventory.invalidate()
+        md_name = get_md_name(name)
+        for error in tune_array(md_name, level, sync_speed):
+            print(f"Warning: could not set {error}")
+        print(f"Array recorded in {write_mdadm_conf(name)}. Rebuild the initramfs (update-initramfs -u or dracut -f) to assemble it at boot.")
+
+        if input(f"\nFormat /dev/md/{name} now? (yes/no) [yes]: ").lower().strip() in ("", "yes", "y"):
+            fs_choice = input("Enter the filesystem to use (default: xfs): ").lower().strip() or "xfs"
+            if fs_choice not in ["xfs", "ext4", "ext3", "ext2"]:
+                print("Invalid filesystem choice. Using xfs instead.")
+                fs_choice = "xfs"
+            mkfs_profile, stripe = storage_mkfs.choose_mkfs_profile(f"/dev/md/{name}", fs_choice, stripe)
+            # The array is still empty, so mkfs need not wait for the sync.
+            storage_setup.create_filesystem(f"/dev/md/{name}", fs_choice, capture=False, extra_args=storage_mkfs.mkfs_args(fs_choice, mkfs_profile, stripe, f"/dev/md/{name}"))
+            print(f"Filesystem created successfully on /dev/md/{name}.")
+            storage_mkfs.report_verification(f"/dev/md/{name}", fs_choice, mkfs_profile, stripe)
+
+        print()
+        show_sync_progress(md_name)
+    except subprocess.CalledProcessError as e:
+        print(f"Error: {(e.stderr or '').strip() or e}")
+    except subprocess.SubprocessError as e:
+        print(f"An error occurred: {e}")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+    input("Press Enter to continue...")
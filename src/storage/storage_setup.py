@@ -1,16 +1,20 @@
 import subprocess
 import os
-import shlex
 import time
 
+from core import run_command, DEFAULT_TIMEOUT, LONG_TIMEOUT
+from storage import storage_inventory, storage_mkfs, storage_mount, storage_partition, storage_probe, storage_wait
+
+FSTAB_PATH = "/etc/fstab"
+
 
 def list_disks():
     print("\n--- Listing Local Disks ---")
     try:
-        subprocess.run(["lsblk", "-o", "NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,LABEL"], check=True)
+        storage_inventory.print_tree()
     except FileNotFoundError:
         print("Error: 'lsblk' command not found. This feature requires 'util-linux' package.")
-    except subprocess.CalledProcessError as e:
+    except subprocess.SubprocessError as e:
         print(f"Error listing disks: {e}")
     input("\nPress Enter to continue...")
 
@@ -18,20 +22,12 @@ def list_disks():
 def mount_disk():
     print("\n--- Mount Disk ---")
     try:
-        lsblk_output = subprocess.run(
-            ["lsblk", "-P", "-o", "NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,UUID"],
-            capture_output=True, text=True, check=True
-        ).stdout
-
         available_devices = []
         print("\nAvailable disks and partitions:")
-        for line in lsblk_output.strip().splitlines():
-            device_info = {k: v.strip('"') for k, v in (pair.split('=', 1) for pair in shlex.split(line))}
-
-            if device_info.get("TYPE") in ("part", "disk"):
-                mountpoint_display = f" (Mounted at: {device_info.get('MOUNTPOINT')})" if device_info.get('MOUNTPOINT') else ""
-                available_devices.append(device_info)
-                print(f"{len(available_devices)}. /dev/{device_info.get('NAME')} ({device_info.get('SIZE')}){mountpoint_display}")
+        for device_info in storage_inventory.collapse_multipath(storage_inventory.get_devices(types=("part", "disk", "mpath"))):
+            mountpoint_display = f" (Mounted at: {device_info.mountpoint})" if device_info.mountpoint else ""
+            available_devices.append(device_info)
+            print(f"{len(available_devices)}. {device_info.path} ({device_info.size_text}){mountpoint_display}")
 
         if not available_devices:
             print("No unmounted disks or partitions found.")
@@ -49,19 +45,18 @@ def mount_disk():
             except ValueError:
                 print("Invalid input. Please enter a number.")
 
-        device_path = f"/dev/{selected_device_info.get('NAME')}"
-        fs_type = selected_device_info.get('FSTYPE', '')
-        uuid = selected_device_info.get('UUID', '')
+        device_path = selected_device_info.path
+        fs_type = selected_device_info.fstype
+        uuid = selected_device_info.uuid
 
         try:
-            findmnt_result = subprocess.run(["findmnt", "-n", device_path], capture_output=True, text=True)
-            if findmnt_result.returncode == 0:
-                current_mount_point = findmnt_result.stdout.split()[0]
+            current_mount_point = storage_inventory.get_device(selected_device_info.name).mountpoint
+            if current_mount_point:
                 print(f"Device {device_path} is already mounted at {current_mount_point}.")
                 unmount_choice = input(f"Do you want to unmount it to proceed? (yes/no) [no]: ").strip().lower()
                 if unmount_choice in ['yes', 'y']:
                     print(f"Unmounting {device_path}...")
-                    subprocess.run(["umount", "-l", device_path], check=True)
+                    run_command(["umount", "-l", device_path], capture=False, check=True)
                     print(f"{device_path} unmounted successfully.")
                 else:
                     print("Mounting cancelled as device is already mounted.")
@@ -79,36 +74,15 @@ def mount_disk():
             else:
                 break
         
-        os.makedirs(mount_point, exist_ok=True)
-        print(f"Mount point '{mount_point}' ensured.")
-
-        print(f"Mounting {device_path} to {mount_point}...")
-        subprocess.run(["mount", device_path, mount_point], check=True)
+        if not fs_type or not uuid:
+            uuid, fs_type = storage_probe.get_filesystem(device_path)
+        options = storage_mount.get_mount_options(fs_type, storage_mount.choose_mount_profile(fs_type))
+        mount_device(device_path, mount_point, options)
         print("Disk mounted successfully.")
 
-        fstab_choice = input("Do you want to add this mount to /etc/fstab for persistence? (yes/no) [yes]: ").strip().lower()
-        if fstab_choice in ['', 'yes', 'y']:
-            print("Adding entry to /etc/fstab...")
-            
-            if not uuid:
-                blkid_uuid_result = subprocess.run(["blkid", "-s", "UUID", "-o", "value", device_path], capture_output=True, text=True, check=True)
-                uuid = blkid_uuid_result.stdout.strip()
-            
-            if not fs_type:
-                blkid_type_result = subprocess.run(["blkid", "-s", "TYPE", "-o", "value", device_path], capture_output=True, text=True, check=True)
-                fs_type = blkid_type_result.stdout.strip()
-
-            fstab_entry = f"UUID={uuid} {mount_point} {fs_type} defaults 0 0\n"
-            print(f"The following line will be added to /etc/fstab:\n{fstab_entry}")
-            confirm_fstab = input("Confirm? (yes/no) [yes]: ").strip().lower()
-            if confirm_fstab in ['', 'yes', 'y']:
-                with open("/etc/fstab", "a") as f:
-                    f.write(fstab_entry)
-                print("Entry added to /etc/fstab.")
-            else:
-                print("Adding to /etc/fstab cancelled.")
+        persist_mount(device_path, mount_point, options, network=storage_probe.is_iscsi(device_path), uuid=uuid, fs_type=fs_type)
 
-    except (subprocess.CalledProcessError, ValueError, IndexError) as e:
+    except (subprocess.SubprocessError, ValueError, IndexError) as e:
         print(f"An error occurred: {e}")
     input("Press Enter to continue...")
 
@@ -117,19 +91,12 @@ def format_disk():
     """Formats a local disk or partition, similar to how format_iscsi_disk works."""
     print("\n--- Format Disk ---")
     try:
-        lsblk_output = subprocess.run(
-            ["lsblk", "-P", "-o", "NAME,SIZE,TYPE,MOUNTPOINT"],
-            capture_output=True, text=True, check=True
-        ).stdout
-
         available_devices = []
         print("\nAvailable disks and partitions:")
-        for line in lsblk_output.strip().splitlines():
-            device_info = {k: v.strip('"') for k, v in (pair.split('=', 1) for pair in shlex.split(line))}
-            if device_info.get("TYPE") in ("part", "disk"):
-                mountpoint_display = f" (Mounted at: {device_info.get('MOUNTPOINT')})" if device_info.get('MOUNTPOINT') else ""
-                available_devices.append(device_info)
-                print(f"{len(available_devices)}. /dev/{device_info.get('NAME')} ({device_info.get('SIZE')}){mountpoint_display}")
+        for device_info in storage_inventory.collapse_multipath(storage_inventory.get_devices(types=("part", "disk", "mpath"))):
+            mountpoint_display = f" (Mounted at: {device_info.mountpoint})" if device_info.mountpoint else ""
+            available_devices.append(device_info)
+            print(f"{len(available_devices)}. {device_info.path} ({device_info.size_text}){mountpoint_display}")
 
         if not available_devices:
             print("No disks or partitions found.")
@@ -147,9 +114,9 @@ def format_disk():
             except ValueError:
                 print("Invalid input. Please enter a number.")
 
-        device_path = f"/dev/{selected_device_info.get('NAME')}"
-        device_type = selected_device_info.get('TYPE')
-        mount_point = selected_device_info.get('MOUNTPOINT')
+        device_path = selected_device_info.path
+        device_type = selected_device_info.type
+        mount_point = selected_device_info.mountpoint
 
         print("\nAvailable filesystems: xfs, ext4, ext3, ext2")
         fs_choice = input("Enter the filesystem to use (default: xfs): ").lower().strip()
@@ -160,10 +127,12 @@ def format_disk():
             print("Invalid filesystem choice. Using xfs instead.")
             fs_choice = "xfs"
 
+        mkfs_profile, stripe = storage_mkfs.choose_mkfs_profile(device_path, fs_choice)
+
         print(f"\nWARNING: Formatting {device_path} will erase all data on it.")
         if mount_point:
             print(f"WARNING: {device_path} is currently mounted at {mount_point}. It will be unmounted.")
-        if device_type == "disk":
+        if device_type in ("disk", "mpath"):
             print(f"WARNING: A new partition ({device_path}1) will be created and formatted as {fs_choice}.")
         
         confirmation = input("Are you sure you want to continue? (yes/no): ").lower().strip()
@@ -171,30 +140,20 @@ def format_disk():
         if confirmation == "yes":
             if mount_point:
                 print(f"Unmounting {device_path}...")
-                subprocess.run(["umount", "-l", device_path], check=True)
+                run_command(["umount", "-l", device_path], capture=False, check=True)
                 print(f"{device_path} unmounted successfully.")
 
             path_to_format = device_path
 
-            if device_type == "disk":
-                print(f"Partitioning {path_to_format}...")
-                partition_command = ["parted", "-s", path_to_format, "mklabel", "gpt"]
-                subprocess.run(partition_command, check=True)
-                print(f"Creating partition on {path_to_format}...")
-                create_partition_command = ["parted", "-s", path_to_format, "mkpart", "primary", "0%", "100%"]
-                subprocess.run(create_partition_command, check=True)
-                path_to_format += "1"
-                print("Waiting for partition to be created...")
-                subprocess.run(["partprobe"], check=True, capture_output=True)
-                time.sleep(2)
-
-            print(f"Creating filesystem on {path_to_format}...")
-            mkfs_command = [f"mkfs.{fs_choice}", path_to_format]
-            subprocess.run(mkfs_command, check=True)
+            if device_type in ("disk", "mpath"):
+                path_to_format = partition_whole_disk(device_path)
+
+            create_filesystem(path_to_format, fs_choice, capture=False, extra_args=storage_mkfs.mkfs_args(fs_choice, mkfs_profile, stripe, path_to_format))
             print(f"Filesystem created successfully on {path_to_format}.")
+            storage_mkfs.report_verification(path_to_format, fs_choice, mkfs_profile, stripe)
         else:
             print("Formatting cancelled.")
-    except subprocess.CalledProcessError as e:
+    except subprocess.SubprocessError as e:
         print(f"An error occurred during disk formatting: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
@@ -203,18 +162,11 @@ def format_disk():
 def partition_disk():
     print("\n--- Partition Disk ---")
     try:
-        lsblk_output = subprocess.run(
-            ["lsblk", "-P", "-o", "NAME,SIZE,TYPE"],
-            capture_output=True, text=True, check=True
-        ).stdout
-
         available_disks = []
         print("\nAvailable disks for partitioning:")
-        for line in lsblk_output.strip().splitlines():
-            device_info = {k: v.strip('"') for k, v in (pair.split('=', 1) for pair in shlex.split(line))}
-            if device_info.get("TYPE") == "disk":
-                available_disks.append(device_info)
-                print(f"{len(available_disks)}. /dev/{device_info.get('NAME')} ({device_info.get('SIZE')})")
+        for device_info in storage_inventory.collapse_multipath(storage_inventory.get_devices(types=("disk", "mpath"))):
+            available_disks.append(device_info)
+            print(f"{len(available_disks)}. {device_info.path} ({device_info.size_text})")
 
         if not available_disks:
             print("No disks found for partitioning.")
@@ -232,78 +184,62 @@ def partition_disk():
             except ValueError:
                 print("Invalid input. Please enter a number.")
 
-        disk_path = f"/dev/{selected_disk_info.get('NAME')}"
+        disk_path = selected_disk_info.path
+        topology = storage_partition.get_topology(selected_disk_info.name)
+        label, total_sectors, existing_partitions = storage_partition.read_table(disk_path)
+        total_sectors = total_sectors or storage_probe.get_size(selected_disk_info.name) // topology["logical"]
+        new_label = label != "gpt"
 
-        parted_output = subprocess.run(
-            ["parted", "-s", disk_path, "print"],
-            capture_output=True, text=True, check=False
-        ).stdout
-
-        existing_partitions = []
-        for line in parted_output.splitlines():
-            if line.strip().startswith(tuple(str(i) for i in range(1, 10))):
-                existing_partitions.append(line)
-        
         if existing_partitions:
             print(f"\nWARNING: The disk {disk_path} already has existing partitions:")
-            for part in existing_partitions:
-                print(f"  {part}")
+            for number, start, end in existing_partitions:
+                print(f"  {number}: sectors {start}-{end} ({storage_probe.format_size((end - start + 1) * topology['logical'])})")
+            if new_label:
+                print(f"The {label} partition table will be replaced by GPT and these partitions will be lost.")
             confirm_continue = input("Continuing will modify the partition table. Are you sure you want to proceed? (yes/no): ").lower().strip()
             if confirm_continue != 'yes':
                 print("Partitioning cancelled.")
                 input("Press Enter to continue...")
                 return
-
-        last_partition_num = 0
-        for line in existing_partitions:
-            try:
-                num = int(line.strip().split()[0])
-                if num > last_partition_num:
-                    last_partition_num = num
-            except ValueError:
-                pass
-
-        new_partition_number = last_partition_num + 1
-        new_partition_name = f"{disk_path}{new_partition_number}"
-        print(f"A new partition will be created as {new_partition_name}.")
+        if new_label:
+            existing_partitions = []
 
         while True:
             size_input = input("Enter the size of the new partition (e.g., 10G, 500M, or 'ALL' for remaining space): ").strip().upper()
-            if size_input == "ALL":
-                start_sector = "0%"
-                end_sector = "100%"
+            try:
+                plan = storage_partition.plan_partition(topology, total_sectors, existing_partitions, storage_partition.parse_size(size_input))
                 break
-            elif size_input and (size_input.endswith('G') or size_input.endswith('M') or size_input.endswith('T')):
-                try:
-                    float(size_input[:-1])
-                    start_sector = "0%"
-                    end_sector = f"0%+{size_input}" 
-                    break
-                except ValueError:
-                    print("Invalid size format. Please use G, M, or T suffix (e.g., 10G) or 'ALL'.")
-            else:
-                print("Invalid size format. Please use G, M, or T suffix (e.g., 10G) or 'ALL'.")
+            except ValueError as e:
+                print(f"Invalid size: {e}.")
+
+        new_partition_name = storage_probe.partition_path(disk_path, plan["number"])
+        storage_partition.describe_plan(disk_path, topology, plan)
+        if input(f"Create {new_partition_name} as planned? (yes/no): ").lower().strip() != "yes":
+            print("Partitioning cancelled.")
+            input("Press Enter to continue...")
+            return
 
         print(f"Creating partition on {disk_path}...")
         try:
-            if "Partition Table: gpt" not in parted_output:
-                print(f"Creating GPT partition table on {disk_path}...")
-                subprocess.run(["parted", "-s", disk_path, "mklabel", "gpt"], check=True)
-                
-            create_partition_cmd = ["parted", "-s", disk_path, "mkpart", "primary", start_sector, end_sector]
-            subprocess.run(create_partition_cmd, check=True)
+            started = time.time()
+            run_command(storage_partition.build_parted_command(disk_path, plan, new_label), check=True)
+            run_command(["partprobe", disk_path], check=True)
+            new_partition_name = storage_wait.wait_for_partition(disk_path, plan["number"], since=started)
             print(f"Partition {new_partition_name} created successfully.")
-            subprocess.run(["partprobe"], check=True, capture_output=True)
-            time.sleep(2)
+            if storage_partition.is_aligned(storage_partition.get_partition_start(disk_path, plan["number"], topology), topology):
+                print(f"{new_partition_name} is aligned to the device's I/O size.")
+            else:
+                print(f"WARNING: {new_partition_name} is not aligned to the device's I/O size; writes will be split across stripes.")
+            storage_inventory.invalidate()
             print("New partition table:")
-            subprocess.run(["lsblk", disk_path], check=True)
+            storage_inventory.print_tree([selected_disk_info.name])
 
-        except subprocess.CalledProcessError as e:
+        except subprocess.SubprocessError as e:
             print(f"Error creating partition: {e.stderr}")
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
 
-    except subprocess.CalledProcessError as e:
+    except subprocess.SubprocessError as e:
         print(f"An error occurred: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
@@ -311,13 +247,114 @@ def partition_disk():
     input("Press Enter to continue...")
 
 
-def setup_raid():
-    """Sets up a software RAID array."""
-    print("Setup RAID functionality is coming soon!")
-    input("Press Enter to continue...")
+def _run_logged(command, output, timeout=DEFAULT_TIMEOUT):
+    """Runs a command with its output on the terminal or, when output is a list, appended to it.
+
+    Concurrent batch workers pass a list per disk so their output does not interleave.
+    """
+    if output is None:
+        return run_command(command, timeout=timeout, capture=False, check=True)
+    result = run_command(command, timeout=timeout)
+    output += [line for line in (result.stdout or "").splitlines() + (result.stderr or "").splitlines() if line.strip()]
+    result.check_returncode()
+    return result
+
+
+def partition_whole_disk(disk_path, wait_timeout=storage_wait.PARTITION_WAIT_TIMEOUT, output=None):
+    """Writes a new GPT label with one partition spanning the disk and returns the partition path.
+
+    Returns as soon as the partition node and its udev links exist; raises
+    TimeoutError if that takes longer than wait_timeout seconds. With an
+    output list, messages and parted's output go there instead of the terminal.
+    """
+    log = print if output is None else output.append
+    log(f"Partitioning {disk_path}...")
+    started = time.time()
+    _run_logged(["parted", "-s", disk_path, "mklabel", "gpt"], output)
+    log(f"Creating partition on {disk_path}...")
+    _run_logged(["parted", "-s", disk_path, "mkpart", "primary", "0%", "100%"], output)
+    log("Waiting for partition to be created...")
+    run_command(["partprobe", disk_path], check=True)
+    try:
+        return storage_wait.wait_for_partition(disk_path, 1, timeout=wait_timeout, since=started)
+    finally:
+        storage_inventory.invalidate()
 
 
-def setup_lvm():
-    """Sets up Logical Volume Management (LVM)."""
-    print("Setup LVM functionality is coming soon!")
-    input("Press Enter to continue...")
+def create_filesystem(device_path, fs_type, force=False, capture=True, extra_args=(), output=None):
+    """Runs mkfs on a device. Raises CalledProcessError (with stderr when captured) on failure.
+
+    extra_args come from storage_mkfs.mkfs_args(). With an output list, the
+    messages and mkfs's output are appended to it instead.
+    """
+    mkfs_command = [f"mkfs.{fs_type}"]
+    if force:
+        mkfs_command.append("-f" if fs_type == "xfs" else "-F")
+    mkfs_command += list(extra_args)
+    mkfs_command.append(device_path)
+
+    try:
+        if output is not None:
+            output.append(f"Creating filesystem on {device_path}...")
+            _run_logged(mkfs_command, output, timeout=LONG_TIMEOUT)
+        else:
+            print(f"Creating filesystem on {device_path}...")
+            run_command(mkfs_command, timeout=LONG_TIMEOUT, capture=capture, check=True)
+    finally:
+        storage_inventory.invalidate()
+
+
+def mount_device(device_path, mount_point, options="defaults"):
+    """Creates the mount point if needed and mounts the device on it."""
+    os.makedirs(mount_point, exist_ok=True)
+    print(f"Mounting {device_path} to {mount_point}...")
+    command = ["mount", device_path, mount_point]
+    if options != "defaults":
+        command[1:1] = ["-o", options]
+    run_command(command, capture=False, check=True)
+
+
+def persist_mount(device_path, mount_point, options, network=False, uuid=None, fs_type=None):
+    """Asks whether to keep a mount across reboots through /etc/fstab or a systemd unit, and writes it."""
+    print("\nPersist this mount across reboots:")
+    print("1. /etc/fstab entry (default)")
+    print("2. systemd .mount unit")
+    print("3. Do not persist")
+    choice = input("Enter your choice (1-3, default 1): ").strip()
+    if choice == "3":
+        return
+
+    if choice == "2":
+        unit = storage_mount.mount_unit_name(mount_point)
+        print(f"{unit} will be written to {storage_mount.SYSTEMD_UNIT_DIR} and enabled"
+              f"{f', waiting at most {storage_mount.DEVICE_TIMEOUT}s for the device at boot' if network else ''}.")
+        if input("Confirm? (yes/no) [yes]: ").strip().lower() in ['', 'yes', 'y']:
+            storage_mount.write_mount_unit(device_path, mount_point, options, network, uuid, fs_type)
+            print(f"{unit} enabled.")
+        else:
+            print("Creating the mount unit cancelled.")
+        return
+
+    fstab_entry = build_fstab_entry(device_path, mount_point, storage_mount.persistent_options(options, network), uuid=uuid, fs_type=fs_type)
+    print(f"The following line will be added to /etc/fstab:\n{fstab_entry}")
+    if input("Confirm? (yes/no) [yes]: ").strip().lower() in ['', 'yes', 'y']:
+        add_fstab_entry(fstab_entry)
+        print("Entry added to /etc/fstab.")
+    else:
+        print("Adding to /etc/fstab cancelled.")
+
+
+def build_fstab_entry(device_path, mount_point, options="defaults", uuid=None, fs_type=None):
+    """Returns the UUID-based fstab line for a device. Raises ValueError if it has no filesystem."""
+    if not uuid or not fs_type:
+        probed_uuid, probed_type = storage_probe.get_filesystem(device_path)
+        uuid = uuid or probed_uuid
+        fs_type = fs_type or probed_type
+    if not uuid or not fs_type:
+        raise ValueError(f"Could not determine the UUID and filesystem type of {device_path}.")
+    return f"UUID={uuid} {mount_point} {fs_type} {options} 0 0\n"
+
+
+def add_fstab_entry(fstab_entry):
+    with open(FSTAB_PATH, "a") as f:
+        f.write(fstab_entry)
@@ -0,0 +1,113 @@
+import os
+import select
+import socket
+import time
+
+from storage import storage_probe
+
+# Longest wait for a new partition to show up. Slow SANs re-reading a
+# partition table over a busy link can need well over the old fixed 2 seconds.
+PARTITION_WAIT_TIMEOUT = 30.0
+# Longest wait for a LUN's node and links after an iSCSI login.
+DEVICE_WAIT_TIMEOUT = 30.0
+
+NETLINK_KOBJECT_UEVENT = 15
+# Multicast groups: 1 = raw kernel uevents, 2 = events udev has finished processing.
+UEVENT_GROUPS = 1 | 2
+
+# Without the netlink socket the sysfs checks back off from 10 ms to this.
+MAX_POLL_INTERVAL = 0.5
+
+
+def _open_uevent_socket():
+    """Subscribes to block device uevents, or returns None where netlink is unavailable."""
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+    except (AttributeError, OSError):
+        return None
+    try:
+        sock.bind((0, UEVENT_GROUPS))
+        sock.setblocking(False)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def _drain(sock):
+    try:
+        while sock.recv(65536):
+            pass
+    except OSError:
+        pass
+
+
+def _partition_ready(name, number, since):
+    """Returns the partition's /dev path once the kernel and udev both know it, else None.
+
+    udev writes its database entry after running the rules, so the entry
+    means the /dev/disk/by-* symlinks exist. An entry older than `since`
+    belongs to the partition the new table replaced. Systems without udev
+    only need the kernel's side.
+    """
+    partition = storage_probe.get_partition(name, number)
+    if not partition:
+        return None
+    if os.path.isdir(storage_probe.UDEV_DATA):
+        entry = os.path.join(storage_probe.UDEV_DATA, f"b{storage_probe.get_devno(partition)}")
+        try:
+            if since is not None and os.stat(entry).st_mtime < since:
+                return None
+        except OSError:
+            return None
+    return storage_probe.device_path(partition)
+
+
+def _wait(check, timeout, describe):
+    """Calls check() on every uevent (or poll) until it returns a value, and returns that.
+
+    Raises TimeoutError with describe() after `timeout` seconds.
+    """
+    # Subscribe before the first check so an event between the two is not lost.
+    sock = _open_uevent_socket()
+    start = time.monotonic()
+    delay = 0.01
+    try:
+        while True:
+            value = check()
+            if value:
+                return value
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                raise TimeoutError(f"{describe()} did not appear within {timeout:g}s")
+            if sock:
+                if select.select([sock], [], [], min(delay, remaining))[0]:
+                    _drain(sock)
+            else:
+                time.sleep(min(delay, remaining))
+            delay = min(delay * 2, MAX_POLL_INTERVAL)
+    finally:
+        if sock:
+            sock.close()
+
+
+def wait_for_partition(disk_path, number, timeout=PARTITION_WAIT_TIMEOUT, since=None):
+    """Waits until partition <number> of a disk exists and returns its /dev path.
+
+    Wakes up on every uevent from the kernel or udev and re-checks sysfs; where
+    the netlink socket cannot be opened it polls with backoff. `since` is the
+    time.time() before the partition table was written. Raises TimeoutError
+    after `timeout` seconds.
+    """
+    name = storage_probe.device_name(disk_path)
+    return _wait(lambda: _partition_ready(name, number, since), timeout,
+                 lambda: storage_probe.partition_path(disk_path, number))
+
+
+def wait_for_device(device_path, timeout=DEVICE_WAIT_TIMEOUT):
+    """Waits until a device node or /dev/disk/by-* link exists and returns the node it resolves to.
+
+    After an iSCSI login the SCSI scan and udev create both asynchronously.
+    Raises TimeoutError after `timeout` seconds.
+    """
+    return _wait(lambda: os.path.exists(device_path) and os.path.realpath(device_path), timeout, lambda: device_path)
@@ -0,0 +1,194 @@
+import atexit
+import builtins
+import contextlib
+import os
+import sys
+import threading
+import time
+
+# Frames from these modules are plumbing; the caller recorded for a command is
+# the first frame outside them (e.g. storage.storage_setup.partition_whole_disk).
+_PLUMBING_MODULES = ("core", "tracing", "asyncio", "threading", "concurrent", "contextlib", "builtins", "apply.apply_graph")
+
+_lock = threading.Lock()
+_file = None
+_path = None
+_started = None
+_commands = []
+_prompts = []
+# The apply_graph task the current thread is running, if any.
+_context = threading.local()
+
+
+def active():
+    return _file is not None
+
+
+def _is_plumbing(module):
+    return module in _PLUMBING_MODULES or module.split(".")[0] in _PLUMBING_MODULES
+
+
+def _caller():
+    """Returns the (module, function) a command or prompt is attributed to.
+
+    A worker thread's stack can end in plumbing only; its target function
+    or, for run_graph workers, the task it runs is used instead.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not _is_plumbing(module):
+            return module, frame.f_code.co_name
+        frame = frame.f_back
+    target = getattr(threading.current_thread(), "_target", None)
+    if target is not None and not _is_plumbing(getattr(target, "__module__", None) or "core"):
+        return target.__module__, target.__qualname__
+    if getattr(_context, "task", None):
+        return "task", _context.task
+    return "", ""
+
+
+@contextlib.contextmanager
+def task(name):
+    """Marks the commands run by the current thread as belonging to an apply_graph task."""
+    previous = getattr(_context, "task", None)
+    _context.task = name
+    try:
+        yield
+    finally:
+        _context.task = previous
+
+
+def _write(record):
+    import json
+    with _lock:
+        if _file is None:
+            return
+        _file.write(json.dumps(record) + "\n")
+        _file.flush()
+
+
+def record_command(args, start, end, returncode, output_bytes=None, timed_out=False, error=None):
+    """Appends one external command to the trace. start/end are time.time() values."""
+    if _file is None:
+        return
+    module, function = _caller()
+    record = {
+        "type": "command",
+        "argv": [str(arg) for arg in args],
+        "module": module,
+        "function": function,
+        "start": round(start, 6),
+        "end": round(end, 6),
+        "duration": round(end - start, 6),
+        "returncode": returncode,
+        "output_bytes": output_bytes,
+        "timed_out": timed_out,
+        "thread": threading.current_thread().name,
+    }
+    if getattr(_context, "task", None):
+        record["task"] = _context.task
+    if error:
+        record["error"] = error
+    with _lock:
+        _commands.append(record)
+    _write(record)
+
+
+@contextlib.contextmanager
+def waiting(prompt):
+    """Records the time spent in the block as waiting for the operator."""
+    if _file is None:
+        yield
+        return
+    module, function = _caller()
+    start = time.time()
+    try:
+        yield
+    finally:
+        end = time.time()
+        record = {
+            "type": "prompt",
+            "prompt": str(prompt).strip(),
+            "module": module,
+            "function": function,
+            "start": round(start, 6),
+            "end": round(end, 6),
+            "duration": round(end - start, 6),
+        }
+        with _lock:
+            _prompts.append(record)
+        _write(record)
+
+
+def _traced_input(original):
+    def traced_input(prompt=""):
+        with waiting(prompt):
+            return original(prompt)
+    return traced_input
+
+
+def start(path):
+    """Starts writing one JSON line per external command and prompt to path.
+
+    Prompts are recorded by wrapping input() (menus record their key loop
+    themselves), so the time spent waiting for the operator can be told
+    apart from time spent in commands. A summary of
+    the slowest commands is printed to stderr at exit.
+    """
+    global _file, _path, _started
+    if _file is not None:
+        return
+    _file = open(path, "w")
+    _path = path
+    _started = time.time()
+    builtins.input = _traced_input(builtins.input)
+    atexit.register(stop)
+
+
+def summarize(limit=10):
+    """Returns the summary lines: totals, then the top commands and callers by time."""
+    with _lock:
+        commands = list(_commands)
+        prompts = list(_prompts)
+
+    total = time.time() - _started if _started else 0.0
+    command_time = sum(record["duration"] for record in commands)
+    prompt_time = sum(record["duration"] for record in prompts)
+    lines = [
+        f"Trace written to {_path}",
+        f"  Wall time {total:.2f}s, {len(commands)} commands took {command_time:.2f}s, "
+        f"{len(prompts)} prompts waited {prompt_time:.2f}s",
+    ]
+    if not commands:
+        return lines
+
+    by_program = {}
+    by_caller = {}
+    for record in commands:
+        program = os.path.basename(record["argv"][0]) if record["argv"] else "?"
+        if len(record["argv"]) > 1 and not record["argv"][1].startswith("-"):
+            program += " " + record["argv"][1]
+        caller = f"{record['module']}.{record['function']}" if record["module"] else f"thread {record['thread']}"
+        for totals, key in ((by_program, program), (by_caller, caller)):
+            count, seconds = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, seconds + record["duration"])
+
+    for title, totals in (("Top commands", by_program), ("Top callers", by_caller)):
+        lines.append(f"  {title}:")
+        ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        for key, (count, seconds) in ranked:
+            lines.append(f"    {seconds:8.2f}s  {count:4d}x  {key}")
+    return lines
+
+
+def stop():
+    """Closes the trace file and prints the summary."""
+    global _file
+    if _file is None:
+        return
+    for line in summarize():
+        print(line, file=sys.stderr)
+    with _lock:
+        _file.close()
+        _file = None
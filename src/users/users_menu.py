@@ -1,4 +1,4 @@
-from core import clear_screen, display_menu, get_choice
+from core import select_option
 from users import users_setup
 
 
@@ -13,9 +13,7 @@ def users_menu():
     ]
 
     while True:
-        clear_screen()
-        display_menu(options)
-        choice = get_choice(options)
+        choice = select_option(options)
 
         if choice == 0:
             break
@@ -5,6 +5,8 @@ import string
 import os
 import pwd
 
+from core import run_command
+
 
 def _generate_password(length=16):
     """Generates a random 16-character password with letters, digits, and . - ! symbols."""
@@ -47,10 +49,46 @@ def _setup_ssh_key(username):
 
 def _get_sudo_group():
     """Determines the correct sudo group ('wheel' or 'sudo')."""
-    if shutil.which("grep") and subprocess.run(["grep", "-q", "^wheel:", "/etc/group"], capture_output=True).returncode == 0:
+    if shutil.which("grep") and run_command(["grep", "-q", "^wheel:", "/etc/group"]).returncode == 0:
         return "wheel"
     return "sudo"
 
+def add_user(username, shell):
+    run_command(["useradd", "-m", "-s", shell, username], capture=False, check=True)
+
+def set_password(username, password):
+    run_command(
+        ["chpasswd"],
+        input=f"{username}:{password}",
+        check=True
+    )
+
+def grant_sudo(username):
+    """Adds the user to the sudo group and returns the group name."""
+    sudo_group = _get_sudo_group()
+    run_command(["usermod", "-aG", sudo_group, username], capture=False, check=True)
+    return sudo_group
+
+def create_user(username, shell="/bin/bash", public_key=None, with_password=True, sudo=False):
+    """Creates a user non-interactively and returns the generated password (or None).
+
+    Raises CalledProcessError if any step fails, or an Exception if the SSH
+    key cannot be written.
+    """
+    add_user(username, shell)
+    print(f"User '{username}' created successfully with shell {shell}.")
+    if public_key and not _write_ssh_key(username, public_key):
+        raise Exception("Failed to write SSH key.")
+
+    password = None
+    if with_password:
+        password = _generate_password()
+        set_password(username, password)
+    if sudo:
+        sudo_group = grant_sudo(username)
+        print(f"User '{username}' added to {sudo_group} group.")
+    return password
+
 def setup_user():
     username = input("Enter the username for the new user: ").strip()
     if not username:
@@ -68,7 +106,7 @@ def setup_user():
         shell = "/sbin/nologin"
 
     try:
-        subprocess.run(["useradd", "-m", "-s", shell, username], check=True)
+        add_user(username, shell)
         print(f"User '{username}' created successfully with shell {shell}.")
 
         ssh_choice = input(f"Do you want to add an SSH public key for this user? (yes/no) [no]: ").strip().lower()
@@ -83,21 +121,15 @@ def setup_user():
             print("\nWARNING: SAVE THIS PASSWORD IN A SECURE PLACE! \n\nIT WILL NOT BE DISPLAYED AGAIN!\n")
 
             print(f"Setting password for user '{username}'...")
-            subprocess.run(
-                ["chpasswd"],
-                input=f"{username}:{password}".encode('utf-8'),
-                check=True,
-                capture_output=True
-            )
+            set_password(username, password)
 
             sudo_choice = input(f"Do you want to add user '{username}' to sudoers? (yes/no) [no]: ").strip().lower()
             if sudo_choice in ['yes', 'y']:
-                sudo_group = _get_sudo_group()
                 try:
-                    subprocess.run(["usermod", "-aG", sudo_group, username], check=True)
+                    sudo_group = grant_sudo(username)
                     print(f"User '{username}' added to {sudo_group} group.")
                 except subprocess.CalledProcessError as e:
-                    print(f"Error adding user '{username}' to {sudo_group} group: {e}")
+                    print(f"Error adding user '{username}' to sudoers: {e}")
         else:
             print("Password setup skipped.")
 
@@ -124,7 +156,7 @@ def setup_veeam_user():
         pass
 
     try:
-        subprocess.run(["useradd", "-m", "-s", shell, username], check=True)
+        add_user(username, shell)
         print(f"User '{username}' created successfully.")
 
         ssh_choice = input(f"Do you want to add an SSH public key for '{username}'? (yes/no) [no]: ").strip().lower()
@@ -132,12 +164,7 @@ def setup_veeam_user():
             _setup_ssh_key(username)
 
         password = _generate_password()
-        subprocess.run(
-            ["chpasswd"],
-            input=f"{username}:{password}".encode('utf-8'),
-            check=True,
-            capture_output=True
-        )
+        set_password(username, password)
         print("\n" + "="*50)
         print(f"IMPORTANT: PASSWORD FOR '{username}'")
         print("="*50)
@@ -148,8 +175,7 @@ def setup_veeam_user():
 
         sudo_choice = input(f"Do you want to add user '{username}' to sudoers? (yes/no) [yes]: ").strip().lower()
         if sudo_choice in ['', 'yes', 'y']:
-            sudo_group = _get_sudo_group()
-            subprocess.run(["usermod", "-aG", sudo_group, username], check=True)
+            sudo_group = grant_sudo(username)
             print(f"User '{username}' added to '{sudo_group}' group.")
 
     except subprocess.CalledProcessError as e:
@@ -191,13 +217,45 @@ def setup_ansible_user():
         input("Press Enter to continue...")
         return
 
+    try:
+        create_ansible_user(public_key)
+    except Exception:
+        pass
+
+    input("Press Enter to continue...")
+
+
+def create_veeam_user(public_key=None, sudo=True):
+    """Creates the 'veeamsvc' user non-interactively and returns its generated password."""
+    username = "veeamsvc"
+    try:
+        pwd.getpwnam(username)
+        raise ValueError(f"User '{username}' already exists.")
+    except KeyError:
+        pass
+    return create_user(username, "/bin/bash", public_key=public_key, with_password=True, sudo=sudo)
+
+
+def create_ansible_user(public_key):
+    """Creates the passwordless-sudo 'ansible' user, rolling back on failure.
+
+    Re-raises the original error after the rollback.
+    """
+    username = "ansible"
+    shell = "/sbin/nologin"
+    try:
+        pwd.getpwnam(username)
+        raise ValueError(f"User '{username}' already exists.")
+    except KeyError:
+        pass
+
     user_created = False
     try:
-        subprocess.run(["useradd", "-m", "-s", shell, username], check=True)
+        add_user(username, shell)
         user_created = True
         print(f"User '{username}' created successfully.")
 
-        subprocess.run(["passwd", "-l", username], check=True, capture_output=True)
+        run_command(["passwd", "-l", username], check=True)
         print(f"Password for '{username}' has been locked.")
 
         sudoers_file = f"/etc/sudoers.d/{username}"
@@ -221,12 +279,11 @@ def setup_ansible_user():
                 if os.path.exists(sudoers_file):
                     os.remove(sudoers_file)
                     print(f"Removed sudoers file: {sudoers_file}")
-                subprocess.run(["userdel", "-r", username], check=True, capture_output=True)
+                run_command(["userdel", "-r", username], check=True)
                 print(f"Successfully removed partially configured user '{username}'.")
             except Exception as cleanup_e:
                 print(f"CRITICAL: Failed to clean up user '{username}'. Manual intervention required: {cleanup_e}")
-
-    input("Press Enter to continue...")
+        raise
 
 
 def disable_user_login():    
@@ -236,7 +293,7 @@ def disable_user_login():
         input("Press Enter to continue...")
         return
     try:
-        subprocess.run(["usermod", "-s", "/sbin/nologin", username], check=True)
+        run_command(["usermod", "-s", "/sbin/nologin", username], capture=False, check=True)
         print(f"Login disabled for user '{username}'.")
     except subprocess.CalledProcessError as e:
         print(f"Error disabling login for user '{username}': {e}")
@@ -266,7 +323,7 @@ def remove_user():
         return
 
     try:
-        subprocess.run(["userdel", "-r", username], check=True)
+        run_command(["userdel", "-r", username], capture=False, check=True)
         print(f"User '{username}' removed successfully.")
     except subprocess.CalledProcessError as e:
         print(f"Error removing user '{username}': {e}")